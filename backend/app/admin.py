@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Friendship, Message
+from .models import User, Friendship, Message, Conversation, TranslationCacheEntry
 
 
 
@@ -16,3 +16,14 @@ class MessageAdmin(admin.ModelAdmin):
     list_filter = ('original_language', 'timestamp')
     search_fields = ('sender__username', 'receiver__username', 'content')
     readonly_fields = ('timestamp',)
+
+@admin.register(Conversation)
+class ConversationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'created_at')
+    filter_horizontal = ('participants',)
+
+@admin.register(TranslationCacheEntry)
+class TranslationCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ('text_hash', 'source_language', 'target_language', 'created_at')
+    list_filter = ('source_language', 'target_language')
+    readonly_fields = ('created_at',)
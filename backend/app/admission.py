@@ -0,0 +1,150 @@
+"""
+Admission control for the translation path.
+
+Caps how much translation work a worker runs at once. Waiting requests sit in
+bounded per-user queues that are served round-robin, so a few chatty users
+can't starve everyone else. A request that can't be admitted within the
+queue-delay SLA (or finds the queue full) is shed: the caller delivers the
+untranslated original and backfills the translation later through the
+background lane, which only runs when no interactive work is waiting.
+"""
+import asyncio
+from collections import OrderedDict, deque
+
+from django.conf import settings
+
+
+class TranslationAdmission:
+    def __init__(self, max_in_flight=8, max_queue=256, max_queued_per_user=8, sla_ms=2000):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max_queue
+        self.max_queued_per_user = max_queued_per_user
+        self.sla = sla_ms / 1000
+        self.in_flight = 0
+        self._waiting = OrderedDict()  # user id -> deque of futures, in round-robin order
+        self._background = deque()
+        self._stats = {'admitted': 0, 'queued': 0, 'shed_queue_full': 0, 'shed_user_limit': 0, 'shed_sla': 0}
+
+    @property
+    def queue_depth(self):
+        return sum(len(waiters) for waiters in self._waiting.values())
+
+    async def acquire(self, user_id):
+        """
+        Wait for a translation slot. Returns False if the request should be shed.
+        Every successful acquire must be paired with release().
+        """
+        if self.in_flight < self.max_in_flight and not self._waiting:
+            self.in_flight += 1
+            self._stats['admitted'] += 1
+            return True
+
+        if self.queue_depth >= self.max_queue:
+            self._stats['shed_queue_full'] += 1
+            return False
+        waiters = self._waiting.get(user_id)
+        if waiters is not None and len(waiters) >= self.max_queued_per_user:
+            self._stats['shed_user_limit'] += 1
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(user_id, deque()).append(future)
+        self._stats['queued'] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.sla)
+        except asyncio.TimeoutError:
+            if future.done():
+                # The slot was handed over just as the deadline hit: keep it
+                self._stats['admitted'] += 1
+                return True
+            future.cancel()
+            self._discard(user_id, future)
+            self._stats['shed_sla'] += 1
+            return False
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                future.cancel()
+                self._discard(user_id, future)
+            raise
+        self._stats['admitted'] += 1
+        return True
+
+    async def acquire_background(self):
+        """Wait (without a deadline) for a slot that no interactive request wants"""
+        if self.in_flight < self.max_in_flight and not self._waiting and not self._background:
+            self.in_flight += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._background.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            elif future in self._background:
+                self._background.remove(future)
+            raise
+
+    def release(self):
+        """Free a slot and hand it to the next waiter, round-robin across users"""
+        self.in_flight -= 1
+        while self.in_flight < self.max_in_flight:
+            future = self._next_waiter()
+            if future is None:
+                return
+            self.in_flight += 1
+            future.set_result(True)
+
+    def _next_waiter(self):
+        while self._waiting:
+            user_id, waiters = next(iter(self._waiting.items()))
+            future = waiters.popleft()
+            # Move this user to the back of the rotation (or drop them if drained)
+            del self._waiting[user_id]
+            if waiters:
+                self._waiting[user_id] = waiters
+            if not future.done():
+                return future
+        while self._background:
+            future = self._background.popleft()
+            if not future.done():
+                return future
+        return None
+
+    def _discard(self, user_id, future):
+        waiters = self._waiting.get(user_id)
+        if waiters is None:
+            return
+        try:
+            waiters.remove(future)
+        except ValueError:
+            pass
+        if not waiters:
+            del self._waiting[user_id]
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats['shed'] = stats['shed_queue_full'] + stats['shed_user_limit'] + stats['shed_sla']
+        stats['in_flight'] = self.in_flight
+        stats['queue_depth'] = self.queue_depth
+        stats['background_depth'] = len(self._background)
+        stats['waiting_users'] = len(self._waiting)
+        return stats
+
+
+_admission = None
+
+def get_admission():
+    """Get the process-wide translation admission controller"""
+    global _admission
+
+    if _admission is None:
+        _admission = TranslationAdmission(
+            max_in_flight=getattr(settings, 'TRANSLATION_MAX_IN_FLIGHT', 8),
+            max_queue=getattr(settings, 'TRANSLATION_MAX_QUEUE', 256),
+            max_queued_per_user=getattr(settings, 'TRANSLATION_MAX_QUEUED_PER_USER', 8),
+            sla_ms=getattr(settings, 'TRANSLATION_QUEUE_SLA_MS', 2000),
+        )
+    return _admission
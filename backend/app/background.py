@@ -0,0 +1,12 @@
+"""Fire-and-forget asyncio tasks that can't be garbage collected before they finish."""
+import asyncio
+
+# The event loop only keeps weak references to tasks, so hold on to them until they're done
+_background_tasks = set()
+
+
+def run_in_background(coro):
+    task = asyncio.ensure_future(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
@@ -0,0 +1,52 @@
+"""
+Shared channel layer for running chat on several ASGI workers and hosts.
+
+Builds on channels_redis: every worker talks to the same Redis shard(s), so a
+group_send to user_{id} reaches that user whichever worker holds their socket.
+Each host entry gets its own connection pool per event loop, and group
+membership expires after group_expiry seconds unless it is renewed (ChatConsumer
+re-joins its group periodically).
+
+channels_redis picks a shard with crc32 % number-of-hosts, which moves almost
+every group and channel when a shard is added or removed. ShardedRedisChannelLayer
+uses rendezvous (highest-random-weight) hashing over the host addresses instead,
+so only the keys owned by the changed shard move.
+"""
+import hashlib
+
+from channels_redis.core import RedisChannelLayer
+
+
+def shard_id(host):
+    """Stable identity of a host entry, independent of its position in the list"""
+    if 'address' in host:
+        return host['address']
+    if 'master_name' in host:
+        return f"sentinel:{host['master_name']}"
+    return f"{host.get('host', 'localhost')}:{host.get('port', 6379)}/{host.get('db', 0)}"
+
+
+def rendezvous_index(value, shard_ids):
+    """Index of the shard with the highest hash weight for value"""
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    best_index, best_weight = 0, -1
+    for index, shard in enumerate(shard_ids):
+        weight = int.from_bytes(hashlib.blake2b(shard + value, digest_size=8).digest(), 'big')
+        if weight > best_weight:
+            best_index, best_weight = index, weight
+    return best_index
+
+
+class ShardedRedisChannelLayer(RedisChannelLayer):
+    """RedisChannelLayer with rendezvous hashing of groups and channels across shards"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._shard_ids = [shard_id(host).encode('utf-8') + b'\0' for host in self.hosts]
+
+    def consistent_hash(self, value):
+        if self.ring_size == 1:
+            return 0
+        return rendezvous_index(value, self._shard_ids)
+
@@ -1,4 +1,3 @@
-import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
@@ -6,22 +5,62 @@ from rest_framework_simplejwt.tokens import UntypedToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from jwt import decode as jwt_decode
 from django.conf import settings
-from .models import Message, Friendship
+from django.utils import timezone
+from .models import Message, Friendship, Conversation
+from .admission import get_admission
+from .background import run_in_background
+from .encoding import dumps, encoded_event, event_text, loads, negotiate
+from .inference_backends import backend_for, load_pipeline
+from .language_detection import detect_language
+from .model_manager import ModelManager
+from .persistence import get_write_behind
+from .presence import get_presence
+from .receipts import RECEIPT_STATUSES, get_receipts
+from .segmentation import join_segments, split_text
+from .translation_cache import get_translation_cache
+from .translation_service import get_service_client
+from .warmup import preload_pairs
 from django.db.models import Q
-from langdetect import detect
-from transformers import pipeline
 import asyncio
+from datetime import timedelta
+from urllib.parse import parse_qs
 
 User = get_user_model()
 
-# Initialize translation pipelines (lazy loading)
 # Helsinki-NLP has separate models for different language pairs
-_translators = {}
+MODEL_MAP = {
+    'en-fr': 'Helsinki-NLP/opus-mt-en-fr',
+    'en-es': 'Helsinki-NLP/opus-mt-en-es',
+    'fr-en': 'Helsinki-NLP/opus-mt-fr-en',
+    'es-en': 'Helsinki-NLP/opus-mt-es-en',
+    'fr-es': 'Helsinki-NLP/opus-mt-fr-es',
+    'es-fr': 'Helsinki-NLP/opus-mt-es-fr',
+}
+
+def _load_translator(cache_key):
+    """Build the translation pipeline for a language pair key such as 'en-fr'"""
+    try:
+        model_name = MODEL_MAP.get(cache_key)
+        if model_name:
+            backend = backend_for(cache_key)
+            print(f"Loading translation model: {model_name} ({backend})")
+            return load_pipeline(model_name, backend)
+        print(f"No model found for {cache_key}, using original text")
+        return None
+    except Exception as e:
+        print(f"Error loading translation model {cache_key}: {e}")
+        return None
+
+# Initialize translation pipelines (lazy loading), bounded by a memory budget;
+# preloaded pairs stay resident so readiness doesn't flip under load
+_translators = ModelManager(
+    _load_translator,
+    budget_mb=getattr(settings, 'TRANSLATION_MODEL_MEMORY_BUDGET_MB', 0),
+    pinned=[f"{source_lang}-{target_lang}" for source_lang, target_lang in preload_pairs()],
+)
 
 def get_translator(source_lang, target_lang):
     """Get or create translation pipeline for specific language pair"""
-    global _translators
-    
     # Map language codes
     lang_map = {
         'en': 'en',
@@ -38,52 +77,150 @@ def get_translator(source_lang, target_lang):
     # Create cache key
     cache_key = f"{source_code}-{target_code}"
     
-    if cache_key not in _translators:
-        try:
-            # Map to Helsinki-NLP model names
-            model_map = {
-                'en-fr': 'Helsinki-NLP/opus-mt-en-fr',
-                'en-es': 'Helsinki-NLP/opus-mt-en-es',
-                'fr-en': 'Helsinki-NLP/opus-mt-fr-en',
-                'es-en': 'Helsinki-NLP/opus-mt-es-en',
-                'fr-es': 'Helsinki-NLP/opus-mt-fr-es',
-                'es-fr': 'Helsinki-NLP/opus-mt-es-fr',
-            }
-            
-            model_name = model_map.get(cache_key)
-            if model_name:
-                print(f"Loading translation model: {model_name}")
-                _translators[cache_key] = pipeline('translation', model=model_name)
-            else:
-                print(f"No model found for {cache_key}, using original text")
-                return None
-        except Exception as e:
-            print(f"Error loading translation model {cache_key}: {e}")
-            return None
-    
     return _translators.get(cache_key)
 
 def _translate_sync(text, source_lang, target_lang):
     """Synchronous translation function to run in thread pool"""
+    return _translate_batch_sync([text], source_lang, target_lang)[0]
+
+def _translate_batch_sync(texts, source_lang, target_lang):
+    """
+    Translate a list of texts, serving repeats from the translation cache.
+    Long texts are split into sentence segments which are translated in the same
+    batch and reassembled with their original whitespace.
+    """
+    max_chars = getattr(settings, 'TRANSLATION_MAX_SEGMENT_CHARS', 400)
+    splits = [split_text(text, max_chars) for text in texts]
+    segments = [segment for parts, _ in splits for segment in parts]
+    
+    cache = get_translation_cache()
+    translations = cache.get_many(segments, source_lang, target_lang)
+    
+    # Only run the model on distinct segments that missed both cache tiers
+    pending = [segment for segment in dict.fromkeys(segments) if segment not in translations]
+    if pending:
+        translated = _run_translator(pending, source_lang, target_lang)
+        if translated:
+            cache.set_many(translated, source_lang, target_lang)
+            translations.update(translated)
+    
+    return [
+        join_segments(separators, [translations.get(part, part) for part in parts])
+        for parts, separators in splits
+    ]
+
+def _run_translator(texts, source_lang, target_lang):
+    """Run a single batched pipeline call, returning a dict of text -> translation"""
     translator = get_translator(source_lang, target_lang)
     if translator is None:
-        return text
+        return None
     
     try:
-        result = translator(text, max_length=512)
-        if isinstance(result, list) and len(result) > 0:
-            translated_text = result[0].get('translation_text', text)
-            return translated_text
-        return text
+        results = translator(list(texts), max_length=512, batch_size=len(texts))
+        if isinstance(results, list) and len(results) == len(texts):
+            return {
+                text: result['translation_text']
+                for text, result in zip(texts, results)
+                if isinstance(result, dict) and 'translation_text' in result
+            }
+        return None
     except Exception as e:
         print(f"Translation error: {e}")
-        return text
+        return None
+
 
-async def translate_text(text, target_lang):
+class TranslationBatcher:
+    """
+    Micro-batching scheduler for translation requests.
+    Pending requests are grouped per (source, target) pair and flushed as one
+    batched pipeline call once the window elapses or the batch is full.
+    If the batch fails, every waiting caller gets the exception.
+    """
+    
+    def __init__(self, window_ms=10, max_batch_size=16):
+        self.window = window_ms / 1000
+        self.max_batch_size = max(1, max_batch_size)
+        self._pending = {}  # (source, target) -> list of (text, future)
+        self._timers = {}   # (source, target) -> TimerHandle
+    
+    async def translate(self, text, source_lang, target_lang):
+        """Queue text for translation and wait for its batch to complete"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = (source_lang, target_lang)
+        
+        batch = self._pending.setdefault(key, [])
+        batch.append((text, future))
+        
+        if len(batch) >= self.max_batch_size:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+        
+        return await future
+    
+    def _flush(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        
+        batch = self._pending.pop(key, None)
+        if batch:
+            run_in_background(self._run_batch(key, batch))
+    
+    async def _run_batch(self, key, batch):
+        source_lang, target_lang = key
+        texts = [text for text, _ in batch]
+        
+        try:
+            client = get_service_client()
+            if client is not None:
+                # Hand the batch to the out-of-process translation service
+                results = await client.translate_batch(texts, source_lang, target_lang)
+                get_translation_cache().set_memory(dict(zip(texts, results)), source_lang, target_lang)
+            else:
+                # Run the batch in thread pool to avoid blocking the async event loop
+                loop = asyncio.get_running_loop()
+                results = await loop.run_in_executor(
+                    None,
+                    _translate_batch_sync,
+                    texts,
+                    source_lang,
+                    target_lang
+                )
+            if len(results) != len(texts):
+                raise RuntimeError(f"Expected {len(texts)} translations, got {len(results)}")
+        except Exception as e:
+            print(f"Batch translation error: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+_batcher = None
+
+def get_batcher():
+    """Get the process-wide translation batcher"""
+    global _batcher
+    
+    if _batcher is None:
+        _batcher = TranslationBatcher(
+            window_ms=getattr(settings, 'TRANSLATION_BATCH_WINDOW_MS', 10),
+            max_batch_size=getattr(settings, 'TRANSLATION_MAX_BATCH_SIZE', 16),
+        )
+    return _batcher
+
+async def translate_text(text, target_lang, source_lang=None):
     """Translate text to target language using transformers"""
     try:
-        # Detect source language
-        source_lang = detect(text)
+        # Detect source language unless the caller already did
+        if source_lang is None:
+            source_lang = detect_language(text)
         
         # Normalize language codes
         lang_map = {
@@ -99,15 +236,13 @@ async def translate_text(text, target_lang):
         if source_code == target_code:
             return text
         
-        # Run translation in thread pool to avoid blocking the async event loop
-        loop = asyncio.get_event_loop()
-        translated_text = await loop.run_in_executor(
-            None, 
-            _translate_sync, 
-            text, 
-            source_code, 
-            target_code
-        )
+        # Serve repeated texts from the in-process cache without a thread hop
+        cached = get_translation_cache().get_memory(text, source_code, target_code)
+        if cached is not None:
+            return cached
+        
+        # Queue for a batched pipeline call with other messages for the same pair
+        translated_text = await get_batcher().translate(text, source_code, target_code)
         
         return translated_text
     except Exception as e:
@@ -115,25 +250,142 @@ async def translate_text(text, target_lang):
         # Return original text on error
         return text
 
+async def translate_to_languages(text, target_langs, source_lang):
+    """Translate text once per distinct target language, returning {language: translation}"""
+    target_langs = list(dict.fromkeys(target_langs))
+    translations = await asyncio.gather(*[
+        translate_text(text, target_lang, source_lang=source_lang)
+        for target_lang in target_langs
+    ])
+    return dict(zip(target_langs, translations))
+
 
 @database_sync_to_async
 def are_friends(user1, user2):
     """Check if two users are friends"""
     return Friendship.objects.filter(
         (Q(from_user=user1, to_user=user2) | Q(from_user=user2, to_user=user1)),
-        accepted=True
+        accepted=True,
+        blocked=False
     ).exists()
 
 @database_sync_to_async
-def save_message(sender, receiver, content, translated_content, original_language):
+def get_friend_languages(user_id):
+    """{friend_id: preferred_language} for every accepted, unblocked friend, in one query"""
+    friendships = Friendship.objects.filter(
+        Q(from_user_id=user_id) | Q(to_user_id=user_id),
+        accepted=True,
+        blocked=False
+    ).values_list('from_user_id', 'from_user__preferred_language', 'to_user_id', 'to_user__preferred_language')
+    
+    friends = {}
+    for from_id, from_language, to_id, to_language in friendships:
+        if from_id == user_id:
+            friends[to_id] = to_language
+        else:
+            friends[from_id] = from_language
+    return friends
+
+@database_sync_to_async
+def get_friend_language(user_id, friend_id):
+    """friend_id's preferred_language if the two are (still) friends, else None"""
+    if not Friendship.objects.filter(
+        (Q(from_user_id=user_id, to_user_id=friend_id) | Q(from_user_id=friend_id, to_user_id=user_id)),
+        accepted=True,
+        blocked=False
+    ).exists():
+        return None
+    return User.objects.filter(id=friend_id).values_list('preferred_language', flat=True).first()
+
+async def save_message(sender, receiver_id, content, translated_content, original_language):
     """Save message to database"""
-    return Message.objects.create(
+    messages = await persist_messages([Message(
         sender=sender,
-        receiver=receiver,
+        receiver_id=receiver_id,
         content=content,
         translated_content=translated_content,
         original_language=original_language
+    )])
+    return messages[0]
+
+@database_sync_to_async
+def get_conversation_participants(conversation_id, user):
+    """(id, preferred_language) of every participant, or None if user isn't in the conversation"""
+    conversation = Conversation.objects.filter(id=conversation_id, participants=user).first()
+    if conversation is None:
+        return None
+    return list(conversation.participants.values_list('id', 'preferred_language'))
+
+async def save_conversation_messages(sender, conversation_id, recipients, content, translations, original_language):
+    """Save one message row per recipient in a single INSERT"""
+    return await persist_messages([
+        Message(
+            sender=sender,
+            receiver_id=recipient_id,
+            conversation_id=conversation_id,
+            content=content,
+            translated_content=translations[language],
+            original_language=original_language
+        )
+        for recipient_id, language in recipients
+    ])
+
+async def persist_messages(messages):
+    """
+    Persist unsaved Message instances. With write-behind enabled they get their
+    id/timestamp immediately and are written in a later batch; otherwise they are
+    inserted now.
+    """
+    writer = get_write_behind()
+    if writer is not None:
+        return writer.add(messages)
+    return await bulk_save_messages(messages)
+
+@database_sync_to_async
+def bulk_save_messages(messages):
+    if len(messages) == 1:
+        messages[0].save()
+        return messages
+    return Message.objects.bulk_create(messages)
+
+# Allowance for clock differences between workers when matching synced messages to live ones
+SYNC_CLOCK_SKEW = timedelta(seconds=5)
+
+@database_sync_to_async
+def get_missed_messages(user_id, since, limit, chat_with=None, conversation_id=None):
+    """
+    Up to `limit` messages newer than the `since` id, oldest first: everything the
+    user received plus their own 1:1 messages. Served by the (receiver, id) and
+    (sender, id) indexes.
+    """
+    messages = Message.objects.filter(
+        Q(receiver_id=user_id) | Q(sender_id=user_id, conversation__isnull=True),
+        id__gt=since
     )
+    if chat_with is not None:
+        messages = messages.filter(Q(sender_id=chat_with) | Q(receiver_id=chat_with), conversation__isnull=True)
+    elif conversation_id is not None:
+        messages = messages.filter(conversation_id=conversation_id)
+    return list(messages.order_by('id').values(
+        'id', 'sender_id', 'receiver_id', 'conversation_id', 'content',
+        'translated_content', 'original_language', 'status', 'timestamp'
+    )[:limit])
+
+async def flush_pending_messages():
+    """Make sure every buffered message is in the database (before updating rows)"""
+    writer = get_write_behind()
+    if writer is not None:
+        await writer.flush()
+
+def _is_id(value):
+    """Whether a client-supplied value is usable as a database id (bools are ints in Python)"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+@database_sync_to_async
+def update_translations(message_ids_by_translation):
+    """Store translations that finished after their messages were delivered (one UPDATE per text)"""
+    for translated_content, message_ids in message_ids_by_translation.items():
+        Message.objects.filter(id__in=message_ids).update(translated_content=translated_content)
 
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
@@ -146,19 +398,72 @@ class ChatConsumer(AsyncWebsocketConsumer):
             return
         
         print(f"WebSocket connection accepted for user: {self.user.username} (ID: {self.user.id})")
-        await self.accept()
+        # Wire format for this socket: JSON text unless the client negotiated something cheaper
+        self.codec = negotiate(self.scope.get('subprotocols'))
+        await self.accept(subprotocol=self.codec.subprotocol)
         self.room_group_name = f'user_{self.user.id}'
+        # Messages from here on arrive live; anything older comes from a sync
+        self.joined_at = timezone.now()
+        self.sync_duplicates = set()
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        self.group_renewal = asyncio.ensure_future(self.renew_group_membership())
+        # Friend id -> preferred_language, kept current by friends_changed events
+        self.friends = await get_friend_languages(self.user.id)
+        # Register this connection and send which friends are online (one bulk lookup)
+        presence = get_presence()
+        await presence.connect(self.user.id, self.channel_name)
+        self.presence_heartbeat = asyncio.ensure_future(self.send_heartbeats())
+        await self.send_payload(dumps({
+            'type': 'presence_snapshot',
+            'online': sorted(await presence.online(self.friends)),
+        }))
+        
+        # Resuming client (?since=<last message id>): stream what it missed
+        since = parse_qs(self.scope.get('query_string', b'').decode()).get('since')
+        if since:
+            try:
+                await self.sync_messages(int(since[0]))
+            except ValueError:
+                await self.send_payload(dumps({'error': 'Invalid since cursor'}))
         print(f"User {self.user.username} added to room group: {self.room_group_name}")
 
     async def disconnect(self, close_code):
         if hasattr(self, 'room_group_name'):
             print(f"WebSocket disconnected for user {self.user.username if self.user else 'unknown'}, close_code: {close_code}")
+            self.group_renewal.cancel()
             await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+            if hasattr(self, 'presence_heartbeat'):
+                self.presence_heartbeat.cancel()
+                await get_presence().disconnect(self.user.id, self.channel_name)
+
+    async def renew_group_membership(self):
+        """Re-join the user's group before CHANNEL_GROUP_EXPIRY drops this long-lived connection from it"""
+        interval = max(1, getattr(settings, 'CHANNEL_GROUP_EXPIRY', 86400) / 2)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+            except Exception as e:
+                print(f"Error renewing group membership for {self.room_group_name}: {e}")
+
+    async def send_heartbeats(self):
+        """Keep this connection's presence alive while the socket is open"""
+        interval = max(1, getattr(settings, 'CHAT_PRESENCE_TTL', 60) / 3)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await get_presence().heartbeat(self.user.id, self.channel_name)
+            except Exception as e:
+                print(f"Error sending presence heartbeat for user {self.user.id}: {e}")
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            data = self.codec.decode(text_data, bytes_data)
+        except ValueError:
+            await self.send_payload(dumps({'error': f'Invalid {self.codec.name}'}))
+            return
 
-    async def receive(self, text_data):
         try:
-            data = json.loads(text_data)
             action = data.get('action')
             
             if action == 'send_message':
@@ -166,70 +471,355 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 content = data.get('content')
                 
                 if not receiver_id or not content:
-                    await self.send(text_data=json.dumps({'error': 'Missing receiver_id or content'}))
+                    await self.send_payload(dumps({'error': 'Missing receiver_id or content'}))
                     return
                 
-                try:
-                    receiver = await database_sync_to_async(User.objects.get)(id=receiver_id)
-                except User.DoesNotExist:
-                    await self.send(text_data=json.dumps({'error': 'Receiver not found'}))
-                    return
+                # Friends are cached for the connection, so the usual case needs no queries
+                receiver_language = self.friends.get(receiver_id)
+                if receiver_language is None:
+                    try:
+                        receiver = await database_sync_to_async(User.objects.get)(id=receiver_id)
+                    except (User.DoesNotExist, ValueError):
+                        await self.send_payload(dumps({'error': 'Receiver not found'}))
+                        return
+                    
+                    # Check if users are friends
+                    if not await are_friends(self.user, receiver):
+                        await self.send_payload(dumps({'error': 'Users are not friends'}))
+                        return
+                    
+                    receiver_id = receiver.id
+                    receiver_language = receiver.preferred_language
+                    self.friends[receiver_id] = receiver_language
                 
-                # Check if users are friends
-                if not await are_friends(self.user, receiver):
-                    await self.send(text_data=json.dumps({'error': 'Users are not friends'}))
-                    return
+                # Detect original language (once, reused for translation)
+                original_language = detect_language(content)
                 
-                # Detect original language
-                original_language = detect(content)
+                # Two-phase delivery: send the original now, push the translation when ready
+                translation_pending = (
+                    getattr(settings, 'CHAT_TWO_PHASE_DELIVERY', False)
+                    and original_language != receiver_language
+                )
                 
-                # Translate message to receiver's preferred language
-                translated_content = await translate_text(content, receiver.preferred_language)
+                shed = False
+                if translation_pending:
+                    translated_content = content
+                else:
+                    # Translate message to receiver's preferred language
+                    translations, shed = await self.translate_admitted(
+                        content, [receiver_language], original_language
+                    )
+                    translated_content = translations[receiver_language]
+                    # Overloaded: deliver the original now and backfill the translation
+                    translation_pending = shed
                 
                 # Save message to database
                 message = await save_message(
-                    self.user, receiver, content, translated_content, original_language
-                )
-                
-                # Send to receiver
-                receiver_group = f'user_{receiver.id}'
-                await self.channel_layer.group_send(
-                    receiver_group,
-                    {
-                        'type': 'chat_message',
-                        'message': {
-                            'id': message.id,
-                            'sender': self.user.id,
-                            'receiver': receiver.id,
-                            'content': content,
-                            'translated_content': translated_content,
-                            'original_language': original_language,
-                            'timestamp': message.timestamp.isoformat(),
-                        }
-                    }
+                    self.user, receiver_id, content, translated_content, original_language
                 )
                 
-                # Send confirmation to sender
-                await self.send(text_data=json.dumps({
+                # The receiver and the sender's confirmation get the same payload: encode it once
+                event = encoded_event('chat_message', {
                     'id': message.id,
                     'sender': self.user.id,
-                    'receiver': receiver.id,
+                    'receiver': receiver_id,
                     'content': content,
                     'translated_content': translated_content,
                     'original_language': original_language,
                     'timestamp': message.timestamp.isoformat(),
-                }))
-        except json.JSONDecodeError:
-            await self.send(text_data=json.dumps({'error': 'Invalid JSON'}))
+                    'translation_pending': translation_pending,
+                })
+                
+                # Send to receiver
+                receiver_group = f'user_{receiver_id}'
+                await self.channel_layer.group_send(receiver_group, event)
+                
+                # Send confirmation to sender
+                await self.send_payload(event['text'])
+                
+                if translation_pending:
+                    run_in_background(self.backfill_translations(
+                        content,
+                        original_language,
+                        [(message.id, receiver_id, receiver_language)],
+                        notify_sender=True,
+                        background=shed
+                    ))
+            
+            elif action == 'send_conversation_message':
+                await self.send_conversation_message(data)
+            
+            elif action == 'ack':
+                await self.acknowledge(data)
+            
+            elif action == 'sync':
+                since = data.get('since')
+                if not isinstance(since, int):
+                    await self.send_payload(dumps({'error': 'Missing since cursor'}))
+                    return
+                await self.sync_messages(since, data.get('chat_with'), data.get('conversation_id'))
         except Exception as e:
-            await self.send(text_data=json.dumps({'error': str(e)}))
+            await self.send_payload(dumps({'error': str(e)}))
+
+    async def send_conversation_message(self, data):
+        """
+        Group chat: translate once per distinct participant language (not per member)
+        and fan the per-language payload out to every participant's group.
+        """
+        conversation_id = data.get('conversation_id')
+        content = data.get('content')
+        
+        if not conversation_id or not content:
+            await self.send_payload(dumps({'error': 'Missing conversation_id or content'}))
+            return
+        
+        participants = await get_conversation_participants(conversation_id, self.user)
+        if participants is None:
+            await self.send_payload(dumps({'error': 'Conversation not found'}))
+            return
+        
+        recipients = [(user_id, language) for user_id, language in participants if user_id != self.user.id]
+        original_language = detect_language(content)
+        
+        translations, shed = await self.translate_admitted(
+            content, [language for _, language in recipients], original_language
+        )
+        messages = await save_conversation_messages(
+            self.user, conversation_id, recipients, content, translations, original_language
+        )
+        
+        # One payload per language, only the per-recipient row id differs
+        payloads = {
+            language: {
+                'sender': self.user.id,
+                'conversation': conversation_id,
+                'content': content,
+                'translated_content': translated_content,
+                'original_language': original_language,
+                'translation_pending': shed and language != original_language,
+            }
+            for language, translated_content in translations.items()
+        }
+        await asyncio.gather(*[
+            self.channel_layer.group_send(
+                f'user_{recipient_id}',
+                encoded_event('chat_message', dict(
+                    payloads[language],
+                    id=message.id,
+                    receiver=recipient_id,
+                    timestamp=message.timestamp.isoformat()
+                ))
+            )
+            for (recipient_id, language), message in zip(recipients, messages)
+        ])
+        
+        # Send confirmation to sender
+        await self.send_payload(dumps({
+            'sender': self.user.id,
+            'conversation': conversation_id,
+            'content': content,
+            'original_language': original_language,
+            'message_ids': [message.id for message in messages],
+            'timestamp': messages[0].timestamp.isoformat() if messages else None,
+        }))
+        
+        if shed:
+            run_in_background(self.backfill_translations(
+                content,
+                original_language,
+                [
+                    (message.id, recipient_id, language)
+                    for (recipient_id, language), message in zip(recipients, messages)
+                    if language != original_language
+                ],
+                notify_sender=False,
+                background=True
+            ))
+
+    async def sync_messages(self, since, chat_with=None, conversation_id=None):
+        """
+        Stream messages newer than the `since` id in bounded batches (sync_batch),
+        then a sync_complete with the new cursor. Live events keep flowing through
+        the group afterwards; ones already streamed here are dropped, so there are
+        no gaps or duplicates. More than CHAT_SYNC_MAX_MESSAGES missed messages ends
+        with truncated=true and the client should reload history instead.
+        """
+        batch_size = getattr(settings, 'CHAT_SYNC_BATCH_SIZE', 200)
+        max_messages = getattr(settings, 'CHAT_SYNC_MAX_MESSAGES', 2000)
+        
+        writer = get_write_behind()
+        if writer is not None:
+            # Messages sent before we joined the group may still be buffered
+            # (here or on another worker) for up to one flush interval
+            await writer.flush()
+            await asyncio.sleep(writer.flush_delay)
+        
+        # Messages this new may also be delivered live: remember which ones were streamed
+        live_after = self.joined_at - SYNC_CLOCK_SKEW
+        # Live events older than the channel layer's message expiry can no longer arrive
+        self.sync_duplicates_until = asyncio.get_running_loop().time() + getattr(settings, 'CHANNEL_MESSAGE_EXPIRY', 60)
+        cursor = since
+        count = 0
+        while count < max_messages:
+            batch = await get_missed_messages(
+                self.user.id, cursor, min(batch_size, max_messages - count), chat_with, conversation_id
+            )
+            if not batch:
+                break
+            cursor = batch[-1]['id']
+            count += len(batch)
+            self.sync_duplicates.update(m['id'] for m in batch if m['timestamp'] >= live_after)
+            await self.send_payload(dumps({
+                'type': 'sync_batch',
+                'cursor': cursor,
+                'messages': [
+                    {
+                        'id': m['id'],
+                        'sender': m['sender_id'],
+                        'receiver': m['receiver_id'],
+                        'conversation': m['conversation_id'],
+                        'content': m['content'],
+                        'translated_content': m['translated_content'],
+                        'original_language': m['original_language'],
+                        'status': m['status'],
+                        'timestamp': m['timestamp'].isoformat(),
+                    }
+                    for m in batch
+                ],
+            }))
+            if len(batch) < batch_size:
+                break
+        
+        truncated = count >= max_messages and bool(
+            await get_missed_messages(self.user.id, cursor, 1, chat_with, conversation_id)
+        )
+        await self.send_payload(dumps({
+            'type': 'sync_complete',
+            'cursor': cursor,
+            'count': count,
+            'truncated': truncated,
+        }))
+
+    async def acknowledge(self, data):
+        """
+        Cumulative receipt: every message up to `up_to` from `chat_with` (or in
+        `conversation_id`) has been delivered/read. Coalesced and applied in batches.
+        """
+        status = data.get('status', 'read')
+        up_to = data.get('up_to')
+        peer_id = data.get('chat_with')
+        conversation_id = data.get('conversation_id')
+        
+        if (
+            status not in RECEIPT_STATUSES
+            or not _is_id(up_to)
+            or (peer_id is None) == (conversation_id is None)
+            or not _is_id(peer_id if conversation_id is None else conversation_id)
+        ):
+            await self.send_payload(dumps({'error': 'Invalid ack: need status, up_to and one of chat_with or conversation_id'}))
+            return
+        
+        get_receipts().ack(self.user.id, status, up_to, peer_id=peer_id, conversation_id=conversation_id)
+
+    async def translate_admitted(self, content, target_langs, original_language):
+        """
+        Translate into each target language under admission control.
+        Returns ({language: translation}, shed). When shed, the original text stands in.
+        """
+        if all(language == original_language for language in target_langs):
+            return {language: content for language in target_langs}, False
+        
+        admission = get_admission()
+        if not await admission.acquire(self.user.id):
+            return {language: content for language in target_langs}, True
+        try:
+            return await translate_to_languages(content, target_langs, original_language), False
+        finally:
+            admission.release()
+
+    async def backfill_translations(self, content, original_language, targets, notify_sender, background):
+        """
+        Translate messages that were delivered untranslated (two-phase delivery or shed load),
+        store the translations and push translation_ready events.
+        targets is a list of (message_id, receiver_id, language).
+        Shed work waits in the admission controller's background lane.
+        """
+        admission = get_admission()
+        if background or not await admission.acquire(self.user.id):
+            await admission.acquire_background()
+        try:
+            translations = await translate_to_languages(
+                content, [language for _, _, language in targets], original_language
+            )
+        finally:
+            admission.release()
+        
+        message_ids_by_translation = {}
+        for message_id, _, language in targets:
+            message_ids_by_translation.setdefault(translations[language], []).append(message_id)
+        await flush_pending_messages()
+        await update_translations(message_ids_by_translation)
+        
+        for message_id, receiver_id, language in targets:
+            event = encoded_event('translation_ready', {
+                'type': 'translation_ready',
+                'id': message_id,
+                'sender': self.user.id,
+                'receiver': receiver_id,
+                'translated_content': translations[language],
+            })
+            await self.channel_layer.group_send(f'user_{receiver_id}', event)
+            if notify_sender:
+                # The sender's socket may already be gone; the translation is stored either way
+                await self.channel_layer.group_send(self.room_group_name, event)
+
+    async def friends_changed(self, event):
+        """
+        Internal invalidation event (see app.signals): a friendship or a friend's
+        profile changed, so refresh that entry of the connection's friend cache.
+        """
+        friend_id = event['friend_id']
+        language = await get_friend_language(self.user.id, friend_id)
+        if language is None:
+            self.friends.pop(friend_id, None)
+        else:
+            if friend_id not in self.friends:
+                # New friend: this connection never got their presence
+                online = friend_id in await get_presence().online([friend_id])
+                await self.send_payload(dumps({'type': 'presence', 'user': friend_id, 'online': online}))
+            self.friends[friend_id] = language
+
+    async def send_payload(self, text):
+        """Send a JSON-encoded payload in this connection's negotiated wire format"""
+        await self.send(**self.codec.frame(text))
 
     async def chat_message(self, event):
-        message = event['message']
-        await self.send(text_data=json.dumps(message))
+        # Payloads arrive pre-encoded, so fan-out doesn't re-serialize per socket
+        text = event_text(event)
+        if self.sync_duplicates:
+            if asyncio.get_running_loop().time() > self.sync_duplicates_until:
+                self.sync_duplicates.clear()
+            else:
+                message_id = loads(text).get('id')
+                if message_id in self.sync_duplicates:
+                    # Already streamed by sync_messages
+                    self.sync_duplicates.discard(message_id)
+                    return
+        await self.send_payload(text)
+    
+    async def translation_ready(self, event):
+        """Handle translations that finished after their message was delivered"""
+        await self.send_payload(event_text(event))
+    
+    async def presence(self, event):
+        """A friend came online or went offline"""
+        await self.send_payload(event_text(event))
+    
+    async def receipt(self, event):
+        """Aggregated delivery/read receipt for messages this user sent"""
+        await self.send_payload(event_text(event))
     
     async def friend_request_notification(self, event):
         """Handle friend request notifications"""
-        message = event['message']
-        await self.send(text_data=json.dumps(message))
+        await self.send_payload(event_text(event))
 
@@ -0,0 +1,126 @@
+"""
+JSON framing for websocket payloads.
+
+Payloads are serialized once by the sender and the encoded text travels
+through the channel layer, so every recipient socket forwards the same string
+instead of re-encoding the dict. orjson is used when installed, with the
+stdlib json module as a fallback.
+
+Clients can also negotiate a websocket subprotocol for a cheaper wire format:
+
+    (none) / lingobridge.json     JSON text frames (the default)
+    lingobridge.json+deflate      JSON; frames of CHAT_COMPRESSION_MIN_BYTES or more
+                                  are sent as raw-deflate compressed binary frames
+                                  (inbound ones may inflate to CHAT_MAX_INBOUND_BYTES)
+    lingobridge.msgpack           MessagePack binary frames (needs msgpack)
+
+The encoding is chosen per connection. Binary frames are built from the
+pre-encoded JSON text and memoized, so a payload fanned out to many sockets on
+the same protocol is only converted once per process.
+"""
+import json
+import zlib
+from functools import lru_cache
+
+from django.conf import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+if orjson is not None:
+    def dumps(obj):
+        return orjson.dumps(obj).decode('utf-8')
+
+    def loads(data):
+        return orjson.loads(data)
+else:
+    def dumps(obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+    def loads(data):
+        return json.loads(data)
+
+
+def encoded_event(event_type, message):
+    """Channel layer event whose payload is already serialized for the websocket"""
+    return {'type': event_type, 'text': dumps(message)}
+
+
+def event_text(event):
+    """Websocket text for an event, encoding only if the sender didn't pre-encode it"""
+    text = event.get('text')
+    if text is None:
+        text = dumps(event['message'])
+    return text
+
+
+@lru_cache(maxsize=512)
+def _deflate(text, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(text.encode('utf-8')) + compressor.flush()
+
+
+@lru_cache(maxsize=512)
+def _msgpack(text):
+    return msgpack.packb(loads(text), use_bin_type=True)
+
+
+class FrameCodec:
+    """Websocket framing for one negotiated subprotocol"""
+
+    def __init__(self, subprotocol=None, encoding='json', compress=False):
+        self.subprotocol = subprotocol
+        self.encoding = encoding
+        self.compress = compress
+        self.min_compress_bytes = getattr(settings, 'CHAT_COMPRESSION_MIN_BYTES', 256)
+        self.level = getattr(settings, 'CHAT_COMPRESSION_LEVEL', 6)
+        self.max_inbound_bytes = getattr(settings, 'CHAT_MAX_INBOUND_BYTES', 1024 * 1024)
+
+    def frame(self, text):
+        """send() keyword arguments for a JSON-encoded payload"""
+        if self.encoding == 'msgpack':
+            return {'bytes_data': _msgpack(text)}
+        if self.compress and len(text) >= self.min_compress_bytes:
+            return {'bytes_data': _deflate(text, self.level)}
+        return {'text_data': text}
+
+    def decode(self, text_data=None, bytes_data=None):
+        """Parse an inbound frame; text frames are always JSON"""
+        if text_data is not None:
+            return loads(text_data)
+        if self.encoding == 'msgpack':
+            return msgpack.unpackb(bytes_data, raw=False)
+        if self.compress:
+            # Bounded inflate: a few KB of deflate can expand to hundreds of MB
+            decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            try:
+                bytes_data = decompressor.decompress(bytes_data, self.max_inbound_bytes)
+            except zlib.error as e:
+                raise ValueError(str(e))
+            if decompressor.unconsumed_tail:
+                raise ValueError(f'Frame inflates past {self.max_inbound_bytes} bytes')
+        return loads(bytes_data)
+
+    @property
+    def name(self):
+        return 'MessagePack' if self.encoding == 'msgpack' else 'JSON'
+
+
+def negotiate(requested):
+    """Pick the first subprotocol the client offered that the server supports"""
+    for subprotocol in requested or ():
+        if subprotocol == 'lingobridge.json':
+            return FrameCodec(subprotocol)
+        if subprotocol == 'lingobridge.json+deflate':
+            return FrameCodec(subprotocol, compress=True)
+        if subprotocol == 'lingobridge.msgpack' and msgpack is not None:
+            return FrameCodec(subprotocol, encoding='msgpack')
+    return FrameCodec()
@@ -0,0 +1,146 @@
+"""
+In-memory friendship graph for friend recommendations.
+
+The graph is built once per process from Friendship ids (no model instances)
+and then kept current by the friendship signals: every create, accept, block or
+delete re-reads just that pair. Two relations are kept per user:
+
+    friends  accepted, unblocked friendships (the edges that are traversed)
+    linked   every user with any Friendship row (pending, accepted or blocked),
+             which are never recommended
+
+Signals only fire in the process that made the change, so the graph is also
+rebuilt once it is older than FRIEND_GRAPH_MAX_AGE seconds; that bounds how
+stale another worker's changes (or bulk updates, which send no signals) can be.
+"""
+import heapq
+import math
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Q
+
+_EMPTY = frozenset()
+
+
+class FriendGraph:
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self._friends = defaultdict(set)  # user id -> friend ids
+        self._linked = defaultdict(set)  # user id -> ids with any friendship row
+        self._built_at = None
+        self._lock = threading.Lock()
+        self._stats = {'builds': 0, 'updates': 0, 'queries': 0}
+
+    def _ensure_built(self):
+        if self._built_at is None or time.monotonic() - self._built_at > self.max_age:
+            self.rebuild()
+
+    def rebuild(self):
+        """Load the whole graph from the database"""
+        from .models import Friendship
+
+        friends, linked = defaultdict(set), defaultdict(set)
+        rows = Friendship.objects.values_list('from_user_id', 'to_user_id', 'accepted', 'blocked')
+        for from_id, to_id, accepted, blocked in rows.iterator(chunk_size=10000):
+            linked[from_id].add(to_id)
+            linked[to_id].add(from_id)
+            if accepted and not blocked:
+                friends[from_id].add(to_id)
+                friends[to_id].add(from_id)
+
+        with self._lock:
+            self._friends, self._linked = friends, linked
+            self._built_at = time.monotonic()
+            self._stats['builds'] += 1
+
+    def refresh_pair(self, user_id, other_id):
+        """Re-read the friendship state between two users (called after it changed)"""
+        from .models import Friendship
+
+        if self._built_at is None:
+            return  # Nothing loaded yet; the first query builds from current rows
+        rows = list(Friendship.objects.filter(
+            Q(from_user_id=user_id, to_user_id=other_id) | Q(from_user_id=other_id, to_user_id=user_id)
+        ).values_list('accepted', 'blocked'))
+        is_friend = any(accepted and not blocked for accepted, blocked in rows)
+
+        with self._lock:
+            for a, b in ((user_id, other_id), (other_id, user_id)):
+                if rows:
+                    self._linked[a].add(b)
+                else:
+                    self._discard(self._linked, a, b)
+                if is_friend:
+                    self._friends[a].add(b)
+                else:
+                    self._discard(self._friends, a, b)
+            self._stats['updates'] += 1
+
+    @staticmethod
+    def _discard(relation, a, b):
+        ids = relation.get(a)
+        if ids is not None:
+            ids.discard(b)
+            if not ids:
+                del relation[a]
+
+    def neighbors(self, user_id):
+        """Ids of user_id's accepted, unblocked friends"""
+        self._ensure_built()
+        with self._lock:
+            return frozenset(self._friends.get(user_id, _EMPTY))
+
+    def mutual_friends(self, user_id, other_id):
+        self._ensure_built()
+        with self._lock:
+            return self._friends.get(user_id, _EMPTY) & self._friends.get(other_id, _EMPTY)
+
+    def recommendations(self, user_id, limit=10):
+        """
+        Friends-of-friends of user_id that have no friendship row with them, as
+        (user id, mutual friend count, score) tuples, most mutual friends first.
+        The score is Adamic-Adar (mutual friends weighted by 1/log of their own
+        friend count) and breaks ties. Only the user's 2-hop neighbourhood is visited.
+        """
+        self._ensure_built()
+        with self._lock:
+            self._stats['queries'] += 1
+            friends = self._friends.get(user_id, _EMPTY)
+            excluded = self._linked.get(user_id, _EMPTY)
+            mutual_counts = defaultdict(int)
+            scores = defaultdict(float)
+            for friend_id in friends:
+                friends_of_friend = self._friends.get(friend_id, _EMPTY)
+                # A mutual friend knows at least user_id and the candidate, so the log is positive
+                weight = 1 / math.log(len(friends_of_friend)) if len(friends_of_friend) > 1 else 0.0
+                for candidate_id in friends_of_friend:
+                    if candidate_id != user_id and candidate_id not in excluded:
+                        mutual_counts[candidate_id] += 1
+                        scores[candidate_id] += weight
+        return heapq.nsmallest(
+            limit,
+            ((candidate_id, count, scores[candidate_id]) for candidate_id, count in mutual_counts.items()),
+            key=lambda item: (-item[1], -item[2], item[0])
+        )
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['users'] = len(self._friends)
+            stats['friendships'] = sum(len(ids) for ids in self._friends.values()) // 2
+            stats['age'] = None if self._built_at is None else round(time.monotonic() - self._built_at, 1)
+        return stats
+
+
+_graph = None
+
+def get_friend_graph():
+    """Get the process-wide friendship graph"""
+    global _graph
+
+    if _graph is None:
+        _graph = FriendGraph(max_age=getattr(settings, 'FRIEND_GRAPH_MAX_AGE', 300))
+    return _graph
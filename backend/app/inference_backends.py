@@ -0,0 +1,136 @@
+"""
+Pluggable inference backends for the opus-mt translation models.
+
+    pytorch  fp32 transformers pipeline (default)
+    int8     PyTorch dynamic int8 quantization of the Linear layers
+    onnx     ONNX Runtime export of the model, run through the same pipeline API
+
+The backend is picked per language pair with TRANSLATION_BACKENDS, e.g.
+"en-fr:onnx,fr-en:int8". A backend that fails to load falls back to
+TRANSLATION_BACKEND_DEFAULT, then pytorch. Use the check_translation_parity
+command to compare a backend against pytorch before switching a pair over.
+"""
+import logging
+from pathlib import Path
+
+from django.conf import settings
+from transformers import pipeline
+
+logger = logging.getLogger(__name__)
+
+BACKEND_CHOICES = ('pytorch', 'int8', 'onnx')
+
+
+def default_backend():
+    """TRANSLATION_BACKEND_DEFAULT, or pytorch if it isn't a known backend"""
+    backend = getattr(settings, 'TRANSLATION_BACKEND_DEFAULT', 'pytorch').strip()
+    if backend not in BACKEND_CHOICES:
+        logger.warning("Unknown default translation backend '%s', using pytorch", backend)
+        return 'pytorch'
+    return backend
+
+
+def backend_for(cache_key):
+    """Configured backend for a language pair key such as 'en-fr'"""
+    backends = {}
+    for entry in getattr(settings, 'TRANSLATION_BACKENDS', []):
+        if ':' in entry:
+            pair, backend = entry.split(':', 1)
+            backends[pair.strip()] = backend.strip()
+
+    backend = backends.get(cache_key)
+    if backend is None:
+        return default_backend()
+    if backend not in BACKEND_CHOICES:
+        logger.warning("Unknown translation backend '%s' for %s, using the default", backend, cache_key)
+        return default_backend()
+    return backend
+
+
+def load_pytorch(model_name):
+    return pipeline('translation', model=model_name)
+
+
+def load_int8(model_name):
+    """fp32 pipeline with its Linear layers dynamically quantized to int8"""
+    import torch
+    
+    translator = pipeline('translation', model=model_name)
+    translator.model = torch.quantization.quantize_dynamic(
+        translator.model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+    # Quantized Linear weights live in packed params, which parameters()/buffers()
+    # don't return, so measure the state dict for the model manager instead
+    translator.footprint_bytes = _state_dict_bytes(translator.model.state_dict())
+    return translator
+
+
+def _state_dict_bytes(state_dict):
+    """Bytes held by the tensors in a state dict, counting tied tensors once"""
+    import torch
+
+    seen = set()
+    total = 0
+    pending = list(state_dict.values())
+    while pending:
+        value = pending.pop()
+        if isinstance(value, (tuple, list)):
+            # Packed params of quantized Linear layers: (int8 weight, bias)
+            pending.extend(value)
+        elif isinstance(value, torch.Tensor):
+            key = (value.data_ptr(), value.numel())
+            if key not in seen:
+                seen.add(key)
+                total += value.numel() * value.element_size()
+    return total
+
+
+def load_onnx(model_name):
+    """Export the model to ONNX once (cached on disk) and run it with ONNX Runtime"""
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    from transformers import AutoTokenizer
+    
+    export_dir = Path(getattr(settings, 'TRANSLATION_ONNX_DIR', 'onnx_models')) / model_name.replace('/', '--')
+    if export_dir.exists():
+        model = ORTModelForSeq2SeqLM.from_pretrained(export_dir)
+        tokenizer = AutoTokenizer.from_pretrained(export_dir)
+    else:
+        print(f"Exporting {model_name} to ONNX in {export_dir}")
+        model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True)
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model.save_pretrained(export_dir)
+        tokenizer.save_pretrained(export_dir)
+    
+    translator = pipeline('translation', model=model, tokenizer=tokenizer)
+    # No torch parameters to measure, so report the exported weights to the model manager
+    translator.footprint_bytes = sum(
+        path.stat().st_size for path in export_dir.glob('*.onnx*')
+    )
+    return translator
+
+
+LOADERS = {
+    'pytorch': load_pytorch,
+    'int8': load_int8,
+    'onnx': load_onnx,
+}
+
+
+def load_pipeline(model_name, backend='pytorch', fallback=True):
+    """
+    Build a translation pipeline with the given backend. If it fails to load
+    (missing package, failed export, quantization error...) fall back to the
+    default backend, then pytorch, unless fallback is False.
+    """
+    if backend != 'pytorch':
+        try:
+            return LOADERS[backend](model_name)
+        except Exception:
+            if not fallback:
+                raise
+            next_backend = default_backend()
+            if next_backend == backend:
+                next_backend = 'pytorch'
+            logger.exception("Translation backend '%s' failed to load %s, using %s", backend, model_name, next_backend)
+            return load_pipeline(model_name, next_backend)
+    return load_pytorch(model_name)
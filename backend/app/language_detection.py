@@ -0,0 +1,123 @@
+"""
+Language detection restricted to the languages we translate between.
+
+Short and ASCII-only messages take a deterministic fast path (common-word
+lexicon and accent hints) when it gives a clear answer. Everything else runs
+langdetect over only the en/fr/es profiles with a fixed seed, so the same text
+always gets the same answer. Results are memoized.
+"""
+import os
+import re
+from functools import lru_cache
+
+from langdetect.detector_factory import DetectorFactory, PROFILES_DIRECTORY
+from langdetect.lang_detect_exception import LangDetectException
+
+SUPPORTED_LANGUAGES = ('en', 'fr', 'es')
+DEFAULT_LANGUAGE = 'en'
+
+# Messages with at most this many words are decided by lexicon/accent hints when those are conclusive
+SHORT_TEXT_WORDS = 3
+
+COMMON_WORDS = {
+    'en': {
+        'hi', 'hello', 'hey', 'thanks', 'thank', 'you', 'ok', 'okay', 'yes', 'yeah', 'the', 'and',
+        'is', 'are', 'what', 'how', 'good', 'morning', 'night', 'bye', 'see', 'my', 'it', 'to', 'of',
+        'in', 'please', 'sorry', 'love', 'lol', 'with', 'for', 'this', 'that', 'have', 'was', 'not',
+        'be', 'will', 'can', "i'm", 'tomorrow', 'today', 'where', 'when', 'why', 'your', 'we',
+    },
+    'fr': {
+        'bonjour', 'salut', 'merci', 'oui', 'le', 'les', 'et', 'est', 'je', 'vous', 'bonne',
+        'nuit', 'bonsoir', 'ça', 'va', 'comment', 'au', 'revoir', 'des', 'une', 'pas', "c'est",
+        'très', 'bien', 'avec', 'pour', 'mais', 'qui', 'quoi', 'désolé', 'demain', 'du', 'il',
+        'elle', 'nous', 'ce', 'sont', 'suis', 'où', 'pourquoi', 'quand', 'aujourd', "j'ai", 'ton',
+        'bientôt', 'bientot',
+    },
+    'es': {
+        'hola', 'gracias', 'sí', 'el', 'los', 'las', 'y', 'yo', 'tú', 'usted', 'buenos', 'días',
+        'dias', 'buenas', 'noches', 'qué', 'cómo', 'como', 'estás', 'estas', 'adiós', 'adios',
+        'una', 'pero', 'con', 'para', 'muy', 'bien', 'mañana', 'por', 'favor', 'lo', 'siento',
+        'del', 'está', 'esta', 'soy', 'estoy', 'nosotros', 'dónde', 'donde', 'hoy', 'porque', 'tengo',
+    },
+}
+
+# Characters that only appear in one of the supported languages
+ACCENT_HINTS = {
+    'es': set('ñ¿¡'),
+    'fr': set('çœèêëàâîïôûù'),
+}
+
+_WORD_RE = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?")
+
+_factory = None
+
+
+def _get_factory():
+    """langdetect factory loaded with only the supported language profiles"""
+    global _factory
+    
+    if _factory is None:
+        profiles = []
+        for lang in SUPPORTED_LANGUAGES:
+            with open(os.path.join(PROFILES_DIRECTORY, lang), encoding='utf-8') as f:
+                profiles.append(f.read())
+        factory = DetectorFactory()
+        factory.load_json_profile(profiles)
+        # langdetect is randomized; a fixed seed makes results reproducible
+        factory.set_seed(0)
+        _factory = factory
+    return _factory
+
+
+def _lexicon_scores(words):
+    return {lang: sum(word in vocabulary for word in words) for lang, vocabulary in COMMON_WORDS.items()}
+
+
+def _fast_path(text, words):
+    """Deterministic guess for short or ASCII-only text, or None to fall through"""
+    scores = _lexicon_scores(words)
+    best = max(scores, key=scores.get)
+    runner_up = max(score for lang, score in scores.items() if lang != best)
+    
+    if len(words) <= SHORT_TEXT_WORDS:
+        if scores[best] > runner_up:
+            return best
+        chars = set(text.lower())
+        for lang, hints in ACCENT_HINTS.items():
+            if chars & hints:
+                return lang
+        # No lexicon or accent evidence ("Hasta luego", "Bon anniversaire"): let langdetect decide
+        return None
+    
+    if text.isascii() and scores[best] >= 2 and scores[best] >= 2 * runner_up:
+        return best
+    return None
+
+
+@lru_cache(maxsize=8192)
+def _detect(text):
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        # Emoji, numbers or punctuation only
+        return DEFAULT_LANGUAGE
+    
+    language = _fast_path(text, words)
+    if language is not None:
+        return language
+    
+    try:
+        detector = _get_factory().create()
+        detector.append(text)
+        return detector.detect()
+    except LangDetectException:
+        return DEFAULT_LANGUAGE
+
+
+def detect_language(text):
+    """Detect the language of text, always returning one of SUPPORTED_LANGUAGES"""
+    return _detect(' '.join(text.split()))
+
+
+def stats():
+    info = _detect.cache_info()
+    return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize}
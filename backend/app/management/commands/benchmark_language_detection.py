@@ -0,0 +1,60 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from langdetect import detect
+
+from app import language_detection
+from app.management.commands.check_translation_parity import DEFAULT_CORPUS
+
+SHORT_MESSAGES = ['hi', 'ok', 'thanks', 'bonjour', 'merci', 'hola', 'gracias', 'lol', 'see you', '👍']
+
+
+class Command(BaseCommand):
+    help = 'Compare the old double langdetect.detect() calls with detect_language() per message'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def _time(self, func, messages, iterations):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for message in messages:
+                func(message)
+        return (time.perf_counter() - start) / (iterations * len(messages)) * 1e6
+
+    def handle(self, *args, **options):
+        with open(DEFAULT_CORPUS, encoding='utf-8') as f:
+            corpus = json.load(f)
+        messages = SHORT_MESSAGES + [text for texts in corpus.values() for text in texts]
+        iterations = options['iterations']
+
+        def old(message):
+            # ChatConsumer.receive and translate_text each called detect()
+            for _ in range(2):
+                try:
+                    detect(message)
+                except Exception:
+                    pass
+
+        def new_cold(message):
+            language_detection._detect.cache_clear()
+            language_detection.detect_language(message)
+
+        # Load both sets of profiles before timing
+        old(messages[-1])
+        new_cold(messages[-1])
+
+        results = {
+            'double detect() (55 languages)': self._time(old, messages, iterations),
+            'detect_language() uncached': self._time(new_cold, messages, iterations),
+            'detect_language() memoized': self._time(language_detection.detect_language, messages, iterations),
+        }
+        baseline = results['double detect() (55 languages)']
+        self.stdout.write(f'{len(messages)} messages x {iterations} iterations')
+        for name, micros in results.items():
+            self.stdout.write(f'  {name:<32} {micros:10.1f} us/message  ({baseline / micros:6.1f}x)')
+
+        # How often the old unseeded detector changes its mind on the same input
+        unstable = sum(len({detect(message) for _ in range(5)}) > 1 for message in messages if message != '👍')
+        self.stdout.write(f'  old detector gave inconsistent answers for {unstable}/{len(messages) - 1} messages')
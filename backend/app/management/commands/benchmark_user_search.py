@@ -0,0 +1,101 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from app.user_search import BACKENDS, backend_name
+
+User = get_user_model()
+
+# Synthetic users are recognised by their email domain
+DOMAIN = '@bench.lingobridge.invalid'
+SYLLABLES = ['an', 'ber', 'chi', 'da', 'el', 'fro', 'gu', 'ha', 'ix', 'jo', 'ka', 'lu', 'mi', 'no', 'or',
+             'pe', 'qui', 'ra', 'so', 'ti', 'ul', 've', 'wa', 'xe', 'ya', 'zu']
+
+
+def synthetic_username(rng, index):
+    name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+    return f'{name}{index}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Time user search backends at several user-table sizes. Adds up to a million synthetic '
+        f'"*{DOMAIN}" users to --database (migrated first) and removes them afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--keep', action='store_true', help='Keep the synthetic users')
+        parser.add_argument(
+            '--database',
+            default='default',
+            help='Database alias to fill with synthetic users; use a dedicated benchmark database',
+        )
+        parser.add_argument(
+            '--allow-default-database',
+            action='store_true',
+            help="Allow writing synthetic users to the 'default' database",
+        )
+
+    def _populate(self, size):
+        users = User.objects.using(self.database)
+        existing = users.filter(email__endswith=DOMAIN).count()
+        rng = random.Random(existing)
+        for start in range(existing, size, 5000):
+            users.bulk_create([
+                User(username=synthetic_username(rng, index), email=f'user{index}{DOMAIN}', password='!')
+                for index in range(start, min(start + 5000, size))
+            ])
+
+    def _time(self, backend, term, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(
+                backend.search(User.objects.using(self.database), term)
+                .order_by('-relevance', 'username')
+                .values_list('id', flat=True)[:50]
+            )
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        self.database = options['database']
+        if self.database not in connections:
+            raise CommandError(f"Unknown database alias '{self.database}'")
+        if self.database == 'default' and not options['allow_default_database']:
+            raise CommandError(
+                "This command bulk-inserts and then deletes up to a million users. Point --database at a "
+                "dedicated benchmark database, or pass --allow-default-database to use 'default'."
+            )
+
+        backends = [BACKENDS['contains']()]
+        configured = backend_name(connections[self.database].vendor)
+        if configured != 'contains':
+            backends.append(BACKENDS[configured]())
+
+        try:
+            for size in sorted(options['sizes']):
+                self._populate(size)
+                sample = User.objects.using(self.database).filter(email__endswith=DOMAIN).order_by('id').values_list('username', flat=True)[size // 2]
+                stem = sample.rstrip('0123456789')
+                terms = {
+                    'exact': sample,
+                    'prefix': sample[:4],
+                    'contains': stem[1:5],
+                    'typo': stem[1] + stem[0] + stem[2:],
+                }
+                self.stdout.write(f'{size} synthetic users (median of {options["repeat"]}, first page of 50):')
+                for kind, term in terms.items():
+                    results = '  '.join(
+                        f'{backend.name}: {self._time(backend, term, options["repeat"]):8.2f} ms' for backend in backends
+                    )
+                    self.stdout.write(f'  {kind:<9} {term!r:<24} {results}')
+        finally:
+            if not options['keep']:
+                User.objects.using(self.database).filter(email__endswith=DOMAIN).delete()
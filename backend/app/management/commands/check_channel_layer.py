@@ -0,0 +1,48 @@
+import asyncio
+import time
+from collections import Counter
+
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Round-trip messages through the configured channel layer and show how user groups spread across shards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000, help='Number of user_{id} groups to place on shards')
+        parser.add_argument('--messages', type=int, default=200, help='Messages to time through group_send')
+
+    def handle(self, *args, **options):
+        layer = get_channel_layer()
+        self.stdout.write(f'Channel layer: {layer}')
+        try:
+            asyncio.run(self._round_trip(layer, options['messages']))
+        except asyncio.TimeoutError:
+            raise CommandError('Timed out waiting for a message: is every worker using the same broker?')
+
+        if hasattr(layer, 'consistent_hash') and getattr(layer, 'ring_size', 1) > 1:
+            counts = Counter(layer.consistent_hash(f'user_{user_id}') for user_id in range(1, options['users'] + 1))
+            self.stdout.write(f"{options['users']} user groups across {layer.ring_size} shards:")
+            for index, host in enumerate(layer.hosts):
+                self.stdout.write(f"  {host.get('address', host)}: {counts[index]}")
+
+    async def _round_trip(self, layer, count):
+        channel = await layer.new_channel()
+        group = 'user_0'
+        await layer.group_add(group, channel)
+        try:
+            await layer.send(channel, {'type': 'check', 'n': 0})
+            await asyncio.wait_for(layer.receive(channel), timeout=5)
+            self.stdout.write('  send/receive: ok')
+
+            start = time.perf_counter()
+            for n in range(count):
+                await layer.group_send(group, {'type': 'check', 'n': n})
+                message = await asyncio.wait_for(layer.receive(channel), timeout=5)
+                if message['n'] != n:
+                    raise CommandError(f"Expected message {n}, got {message['n']}")
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f'  group_send/receive: ok ({elapsed / count * 1000:.2f} ms per round trip)')
+        finally:
+            await layer.group_discard(group, channel)
@@ -0,0 +1,77 @@
+import json
+import time
+from difflib import SequenceMatcher
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.consumers import MODEL_MAP
+from app.inference_backends import BACKEND_CHOICES, load_pipeline
+
+DEFAULT_CORPUS = Path(__file__).resolve().parents[2] / 'data' / 'translation_parity.json'
+
+
+def _translate(translator, texts):
+    results = translator(list(texts), max_length=512, batch_size=len(texts))
+    return [result['translation_text'] for result in results]
+
+
+class Command(BaseCommand):
+    help = 'Compare a translation backend against the pytorch reference on a fixture corpus'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', choices=[b for b in BACKEND_CHOICES if b != 'pytorch'], required=True)
+        parser.add_argument('--pairs', nargs='*', default=list(MODEL_MAP), help="Pairs such as 'en-fr' (default: all)")
+        parser.add_argument('--corpus', default=str(DEFAULT_CORPUS), help='JSON file of {language: [sentences]}')
+        parser.add_argument(
+            '--min-similarity',
+            type=float,
+            default=0.9,
+            help='Fail if the mean character similarity to pytorch output falls below this',
+        )
+
+    def handle(self, *args, **options):
+        with open(options['corpus'], encoding='utf-8') as f:
+            corpus = json.load(f)
+
+        failed = []
+        for pair in options['pairs']:
+            if pair not in MODEL_MAP:
+                raise CommandError(f'Unknown language pair: {pair}')
+            source_lang = pair.split('-')[0]
+            texts = corpus.get(source_lang)
+            if not texts:
+                self.stdout.write(self.style.WARNING(f'{pair}: no {source_lang} sentences in corpus, skipped'))
+                continue
+
+            timings = {}
+            outputs = {}
+            for backend in ('pytorch', options['backend']):
+                # No fallback: a backend that fails to load must not be compared as pytorch
+                translator = load_pipeline(MODEL_MAP[pair], backend, fallback=False)
+                _translate(translator, texts[:1])  # warmup
+                start = time.perf_counter()
+                outputs[backend] = _translate(translator, texts)
+                timings[backend] = time.perf_counter() - start
+                del translator
+
+            reference, candidate = outputs['pytorch'], outputs[options['backend']]
+            similarities = [SequenceMatcher(None, a, b).ratio() for a, b in zip(reference, candidate)]
+            mean_similarity = sum(similarities) / len(similarities)
+            exact = sum(a == b for a, b in zip(reference, candidate))
+
+            self.stdout.write(
+                f"{pair}: exact {exact}/{len(texts)}, similarity {mean_similarity:.3f}, "
+                f"pytorch {timings['pytorch'] * 1000:.0f} ms, "
+                f"{options['backend']} {timings[options['backend']] * 1000:.0f} ms"
+            )
+            for text, a, b, similarity in zip(texts, reference, candidate, similarities):
+                if similarity < options['min_similarity']:
+                    self.stdout.write(f'    {text!r}\n      pytorch: {a!r}\n      {options["backend"]}: {b!r}')
+
+            if mean_similarity < options['min_similarity']:
+                failed.append(pair)
+
+        if failed:
+            raise CommandError(f"{options['backend']} diverges from pytorch on: {', '.join(failed)}")
+        self.stdout.write(self.style.SUCCESS(f"{options['backend']} matches pytorch within tolerance"))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.warmup import parse_pair, preload_pairs, warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        'Load translation models and run a warmup batch through each configured pair in this process '
+        '(checks the models and fills the download cache; serving workers warm themselves at startup)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'pairs',
+            nargs='*',
+            help="Language pairs such as 'en-fr' (defaults to TRANSLATION_PRELOAD_PAIRS)",
+        )
+
+    def handle(self, *args, **options):
+        pairs = [parse_pair(pair) for pair in options['pairs']] or preload_pairs()
+        if not pairs:
+            raise CommandError('No pairs given and TRANSLATION_PRELOAD_PAIRS is empty')
+
+        results = warm_up(pairs)
+        for pair, ok in results.items():
+            if ok:
+                self.stdout.write(self.style.SUCCESS(f'{pair}: warm'))
+            else:
+                self.stdout.write(self.style.ERROR(f'{pair}: failed'))
+
+        if not all(results.values()):
+            raise CommandError('Some translation models failed to warm up')
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.translation_cache import get_translation_cache
+
+
+class Command(BaseCommand):
+    help = 'Delete persistent translation cache entries older than TRANSLATION_CACHE_DB_TTL'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age',
+            type=int,
+            default=getattr(settings, 'TRANSLATION_CACHE_DB_TTL', 30 * 86400),
+            help='Delete entries created more than this many seconds ago',
+        )
+
+    def handle(self, *args, **options):
+        deleted = get_translation_cache().prune(options['max_age'])
+        self.stdout.write(f'Deleted {deleted} translation cache entries')
@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.recommendations import refresh
+
+
+class Command(BaseCommand):
+    help = 'Recompute materialized friend recommendations for users whose 2-hop neighbourhood changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Recompute every user, not just the dirty ones')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Users written per transaction')
+        parser.add_argument('--loop', action='store_true', help='Keep running as a background worker')
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=getattr(settings, 'FRIEND_RECOMMENDATIONS_REFRESH_INTERVAL', 60),
+            help='Seconds between runs with --loop',
+        )
+
+    def handle(self, *args, **options):
+        all_users = options['all']
+        try:
+            while True:
+                start = time.perf_counter()
+                count = refresh(batch_size=options['batch_size'], all_users=all_users)
+                if count or not options['loop']:
+                    self.stdout.write(f'Recomputed {count} users in {time.perf_counter() - start:.2f}s')
+                if not options['loop']:
+                    break
+                all_users = False
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Friend recommendation worker stopped')
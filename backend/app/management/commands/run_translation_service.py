@@ -0,0 +1,38 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app.translation_service import TranslationServer
+from app.warmup import preload_pairs
+
+
+class Command(BaseCommand):
+    help = 'Run the out-of-process translation service (worker pool behind a local socket)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--address',
+            default=getattr(settings, 'TRANSLATION_SERVICE_ADDRESS', ''),
+            help="Listen address, either 'unix:/path/to.sock' or 'host:port'",
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=getattr(settings, 'TRANSLATION_SERVICE_WORKERS', 2),
+            help='Number of worker processes owning translation models',
+        )
+
+    def handle(self, *args, **options):
+        if not options['address']:
+            raise CommandError('Set TRANSLATION_SERVICE_ADDRESS or pass --address')
+
+        server = TranslationServer(
+            options['address'],
+            num_workers=options['workers'],
+            warm_pairs=preload_pairs(),
+        )
+        try:
+            asyncio.run(server.serve_forever())
+        except KeyboardInterrupt:
+            self.stdout.write('Translation service stopped')
@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.db import migrations
+
+try:
+    from django.contrib.postgres.operations import TrigramExtension
+except ImportError:
+    # No psycopg, so this can't be a PostgreSQL deployment
+    TrigramExtension = None
+
+FTS_TABLE = 'app_user_search'
+
+
+def create_search_indexes(apps, schema_editor):
+    """Indexes for app.user_search: pg_trgm GIN indexes on PostgreSQL, an FTS5 table on SQLite"""
+    table = schema_editor.quote_name(apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table)
+    vendor = schema_editor.connection.vendor
+
+    if vendor == 'postgresql':
+        # icontains compiles to UPPER(col) LIKE UPPER(...); similarity (%) uses the plain column
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS user_username_upper_trgm ON {table} USING gin (UPPER(username) gin_trgm_ops)')
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS user_email_upper_trgm ON {table} USING gin (UPPER(email) gin_trgm_ops)')
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS user_username_trgm ON {table} USING gin (username gin_trgm_ops)')
+
+    elif vendor == 'sqlite':
+        # External-content FTS5 table kept in sync with the user table by triggers
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"username, email, content={table}, content_rowid='id', tokenize='trigram')"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, username, email) VALUES (new.id, new.username, new.email); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, username, email) VALUES ('delete', old.id, old.username, old.email); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF username, email ON {table} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, username, email) VALUES ('delete', old.id, old.username, old.email); "
+            f"INSERT INTO {FTS_TABLE}(rowid, username, email) VALUES (new.id, new.username, new.email); END"
+        )
+        schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == 'postgresql':
+        for index in ('user_username_upper_trgm', 'user_email_upper_trgm', 'user_username_trgm'):
+            schema_editor.execute(f'DROP INDEX IF EXISTS {index}')
+
+    elif vendor == 'sqlite':
+        for trigger in ('insert', 'delete', 'update'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{trigger}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_message_history_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # TrigramExtension runs CREATE EXTENSION pg_trgm unless the extension already
+    # exists. pg_trgm is a trusted extension, so on PostgreSQL 13+ that needs CREATE
+    # on the database (superuser on older versions). Without it, have an admin run
+    # CREATE EXTENSION pg_trgm in the database before migrating.
+    operations = ([TrigramExtension()] if TrigramExtension else []) + [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,124 @@
+"""
+Memory-budgeted manager for loaded translation pipelines.
+
+Tracks the approximate footprint of each loaded pipeline and evicts the least
+recently used language pairs once the configured budget is exceeded.
+"""
+import gc
+import threading
+from collections import OrderedDict
+
+# Rough size of an opus-mt model, used when the footprint can't be measured
+DEFAULT_FOOTPRINT = 300 * 1024 * 1024
+
+
+def estimate_footprint(translator):
+    """Approximate memory held by a pipeline's weights and buffers, in bytes"""
+    footprint = getattr(translator, 'footprint_bytes', None)
+    if footprint is not None:
+        return footprint
+    
+    model = getattr(translator, 'model', None)
+    try:
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+    except Exception:
+        return DEFAULT_FOOTPRINT
+
+
+class ModelManager:
+    """
+    LRU of loaded pipelines keyed by language pair ('en-fr').
+    A budget of 0 disables eviction. Pinned pairs (the preloaded ones) are
+    never evicted to make room for others.
+    """
+    
+    def __init__(self, loader, budget_mb=0, pinned=()):
+        self.loader = loader
+        self.budget = budget_mb * 1024 * 1024
+        self.pinned = frozenset(pinned)
+        self._models = OrderedDict()  # key -> (translator, footprint)
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._stats = {'hits': 0, 'loads': 0, 'load_failures': 0, 'evictions': 0}
+    
+    def get(self, key):
+        """Return the pipeline for key, loading it (and evicting others) if needed"""
+        with self._lock:
+            item = self._models.get(key)
+            if item is not None:
+                self._models.move_to_end(key)
+                self._stats['hits'] += 1
+                return item[0]
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        
+        # Load outside the main lock so other pairs stay usable, but only once per pair
+        with load_lock:
+            with self._lock:
+                item = self._models.get(key)
+                if item is not None:
+                    self._models.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return item[0]
+            
+            translator = self.loader(key)
+            if translator is None:
+                with self._lock:
+                    self._stats['load_failures'] += 1
+                return None
+            
+            footprint = estimate_footprint(translator)
+            with self._lock:
+                self._models[key] = (translator, footprint)
+                self._stats['loads'] += 1
+                evicted = self._evict(keep=key)
+        
+        if evicted:
+            print(f"Evicted translation models to stay within budget: {', '.join(evicted)}")
+            gc.collect()
+        return translator
+    
+    def _evict(self, keep):
+        """Drop least recently used pipelines until under budget. Caller holds the lock."""
+        evicted = []
+        if not self.budget:
+            return evicted
+        
+        while self._total() > self.budget:
+            key = next((key for key in self._models if key != keep and key not in self.pinned), None)
+            if key is None:
+                break
+            del self._models[key]
+            self._stats['evictions'] += 1
+            evicted.append(key)
+        return evicted
+    
+    def _total(self):
+        return sum(footprint for _, footprint in self._models.values())
+    
+    def evict(self, key):
+        with self._lock:
+            removed = self._models.pop(key, None) is not None
+            if removed:
+                self._stats['evictions'] += 1
+        if removed:
+            gc.collect()
+        return removed
+    
+    def is_loaded(self, key):
+        with self._lock:
+            return key in self._models
+    
+    def __contains__(self, key):
+        return self.is_loaded(key)
+    
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['loaded'] = {
+                key: round(footprint / (1024 * 1024), 1)
+                for key, (_, footprint) in self._models.items()
+            }
+            stats['total_mb'] = round(self._total() / (1024 * 1024), 1)
+        stats['budget_mb'] = round(self.budget / (1024 * 1024), 1)
+        return stats
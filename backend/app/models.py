@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.db.models import Q
 from django.contrib.auth import authenticate, get_user_model
 User = get_user_model()
@@ -26,5 +27,51 @@ class Message(models.Model):
     content = models.TextField()
     translated_content = models.TextField()
     original_language = models.CharField(max_length=5)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: write-behind persistence assigns timestamps before the row is written
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Receipt updates only touch the receiver's messages that aren't read yet
+            models.Index(fields=['receiver', 'status'], name='message_receiver_status_idx'),
+            # Reconnect sync: messages to/from a user after a given id
+            models.Index(fields=['receiver', 'id'], name='message_receiver_sync_idx'),
+            models.Index(fields=['sender', 'id'], name='message_sender_sync_idx'),
+            # History pages between two users, newest first (keyset on timestamp, id)
+            models.Index(fields=['sender', 'receiver', 'timestamp', 'id'], name='message_history_idx'),
+        ]
+
+
+class TranslationCacheEntry(models.Model):
+    """Persistent translation cache shared across workers, keyed by normalized text hash"""
+    text_hash = models.CharField(max_length=64)
+    source_language = models.CharField(max_length=5)
+    target_language = models.CharField(max_length=5)
+    translated_text = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('text_hash', 'source_language', 'target_language')
+
+
+class FriendRecommendation(models.Model):
+    """Precomputed friend-of-friend recommendation, refreshed by refresh_friend_recommendations"""
+    user = models.ForeignKey(User, related_name='friend_recommendations', on_delete=models.CASCADE)
+    candidate = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    mutual_count = models.PositiveIntegerField()
+    # Adamic-Adar: mutual friends weighted by 1/log(their friend count); breaks ties in mutual_count
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'candidate')
+        indexes = [
+            models.Index(fields=['user', '-mutual_count', '-score'], name='friend_rec_rank_idx'),
+        ]
+
 
+class FriendRecommendationState(models.Model):
+    """When a user's recommendations were computed, and whether their 2-hop neighbourhood changed since"""
+    user = models.OneToOneField(User, primary_key=True, related_name='+', on_delete=models.CASCADE)
+    computed_at = models.DateTimeField(null=True)
+    dirty_since = models.DateTimeField(null=True, db_index=True)
@@ -0,0 +1,208 @@
+"""
+Write-behind persistence for chat messages.
+
+Messages get their id and timestamp up front, are delivered immediately, and
+are written to the database in batches with bulk_create once
+CHAT_WRITE_BEHIND_BATCH_SIZE messages are buffered or CHAT_WRITE_BEHIND_FLUSH_MS
+has passed.
+
+Ids are time-ordered integers (milliseconds since ID_EPOCH, worker id,
+per-millisecond sequence), so they sort in send order and never collide across
+workers as long as each worker has a distinct CHAT_WORKER_ID. They fit in 53
+bits so JavaScript clients can represent them exactly. Batches are
+written one at a time, in order. A batch rejected by an integrity constraint
+(e.g. the receiver deleted their account before the flush) is retried row by
+row and only the offending rows are dropped and logged; a batch that fails for
+any other reason (database unavailable) goes back to the front of the buffer
+and is retried. The buffer is flushed at interpreter exit.
+"""
+import asyncio
+import atexit
+import threading
+import time
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, connection, transaction
+
+from .background import run_in_background
+
+# 2024-01-01T00:00:00Z in milliseconds; 40 bits of milliseconds last until 2058
+ID_EPOCH = 1704067200000
+WORKER_BITS = 7
+SEQUENCE_BITS = 6
+
+
+class MessageIdGenerator:
+    """Time-ordered unique ids: | milliseconds | worker id | sequence |"""
+
+    def __init__(self, worker_id):
+        # Wrapping an out-of-range id would silently share it with another worker
+        if not 0 <= worker_id < (1 << WORKER_BITS):
+            raise ImproperlyConfigured(
+                f"Worker id must be between 0 and {(1 << WORKER_BITS) - 1}, got {worker_id}"
+            )
+        self.worker_id = worker_id
+        self._last_ms = 0
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        with self._lock:
+            now = max(int(time.time() * 1000), self._last_ms)
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) % (1 << SEQUENCE_BITS)
+                if self._sequence == 0:
+                    # Sequence exhausted for this millisecond: move on to the next one
+                    while now <= self._last_ms:
+                        now = int(time.time() * 1000)
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            return ((now - ID_EPOCH) << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self._sequence
+
+
+class MessageWriteBehind:
+    def __init__(self, worker_id, batch_size=200, flush_ms=50):
+        self.ids = MessageIdGenerator(worker_id)
+        self.batch_size = max(1, batch_size)
+        self.flush_delay = flush_ms / 1000
+        self._buffer = []
+        self._lock = threading.Lock()        # guards the buffer
+        self._flush_lock = threading.Lock()  # one batch in flight at a time, keeps write order
+        self._timer = None
+        self._stats = {'buffered': 0, 'flushed': 0, 'batches': 0, 'failures': 0, 'dropped': 0}
+
+    def add(self, messages):
+        """Assign ids/timestamps to unsaved Message instances and queue them for writing"""
+        from django.utils import timezone
+
+        now = timezone.now()
+        for message in messages:
+            message.id = self.ids.next_id()
+            message.timestamp = now
+        with self._lock:
+            self._buffer.extend(messages)
+            self._stats['buffered'] += len(messages)
+            full = len(self._buffer) >= self.batch_size
+        self._schedule(0 if full else self.flush_delay)
+        return messages
+
+    def _schedule(self, delay):
+        loop = asyncio.get_running_loop()
+        if delay == 0:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            run_in_background(self.flush())
+        elif self._timer is None:
+            self._timer = loop.call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        run_in_background(self.flush())
+
+    async def flush(self):
+        """Write everything buffered so far (waits for any batch already being written)"""
+        try:
+            await database_sync_to_async(self.flush_sync)()
+        except Exception as e:
+            print(f"Message write-behind flush failed, retrying: {e}")
+            self._schedule(max(self.flush_delay, 1))
+
+    def flush_sync(self):
+        from .models import Message
+
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = self._buffer[:self.batch_size]
+                    del self._buffer[:self.batch_size]
+                if not batch:
+                    return
+                try:
+                    with transaction.atomic():
+                        Message.objects.bulk_create(batch)
+                        self._sync_sequence(Message._meta.db_table)
+                except IntegrityError:
+                    # One bad row must not hold back everything queued behind it
+                    written = self._write_rows(batch)
+                    with self._lock:
+                        self._stats['flushed'] += written
+                        self._stats['dropped'] += len(batch) - written
+                        self._stats['batches'] += 1
+                    continue
+                except Exception:
+                    # Put the batch back in front so ordering is preserved on retry
+                    with self._lock:
+                        self._buffer[:0] = batch
+                        self._stats['failures'] += 1
+                    raise
+                with self._lock:
+                    self._stats['flushed'] += len(batch)
+                    self._stats['batches'] += 1
+
+    def _write_rows(self, batch):
+        """Insert a batch one row at a time, dropping (and logging) rows that violate a constraint"""
+        from .models import Message
+
+        written = 0
+        for message in batch:
+            try:
+                with transaction.atomic():
+                    Message.objects.bulk_create([message])
+            except IntegrityError as e:
+                print(
+                    f"Message write-behind dropped message {message.id} "
+                    f"({message.sender_id} -> {message.receiver_id}): {e}"
+                )
+                continue
+            written += 1
+        if written:
+            self._sync_sequence(Message._meta.db_table)
+        return written
+
+    def _sync_sequence(self, table):
+        """Keep PostgreSQL's id sequence ahead of explicit ids, so regular inserts still sort after them"""
+        if connection.vendor != 'postgresql':
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))"
+            )
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._buffer)
+        return stats
+
+
+_writer = None
+
+def get_write_behind():
+    """Get the process-wide write-behind persister, or None when messages are written synchronously"""
+    global _writer
+
+    if not getattr(settings, 'CHAT_WRITE_BEHIND', False):
+        return None
+    if _writer is None:
+        worker_id = getattr(settings, 'CHAT_WORKER_ID', None)
+        if worker_id in (None, ''):
+            # Guessing from the pid collides across hosts and containers (often all pid 1)
+            raise ImproperlyConfigured(
+                "CHAT_WORKER_ID must be set to a unique value (0-127) per worker when CHAT_WRITE_BEHIND is enabled"
+            )
+        try:
+            worker_id = int(worker_id)
+        except ValueError:
+            raise ImproperlyConfigured(f"CHAT_WORKER_ID must be an integer (0-127), got {worker_id!r}")
+        _writer = MessageWriteBehind(
+            worker_id=worker_id,
+            batch_size=getattr(settings, 'CHAT_WRITE_BEHIND_BATCH_SIZE', 200),
+            flush_ms=getattr(settings, 'CHAT_WRITE_BEHIND_FLUSH_MS', 50),
+        )
+        # Shutdown hook: don't lose acknowledged messages when the worker exits
+        atexit.register(_writer.flush_sync)
+    return _writer
@@ -0,0 +1,271 @@
+"""
+Presence: who is online, announced only to their online friends.
+
+Every open ChatConsumer registers its channel name for its user and refreshes
+it on a heartbeat. A user is online while at least one of their connections is
+registered and not expired (so several tabs count once, and a worker that dies
+without running disconnect() stops refreshing and its connections expire after
+CHAT_PRESENCE_TTL seconds).
+
+A change is not announced right away: the user's state is re-checked after
+CHAT_PRESENCE_DEBOUNCE_MS and only announced if it differs from the last state
+announced for them, so reconnects and flapping connections produce no events.
+The announcement goes to the user_{id} groups of the user's online friends only.
+
+The registry lives in process memory, or in Redis (sharded the same way as the
+channel layer) when CHANNEL_REDIS_HOSTS is set, so every worker sees the same state.
+"""
+import asyncio
+import time
+from collections import defaultdict
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db.models import Q
+
+from .background import run_in_background
+from .encoding import encoded_event
+
+
+class MemoryPresenceStore:
+    """Single-process registry: {user_id: {connection: expires_at}}"""
+
+    def __init__(self):
+        self._connections = defaultdict(dict)
+        self._announced = {}
+
+    def _live(self, user_id, now):
+        connections = self._connections.get(user_id)
+        if connections is None:
+            return 0
+        for connection, expires_at in list(connections.items()):
+            if expires_at <= now:
+                del connections[connection]
+        if not connections:
+            del self._connections[user_id]
+            return 0
+        return len(connections)
+
+    async def add(self, user_id, connection, expires_at):
+        """Register or refresh a connection; True if the user just came online"""
+        was_online = self._live(user_id, time.time()) > 0
+        self._connections[user_id][connection] = expires_at
+        return not was_online
+
+    async def remove(self, user_id, connection):
+        """Unregister a connection; True if the user has no connections left"""
+        self._connections.get(user_id, {}).pop(connection, None)
+        return self._live(user_id, time.time()) == 0
+
+    async def online(self, user_ids):
+        now = time.time()
+        return {user_id for user_id in user_ids if self._live(user_id, now)}
+
+    async def swap_announced(self, user_id, online):
+        """Record the state announced for a user and return the previous one (None if never announced)"""
+        previous = self._announced.get(user_id)
+        self._announced[user_id] = online
+        return previous
+
+    async def expired(self, now):
+        """Users whose last connection has expired since the previous sweep"""
+        users = [user_id for user_id, connections in self._connections.items() if min(connections.values()) <= now]
+        return [user_id for user_id in users if self._live(user_id, now) == 0]
+
+
+class RedisPresenceStore:
+    """
+    Shared registry: one sorted set of connections (scored by expiry) per user,
+    plus a sorted set of per-user deadlines so any worker can sweep expired users.
+    """
+
+    def __init__(self, urls, prefix='lingobridge', ttl=60):
+        from .channel_layers import rendezvous_index
+
+        self.urls = list(urls)
+        self.prefix = prefix
+        self.ttl = ttl
+        self._shard_ids = [url.encode('utf-8') + b'\0' for url in self.urls]
+        self._rendezvous_index = rendezvous_index
+        self._clients = None
+        self._loop = None
+
+    def _client(self, key):
+        from redis import asyncio as aioredis
+
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Connections are bound to the loop that created them
+            self._loop = loop
+            self._clients = [aioredis.Redis.from_url(url) for url in self.urls]
+        if len(self._clients) == 1:
+            return self._clients[0]
+        return self._clients[self._rendezvous_index(key, self._shard_ids)]
+
+    def _key(self, user_id):
+        return f'{self.prefix}:presence:{user_id}'
+
+    @property
+    def _deadlines_key(self):
+        return f'{self.prefix}:presence:deadlines'
+
+    async def add(self, user_id, connection, expires_at):
+        key = self._key(user_id)
+        async with self._client(key).pipeline(transaction=True) as pipe:
+            pipe.zremrangebyscore(key, '-inf', time.time())
+            pipe.zcard(key)
+            pipe.zadd(key, {connection: expires_at})
+            pipe.expire(key, int(self.ttl * 2))
+            _, live_before, _, _ = await pipe.execute()
+        await self._client(self._deadlines_key).zadd(self._deadlines_key, {user_id: expires_at}, gt=True)
+        return live_before == 0
+
+    async def remove(self, user_id, connection):
+        key = self._key(user_id)
+        async with self._client(key).pipeline(transaction=True) as pipe:
+            pipe.zrem(key, connection)
+            pipe.zremrangebyscore(key, '-inf', time.time())
+            pipe.zcard(key)
+            _, _, live = await pipe.execute()
+        return live == 0
+
+    async def online(self, user_ids):
+        user_ids = list(user_ids)
+        if not user_ids:
+            return set()
+        # One pipelined round trip per shard
+        now = time.time()
+        by_client = defaultdict(list)
+        for user_id in user_ids:
+            by_client[self._client(self._key(user_id))].append(user_id)
+        online = set()
+        for client, shard_user_ids in by_client.items():
+            async with client.pipeline(transaction=False) as pipe:
+                for user_id in shard_user_ids:
+                    pipe.zcount(self._key(user_id), f'({now}', '+inf')
+                counts = await pipe.execute()
+            online.update(user_id for user_id, count in zip(shard_user_ids, counts) if count)
+        return online
+
+    async def swap_announced(self, user_id, online):
+        key = f'{self.prefix}:presence:announced:{user_id}'
+        previous = await self._client(key).set(key, '1' if online else '0', get=True, ex=86400)
+        return None if previous is None else previous == b'1'
+
+    async def expired(self, now):
+        client = self._client(self._deadlines_key)
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.zrangebyscore(self._deadlines_key, '-inf', now)
+            pipe.zremrangebyscore(self._deadlines_key, '-inf', now)
+            user_ids, _ = await pipe.execute()
+        user_ids = [int(user_id) for user_id in user_ids]
+        online = await self.online(user_ids)
+        return [user_id for user_id in user_ids if user_id not in online]
+
+
+@database_sync_to_async
+def get_friend_ids(user_id):
+    """Ids of every accepted, unblocked friend, in one query"""
+    from .models import Friendship
+
+    friendships = Friendship.objects.filter(
+        Q(from_user_id=user_id) | Q(to_user_id=user_id),
+        accepted=True,
+        blocked=False
+    ).values_list('from_user_id', 'to_user_id')
+    return [to_id if from_id == user_id else from_id for from_id, to_id in friendships]
+
+
+class PresenceService:
+    def __init__(self, store, ttl=60, debounce_ms=2000):
+        self.store = store
+        self.ttl = ttl
+        self.debounce = debounce_ms / 1000
+        self._timers = {}  # user id -> pending settle timer
+        self._sweeper = None
+        self._stats = {'transitions': 0, 'announced': 0, 'suppressed': 0, 'events': 0}
+
+    async def connect(self, user_id, connection):
+        self._ensure_sweeper()
+        if await self.store.add(user_id, connection, time.time() + self.ttl):
+            self._schedule(user_id)
+
+    async def heartbeat(self, user_id, connection):
+        """Keep a connection alive; also re-registers it if it had already expired"""
+        if await self.store.add(user_id, connection, time.time() + self.ttl):
+            self._schedule(user_id)
+
+    async def disconnect(self, user_id, connection):
+        if await self.store.remove(user_id, connection):
+            self._schedule(user_id)
+
+    async def online(self, user_ids):
+        """The subset of user_ids that is online, in bulk"""
+        return await self.store.online(user_ids)
+
+    def _schedule(self, user_id):
+        """Debounce: settle the user's state once it has been stable for the debounce window"""
+        self._stats['transitions'] += 1
+        timer = self._timers.pop(user_id, None)
+        if timer is not None:
+            timer.cancel()
+        self._timers[user_id] = asyncio.get_running_loop().call_later(
+            self.debounce, lambda: run_in_background(self._settle(user_id))
+        )
+
+    async def _settle(self, user_id):
+        self._timers.pop(user_id, None)
+        try:
+            online = user_id in await self.store.online([user_id])
+            if await self.store.swap_announced(user_id, online) == online:
+                # Flapped back to the last announced state (or another worker announced it)
+                self._stats['suppressed'] += 1
+                return
+            self._stats['announced'] += 1
+
+            friend_ids = await get_friend_ids(user_id)
+            recipients = await self.store.online(friend_ids)
+            event = encoded_event('presence', {'type': 'presence', 'user': user_id, 'online': online})
+            channel_layer = get_channel_layer()
+            for friend_id in recipients:
+                await channel_layer.group_send(f'user_{friend_id}', event)
+            self._stats['events'] += len(recipients)
+        except Exception as e:
+            print(f"Error announcing presence for user {user_id}: {e}")
+
+    def _ensure_sweeper(self):
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.ensure_future(self._sweep_forever())
+
+    async def _sweep_forever(self):
+        """Announce users whose connections expired without a disconnect (e.g. a worker died)"""
+        while True:
+            await asyncio.sleep(max(1, self.ttl / 2))
+            try:
+                for user_id in await self.store.expired(time.time()):
+                    self._schedule(user_id)
+            except Exception as e:
+                print(f"Error sweeping expired presence: {e}")
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats['pending'] = len(self._timers)
+        return stats
+
+
+_presence = None
+
+def get_presence():
+    """Get the process-wide presence service"""
+    global _presence
+
+    if _presence is None:
+        ttl = getattr(settings, 'CHAT_PRESENCE_TTL', 60)
+        hosts = getattr(settings, 'CHANNEL_REDIS_HOSTS', None)
+        if hosts:
+            store = RedisPresenceStore(hosts, prefix=getattr(settings, 'CHANNEL_PREFIX', 'lingobridge'), ttl=ttl)
+        else:
+            store = MemoryPresenceStore()
+        _presence = PresenceService(store, ttl=ttl, debounce_ms=getattr(settings, 'CHAT_PRESENCE_DEBOUNCE_MS', 2000))
+    return _presence
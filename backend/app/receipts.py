@@ -0,0 +1,138 @@
+"""
+Batched delivery/read receipts.
+
+Clients acknowledge cumulatively: "everything up to message X in this chat is
+delivered (or read)". Acks are coalesced per (reader, chat, status) for
+CHAT_RECEIPT_WINDOW_MS, keeping only the highest id, then applied with a single
+range UPDATE per chat. Each sender whose messages changed gets one aggregated
+receipt event instead of one per message.
+
+Statuses only move forward (sent -> delivered -> read), and a read ack also
+covers delivery. Each chat's update runs in its own savepoint, so an ack that
+fails to apply is logged and dropped without affecting the rest of the window.
+"""
+import asyncio
+import logging
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+
+from .background import run_in_background
+from .encoding import encoded_event
+from .persistence import get_write_behind
+
+logger = logging.getLogger(__name__)
+
+RECEIPT_STATUSES = ('delivered', 'read')
+
+# Statuses a receipt may overwrite
+_EARLIER_STATUSES = {
+    'delivered': ['sent'],
+    'read': ['sent', 'delivered'],
+}
+
+
+def apply_receipts(acks):
+    """
+    Apply coalesced acks: {(reader_id, peer_id, conversation_id, status): up_to}.
+    Returns (sender_id, receipt) pairs for senders whose messages changed status.
+    """
+    notifications = []
+    for key, up_to in acks.items():
+        try:
+            with transaction.atomic():
+                notifications.extend(_apply_receipt(*key, up_to))
+        except Exception:
+            logger.exception("Error applying receipt %s up to %s", key, up_to)
+    return notifications
+
+
+def _apply_receipt(reader_id, peer_id, conversation_id, status, up_to):
+    """Range UPDATE for one coalesced ack; returns its (sender_id, receipt) notifications"""
+    from .models import Message
+
+    messages = Message.objects.filter(
+        receiver_id=reader_id,
+        status__in=_EARLIER_STATUSES[status],
+        id__lte=up_to,
+    )
+    receipt = {
+        'type': 'receipt',
+        'status': status,
+        'reader': reader_id,
+        'conversation': conversation_id,
+        'up_to': up_to,
+    }
+    if conversation_id is None:
+        if messages.filter(sender_id=peer_id, conversation__isnull=True).update(status=status):
+            return [(peer_id, receipt)]
+        return []
+    messages = messages.filter(conversation_id=conversation_id)
+    sender_ids = list(messages.values_list('sender_id', flat=True).distinct())
+    if sender_ids and messages.update(status=status):
+        return [(sender_id, receipt) for sender_id in sender_ids]
+    return []
+
+
+class ReceiptCoalescer:
+    def __init__(self, window_ms=200):
+        self.window = window_ms / 1000
+        self._pending = {}  # (reader_id, peer_id, conversation_id, status) -> highest acked id
+        self._timer = None
+        self._stats = {'acks': 0, 'flushes': 0, 'updates': 0, 'events': 0}
+
+    def ack(self, reader_id, status, up_to, peer_id=None, conversation_id=None):
+        """Record a cumulative ack; it is applied at the end of the current window"""
+        key = (reader_id, peer_id, conversation_id, status)
+        self._pending[key] = max(up_to, self._pending.get(key, 0))
+        self._stats['acks'] += 1
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        run_in_background(self.flush())
+
+    async def flush(self):
+        acks, self._pending = self._pending, {}
+        # A read ack at or past a delivered ack makes the delivered one redundant
+        for key in [key for key in acks if key[3] == 'delivered']:
+            if acks.get(key[:3] + ('read',), 0) >= acks[key]:
+                del acks[key]
+        if not acks:
+            return
+
+        try:
+            # Acked messages may still be waiting in the write-behind buffer
+            writer = get_write_behind()
+            if writer is not None:
+                await writer.flush()
+            notifications = await database_sync_to_async(apply_receipts)(acks)
+        except Exception:
+            logger.exception("Error applying receipts")
+            return
+        self._stats['flushes'] += 1
+        self._stats['updates'] += len(acks)
+
+        channel_layer = get_channel_layer()
+        for sender_id, receipt in notifications:
+            await channel_layer.group_send(f'user_{sender_id}', encoded_event('receipt', receipt))
+        self._stats['events'] += len(notifications)
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats['pending'] = len(self._pending)
+        return stats
+
+
+_receipts = None
+
+def get_receipts():
+    """Get the process-wide receipt coalescer"""
+    global _receipts
+
+    if _receipts is None:
+        _receipts = ReceiptCoalescer(window_ms=getattr(settings, 'CHAT_RECEIPT_WINDOW_MS', 200))
+    return _receipts
@@ -0,0 +1,116 @@
+"""
+Materialized friend recommendations.
+
+FriendRecommendation holds each user's top FRIEND_RECOMMENDATIONS_PER_USER
+friends-of-friends, and FriendRecommendationState records when they were
+computed and whether the user's 2-hop neighbourhood has changed since.
+
+A friendship change between A and B marks A, B and the friends of both dirty
+(theirs are the only 2-hop neighbourhoods that edge is part of). The
+refresh_friend_recommendations command then recomputes just the dirty users,
+plus any older than FRIEND_RECOMMENDATIONS_MAX_AGE seconds.
+
+FriendRecommendationsView reads the table when the user's entry is fresh and
+falls back to a live traversal of the in-memory friendship graph otherwise.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .friend_graph import FriendGraph, get_friend_graph
+
+
+def mark_dirty(user_ids):
+    """Flag users whose recommendations must be recomputed"""
+    from .models import FriendRecommendationState
+
+    now = timezone.now()
+    FriendRecommendationState.objects.bulk_create(
+        [FriendRecommendationState(user_id=user_id, dirty_since=now) for user_id in set(user_ids)],
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['dirty_since'],
+    )
+
+
+def mark_pair_changed(user_id, other_id):
+    """The friendship between two users changed: flag both and their friends"""
+    from .models import Friendship, User
+
+    friendships = Friendship.objects.filter(
+        Q(from_user_id__in=[user_id, other_id]) | Q(to_user_id__in=[user_id, other_id]),
+        accepted=True,
+        blocked=False
+    ).values_list('from_user_id', 'to_user_id')
+    user_ids = {user_id, other_id}
+    for from_id, to_id in friendships:
+        user_ids.update((from_id, to_id))
+    # One of the pair may be gone (friendships are deleted along with their users)
+    mark_dirty(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+
+
+def refresh(batch_size=1000, all_users=False):
+    """Recompute dirty or expired users; returns the number of users recomputed"""
+    from .models import FriendRecommendation, FriendRecommendationState, User
+
+    if all_users:
+        mark_dirty(User.objects.values_list('id', flat=True))
+    started = timezone.now()
+
+    max_age = timedelta(seconds=getattr(settings, 'FRIEND_RECOMMENDATIONS_MAX_AGE', 86400))
+    user_ids = list(FriendRecommendationState.objects.filter(
+        Q(dirty_since__isnull=False) | Q(computed_at__lt=started - max_age)
+    ).values_list('user_id', flat=True))
+    if not user_ids:
+        return 0
+
+    # A fresh graph: this process doesn't receive other processes' friendship signals
+    graph = FriendGraph()
+    graph.rebuild()
+    per_user = getattr(settings, 'FRIEND_RECOMMENDATIONS_PER_USER', 20)
+
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        now = timezone.now()
+        rows = [
+            FriendRecommendation(
+                user_id=user_id, candidate_id=candidate_id, mutual_count=count, score=score, computed_at=now
+            )
+            for user_id in batch
+            for candidate_id, count, score in graph.recommendations(user_id, limit=per_user)
+        ]
+        with transaction.atomic():
+            FriendRecommendation.objects.filter(user_id__in=batch).delete()
+            FriendRecommendation.objects.bulk_create(rows)
+            states = FriendRecommendationState.objects.filter(user_id__in=batch)
+            states.update(computed_at=now)
+            # Users marked again after the graph was loaded stay dirty for the next run
+            states.filter(dirty_since__lte=started).update(dirty_since=None)
+    return len(user_ids)
+
+
+def get_recommendations(user_id, limit=10):
+    """
+    (candidate id, mutual friend count) pairs for a user, best first, and where
+    they came from: 'precomputed' (the table) or 'live' (the friendship graph)
+    """
+    from .models import FriendRecommendation, FriendRecommendationState
+
+    state = FriendRecommendationState.objects.filter(user_id=user_id).values_list('computed_at', 'dirty_since').first()
+    if state is not None:
+        computed_at, dirty_since = state
+        max_age = timedelta(seconds=getattr(settings, 'FRIEND_RECOMMENDATIONS_MAX_AGE', 86400))
+        if dirty_since is None and computed_at is not None and computed_at >= timezone.now() - max_age:
+            recommendations = FriendRecommendation.objects.filter(user_id=user_id).order_by(
+                '-mutual_count', '-score', 'candidate_id'
+            ).values_list('candidate_id', 'mutual_count')[:limit]
+            return list(recommendations), 'precomputed'
+    else:
+        # Never computed: queue the user for the next refresh
+        mark_dirty([user_id])
+
+    recommendations = get_friend_graph().recommendations(user_id, limit=limit)
+    return [(candidate_id, count) for candidate_id, count, _ in recommendations], 'live'
@@ -0,0 +1,100 @@
+"""
+Sentence segmentation for long messages.
+
+Long inputs are split into sentence-sized segments that each fit comfortably
+within the model's token limit, so they can be translated as one batch and
+nothing gets truncated. The whitespace between segments is kept so the
+translation can be reassembled with the original layout.
+"""
+import re
+
+# Sentence boundary: terminal punctuation (plus closing quotes/brackets) followed by whitespace,
+# or any line break
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?…。！？])["\'»”)\]]*(\s+)|(\s*\n\s*)')
+# Weaker boundaries for sentences that are still too long
+_CLAUSE_BREAK = re.compile(r'(?<=[,;:])(\s+)')
+_WORD_BREAK = re.compile(r'(\s+)')
+
+
+def _split_on(pattern, text):
+    """Split text on pattern, returning (segments, separators) with the separators kept"""
+    segments, separators = [], []
+    position = 0
+    for match in pattern.finditer(text):
+        separator_start, separator_end = match.span(match.lastindex)
+        if separator_start == position:
+            continue
+        segments.append(text[position:separator_start])
+        separators.append(text[separator_start:separator_end])
+        position = separator_end
+    segments.append(text[position:])
+    return segments, separators
+
+
+def _pack(pattern, text, max_chars):
+    """Split text on pattern and greedily re-join neighbouring pieces up to max_chars"""
+    pieces, gaps = _split_on(pattern, text)
+    segments, separators = [pieces[0]], []
+    for gap, piece in zip(gaps, pieces[1:]):
+        if len(segments[-1]) + len(gap) + len(piece) <= max_chars:
+            segments[-1] += gap + piece
+        else:
+            segments.append(piece)
+            separators.append(gap)
+    return segments, separators
+
+
+def _split_long(text, max_chars):
+    """Break a single over-long sentence at clause, then word, then character boundaries"""
+    if len(text) <= max_chars:
+        return [text], []
+    
+    for pattern in (_CLAUSE_BREAK, _WORD_BREAK):
+        segments, separators = _pack(pattern, text, max_chars)
+        if len(segments) > 1:
+            result, result_separators = [], []
+            for i, segment in enumerate(segments):
+                parts, gaps = _split_long(segment, max_chars)
+                if i:
+                    result_separators.append(separators[i - 1])
+                result.extend(parts)
+                result_separators.extend(gaps)
+            return result, result_separators
+    
+    # No whitespace at all (e.g. a long URL or unspaced script): hard cut
+    segments = [text[i:i + max_chars] for i in range(0, len(text), max_chars)]
+    return segments, [''] * (len(segments) - 1)
+
+
+def split_text(text, max_chars=400):
+    """
+    Split text into translatable segments.
+    Returns (segments, separators) where len(separators) == len(segments) + 1 and
+    separators[0] + segments[0] + separators[1] + ... + separators[-1] == text.
+    Text no longer than max_chars is returned as a single segment.
+    """
+    stripped = text.strip()
+    leading = text[:len(text) - len(text.lstrip())]
+    trailing = text[len(leading) + len(stripped):]
+    if not stripped:
+        return [], [text]
+    if len(stripped) <= max_chars:
+        return [stripped], [leading, trailing]
+    
+    segments, separators = [], [leading]
+    sentences, gaps = _split_on(_SENTENCE_BREAK, stripped)
+    for i, sentence in enumerate(sentences):
+        parts, part_gaps = _split_long(sentence, max_chars)
+        segments.extend(parts)
+        separators.extend(part_gaps)
+        separators.append(gaps[i] if i < len(gaps) else trailing)
+    return segments, separators
+
+
+def join_segments(separators, translations):
+    """Reassemble translated segments with the original separators"""
+    pieces = [separators[0]]
+    for translation, separator in zip(translations, separators[1:]):
+        pieces.append(translation)
+        pieces.append(separator)
+    return ''.join(pieces)
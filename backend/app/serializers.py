@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import User, Friendship, Message
+from .models import User, Friendship
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -13,11 +13,3 @@ class FriendshipSerializer(serializers.ModelSerializer):
     class Meta:
         model = Friendship
         fields = ['id', 'from_user', 'to_user', 'accepted', 'timestamp']
-
-class MessageSerializer(serializers.ModelSerializer):
-    sender = UserSerializer(read_only=True)
-    receiver = UserSerializer(read_only=True)
-    
-    class Meta:
-        model = Message
-        fields = ['id', 'sender', 'receiver', 'content', 'translated_content', 'original_language', 'timestamp']
\ No newline at end of file
@@ -0,0 +1,65 @@
+"""
+Channel-layer invalidation for ChatConsumer's per-connection friend cache.
+
+Whenever a friendship is created, accepted, blocked or removed, or a user's
+preferred_language changes, the affected users' user_{id} groups get a
+friends_changed event so every open connection refreshes that friend entry.
+Friendship changes are also applied to this process's friendship graph and
+flag the affected users' precomputed recommendations for a refresh.
+"""
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .friend_graph import get_friend_graph
+from .models import Friendship
+from .recommendations import mark_pair_changed
+
+User = get_user_model()
+
+
+def notify_friends_changed(user_id, friend_id):
+    """Tell user_id's connections to refresh their cache entry for friend_id"""
+    channel_layer = get_channel_layer()
+    if channel_layer:
+        async_to_sync(channel_layer.group_send)(
+            f'user_{user_id}',
+            {'type': 'friends_changed', 'friend_id': friend_id}
+        )
+
+
+def _notify_pair(from_user_id, to_user_id):
+    get_friend_graph().refresh_pair(from_user_id, to_user_id)
+    try:
+        mark_pair_changed(from_user_id, to_user_id)
+    except Exception as e:
+        print(f"Error flagging friend recommendations for users {from_user_id}, {to_user_id}: {e}")
+    notify_friends_changed(from_user_id, to_user_id)
+    notify_friends_changed(to_user_id, from_user_id)
+
+
+@receiver(post_save, sender=Friendship)
+@receiver(post_delete, sender=Friendship)
+def friendship_changed(sender, instance, **kwargs):
+    # Only after commit, so consumers reload the new state
+    transaction.on_commit(lambda: _notify_pair(instance.from_user_id, instance.to_user_id))
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and 'preferred_language' not in update_fields):
+        return
+    
+    def notify():
+        friendships = Friendship.objects.filter(
+            Q(from_user_id=instance.id) | Q(to_user_id=instance.id),
+            accepted=True
+        ).values_list('from_user_id', 'to_user_id')
+        for from_id, to_id in friendships:
+            notify_friends_changed(to_id if from_id == instance.id else from_id, instance.id)
+    
+    transaction.on_commit(notify)
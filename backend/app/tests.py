@@ -1,3 +1,1070 @@
-from django.test import TestCase
+import asyncio
+import math
+import os
+import random
+import signal
+import zlib
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from channels.layers import get_channel_layer
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Q
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import inference_backends, persistence, translation_service, warmup
+from .admission import TranslationAdmission
+from .background import _background_tasks
+from .channel_layers import ShardedRedisChannelLayer, rendezvous_index, shard_id
+from .encoding import dumps, encoded_event, loads, negotiate
+from .friend_graph import FriendGraph
+from .language_detection import detect_language
+from .model_manager import ModelManager
+from .models import (
+    Conversation, FriendRecommendation, FriendRecommendationState, Friendship, Message, TranslationCacheEntry,
+)
+from .persistence import MessageWriteBehind
+from .presence import MemoryPresenceStore, PresenceService
+from .receipts import ReceiptCoalescer, apply_receipts
+from .recommendations import get_recommendations, mark_pair_changed, refresh
+from .segmentation import join_segments, split_text
+from .translation_cache import TranslationCache
+from .user_search import FTS5UserSearch, backend_name
+
+User = get_user_model()
+
+
+class MessageWriteBehindTests(TransactionTestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice')
+        self.bob = User.objects.create_user(username='bob')
+
+    def _message(self, receiver_id, content):
+        return Message(
+            sender_id=self.alice.id, receiver_id=receiver_id, content=content,
+            translated_content=content, original_language='en',
+        )
+
+    def test_bad_row_does_not_block_the_rest_of_the_batch(self):
+        writer = MessageWriteBehind(worker_id=1)
+        missing = self.bob.id + 1000
+        writer._schedule = lambda delay: None  # no event loop here; flush explicitly
+        writer.add([self._message(missing, 'lost'), self._message(self.bob.id, 'kept')])
+        writer.flush_sync()
+
+        stats = writer.stats()
+        self.assertEqual(stats['pending'], 0)
+        self.assertEqual(stats['flushed'], 1)
+        self.assertEqual(stats['dropped'], 1)
+        self.assertEqual(list(Message.objects.values_list('content', flat=True)), ['kept'])
+
+
+class WriteBehindConfigTests(TestCase):
+    def tearDown(self):
+        persistence._writer = None
+
+    @override_settings(CHAT_WRITE_BEHIND=True, CHAT_WORKER_ID=None)
+    def test_worker_id_is_required(self):
+        persistence._writer = None
+        with self.assertRaises(ImproperlyConfigured):
+            persistence.get_write_behind()
+
+    def test_worker_id_must_fit_in_its_bits(self):
+        for worker_id in ('128', '-1', 'web-1'):
+            with self.subTest(worker_id=worker_id), \
+                    override_settings(CHAT_WRITE_BEHIND=True, CHAT_WORKER_ID=worker_id), \
+                    self.assertRaises(ImproperlyConfigured):
+                persistence.get_write_behind()
+        self.assertIsNone(persistence._writer)
+
+        for worker_id in (0, 127):
+            self.assertEqual(persistence.MessageIdGenerator(worker_id).worker_id, worker_id)
+
+
+class LanguageDetectionTests(TestCase):
+    def test_short_phrases_without_lexicon_hits_use_the_detector(self):
+        cases = {
+            'Te quiero mucho': 'es', 'Hasta luego': 'es', 'Nos vemos luego': 'es',
+            'Tu me manques': 'fr', 'Bon anniversaire': 'fr', 'A bientot': 'fr',
+        }
+        for text, language in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(detect_language(text), language)
+
+    def test_short_english_and_empty_text(self):
+        self.assertEqual(detect_language('hello'), 'en')
+        self.assertEqual(detect_language('see you soon'), 'en')
+        self.assertEqual(detect_language('👍 123'), 'en')
+
+
+def _echo_worker(requests, results, warm_pairs):
+    """Stand-in for _worker_main that upper-cases texts and never answers 'hang'"""
+    for source_lang, target_lang in warm_pairs:
+        results.put(('warm', f"{source_lang}-{target_lang}"))
+    while True:
+        job = requests.get()
+        if job is None:
+            break
+        job_id, texts, source_lang, target_lang = job
+        if texts != ['hang']:
+            results.put(('result', job_id, [text.upper() for text in texts], None))
+
+
+@mock.patch.object(translation_service, '_worker_main', _echo_worker)
+class TranslationWorkerPoolTests(SimpleTestCase):
+    async def test_dead_worker_fails_its_jobs_and_is_respawned(self):
+        pool = translation_service.TranslationWorkerPool(num_workers=1)
+        pool.MONITOR_INTERVAL = 0.05
+        pool.start(asyncio.get_running_loop(), [('en', 'fr')])
+        try:
+            self.assertEqual(await pool.submit(['hi'], 'en', 'fr'), ['HI'])
+            await asyncio.sleep(0.1)
+            self.assertEqual(pool.hot_pairs, {'en-fr'})
+
+            pending = pool.submit(['hang'], 'en', 'fr')
+            dead = pool._processes[0]
+            os.kill(dead.pid, signal.SIGKILL)
+            with self.assertRaises(RuntimeError):
+                await asyncio.wait_for(pending, timeout=5)
+            self.assertIsNot(pool._processes[0], dead)
+
+            self.assertEqual(await asyncio.wait_for(pool.submit(['ok'], 'en', 'fr'), timeout=5), ['OK'])
+        finally:
+            pool.stop()
+
+
+class TranslationCacheTests(TestCase):
+    def test_only_short_texts_are_persisted(self):
+        cache = TranslationCache(persist_max_chars=10)
+        cache.set_many({'hello': 'bonjour', 'a much longer private message': 'un message'}, 'en', 'fr')
+        self.assertEqual(TranslationCacheEntry.objects.count(), 1)
+
+        fresh = TranslationCache(persist_max_chars=10)
+        self.assertEqual(fresh.get_many(['hello', 'a much longer private message'], 'en', 'fr'), {'hello': 'bonjour'})
+
+    def test_prune_deletes_old_entries(self):
+        cache = TranslationCache()
+        cache.set_many({'hi': 'salut', 'yes': 'oui'}, 'en', 'fr')
+        TranslationCacheEntry.objects.filter(translated_text='salut').update(
+            created_at=timezone.now() - timedelta(days=2)
+        )
+        self.assertEqual(cache.prune(86400), 1)
+        self.assertEqual(list(TranslationCacheEntry.objects.values_list('translated_text', flat=True)), ['oui'])
+
+
+class SegmentationTests(SimpleTestCase):
+    TEXTS = [
+        '',
+        '   ',
+        'Short message.',
+        '  Hello there!  ',
+        'First sentence. Second one? Third!\n\nNew paragraph «quoted.» Last (really).',
+        'A very long clause, with commas; and semicolons: ' * 20,
+        'word ' * 200,
+        'x' * 1000,
+        'Line one\nLine two\r\n  Line three\n',
+    ]
+
+    def test_round_trip(self):
+        for text in self.TEXTS:
+            for max_chars in (10, 40, 400):
+                with self.subTest(text=text[:30], max_chars=max_chars):
+                    segments, separators = split_text(text, max_chars=max_chars)
+                    self.assertEqual(len(separators), len(segments) + 1)
+                    self.assertEqual(join_segments(separators, segments), text)
+                    self.assertTrue(all(0 < len(segment) <= max_chars for segment in segments))
+
+    def test_short_text_is_one_segment(self):
+        self.assertEqual(split_text('  Bonjour tout le monde ', max_chars=400), (['Bonjour tout le monde'], ['  ', ' ']))
+
+    def test_translations_keep_the_layout(self):
+        segments, separators = split_text('Hi. How are you?\nFine.', max_chars=5)
+        self.assertEqual(segments, ['Hi.', 'How', 'are', 'you?', 'Fine.'])
+        self.assertEqual(join_segments(separators, [s.upper() for s in segments]), 'HI. HOW ARE YOU?\nFINE.')
+
+
+class TranslationAdmissionTests(SimpleTestCase):
+    async def test_sheds_when_queue_or_user_share_is_full(self):
+        admission = TranslationAdmission(max_in_flight=1, max_queue=3, max_queued_per_user=1, sla_ms=60000)
+        self.assertTrue(await admission.acquire('a'))
+
+        queued = [asyncio.ensure_future(admission.acquire(user_id)) for user_id in 'ab']
+        await asyncio.sleep(0)
+        self.assertFalse(await admission.acquire('a'))  # a already has its one queued request
+        queued.append(asyncio.ensure_future(admission.acquire('c')))
+        await asyncio.sleep(0)
+        self.assertFalse(await admission.acquire('d'))  # queue full
+
+        for task in queued:
+            admission.release()
+            self.assertTrue(await task)
+
+        stats = admission.stats()
+        self.assertEqual((stats['shed_user_limit'], stats['shed_queue_full']), (1, 1))
+        self.assertEqual(stats['in_flight'], 1)
+
+    async def test_sheds_after_the_sla(self):
+        admission = TranslationAdmission(max_in_flight=1, sla_ms=10)
+        self.assertTrue(await admission.acquire('a'))
+        self.assertFalse(await admission.acquire('b'))
+        self.assertEqual(admission.stats()['shed_sla'], 1)
+        self.assertEqual(admission.queue_depth, 0)
+
+    async def test_waiters_are_served_round_robin_across_users(self):
+        admission = TranslationAdmission(max_in_flight=1, sla_ms=60000)
+        self.assertTrue(await admission.acquire('busy'))
+
+        order = []
+
+        async def request(user_id, label):
+            await admission.acquire(user_id)
+            order.append(label)
+
+        tasks = [asyncio.ensure_future(request('a', f'a{i}')) for i in range(3)]
+        tasks.append(asyncio.ensure_future(request('b', 'b0')))
+        await asyncio.sleep(0)
+        for _ in tasks:
+            admission.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        self.assertEqual(order, ['a0', 'b0', 'a1', 'a2'])
+
+    async def test_background_work_only_gets_idle_slots(self):
+        admission = TranslationAdmission(max_in_flight=1, sla_ms=60000)
+        self.assertTrue(await admission.acquire('a'))
+        background = asyncio.ensure_future(admission.acquire_background())
+        interactive = asyncio.ensure_future(admission.acquire('b'))
+        await asyncio.sleep(0)
+
+        admission.release()
+        self.assertTrue(await interactive)
+        self.assertFalse(background.done())
+        admission.release()
+        await background
+
+
+class MessagesViewPaginationTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice')
+        self.bob = User.objects.create_user(username='bob')
+        Friendship.objects.create(from_user=self.alice, to_user=self.bob, accepted=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+        start = timezone.now() - timedelta(hours=1)
+        for i in range(7):
+            sender, receiver = (self.alice, self.bob) if i % 2 else (self.bob, self.alice)
+            # Pairs of messages share a timestamp, so the id has to break ties
+            Message.objects.create(
+                sender=sender, receiver=receiver, content=f'm{i}', translated_content=f't{i}',
+                original_language='en', timestamp=start + timedelta(minutes=i // 2),
+            )
+
+    def test_pages_cover_the_history_newest_first_without_gaps(self):
+        url = reverse('messages', args=[self.bob.id])
+        seen, before = [], None
+        while True:
+            params = {'limit': 3, **({'before': before} if before else {})}
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['messages']), 3)
+            seen.extend(row['id'] for row in response.data['messages'])
+            before = response.data['next_before']
+            if before is None:
+                break
+
+        expected = list(Message.objects.order_by('-timestamp', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_rows_carry_the_viewer_side_of_the_text(self):
+        response = self.client.get(reverse('messages', args=[self.bob.id]), {'limit': 2})
+        self.assertEqual({user['id'] for user in response.data['users']}, {self.alice.id, self.bob.id})
+        for row in response.data['messages']:
+            expected = row['content'] if row['sender'] == self.alice.id else row['translated_content']
+            self.assertEqual(row['displayContent'], expected)
+
+    def test_malformed_cursor_is_rejected(self):
+        response = self.client.get(reverse('messages', args=[self.bob.id]), {'before': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class UserListViewPaginationTests(TestCase):
+    def setUp(self):
+        self.me = User.objects.create_user(username='me')
+        for username in ('ann', 'anna', 'joanne', 'bob', 'carl', 'dave', 'annabel'):
+            User.objects.create_user(username=username, email=f'{username}@example.com')
+        Friendship.objects.create(from_user=self.me, to_user=User.objects.get(username='bob'), accepted=True)
+        Friendship.objects.create(from_user=User.objects.get(username='carl'), to_user=self.me)
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+
+    def _all_pages(self, **params):
+        usernames, after = [], None
+        while True:
+            response = self.client.get(reverse('users'), {**params, 'limit': 2, **({'after': after} if after else {})})
+            self.assertEqual(response.status_code, 200)
+            usernames.extend(user['username'] for user in response.data['users'])
+            after = response.data['next_after']
+            if after is None:
+                return usernames
+
+    def test_pages_list_everyone_but_me_by_username(self):
+        usernames = self._all_pages()
+        self.assertEqual(usernames, ['ann', 'anna', 'annabel', 'bob', 'carl', 'dave', 'joanne'])
+
+    def test_search_pages_follow_relevance(self):
+        usernames = self._all_pages(search='ann')
+        # exact, then prefix matches by username, then contains
+        self.assertEqual(usernames, ['ann', 'anna', 'annabel', 'joanne'])
+
+    def test_friendship_flags(self):
+        response = self.client.get(reverse('users'))
+        flags = {user['username']: (user['is_friend'], user['has_pending_request'], user['request_sent_by_me'])
+                 for user in response.data['users']}
+        self.assertEqual(flags['bob'], (True, False, False))
+        self.assertEqual(flags['carl'], (True, True, False))
+        self.assertEqual(flags['dave'], (False, False, False))
+
+    def test_malformed_cursor_is_rejected(self):
+        self.assertEqual(self.client.get(reverse('users'), {'after': '!!!'}).status_code, 400)
+
+
+class FTS5UserSearchTests(TestCase):
+    def setUp(self):
+        self.me = User.objects.create_user(username='me')
+        for username in ('alexander', 'alexnader', 'thealexnader', 'bob'):
+            User.objects.create_user(username=username, email=f'{username}@example.com')
+
+    def test_typo_finds_near_miss_ranked_below_exact_and_contains(self):
+        self.assertEqual(backend_name('sqlite'), 'fts5')
+        results = FTS5UserSearch().search(User.objects.exclude(id=self.me.id), 'alexnader')
+        relevance = dict(results.values_list('username', 'relevance'))
+
+        self.assertEqual(set(relevance), {'alexnader', 'thealexnader', 'alexander'})
+        self.assertEqual(relevance['alexnader'], 100)
+        self.assertEqual(relevance['thealexnader'], 50)
+        self.assertTrue(0 < relevance['alexander'] < 50)
+
+    def test_index_follows_username_changes(self):
+        user = User.objects.get(username='bob')
+        user.username, user.email = 'alexandre', 'alexandre@example.com'
+        user.save()
+        results = FTS5UserSearch().search(User.objects.all(), 'alexandre')
+        self.assertIn('alexandre', results.values_list('username', flat=True))
+        self.assertFalse(FTS5UserSearch().search(User.objects.all(), 'bob').exists())
+
+
+def _random_friendships(rng, user_ids, count):
+    """Friendship rows between random pairs: mostly accepted, some pending, some blocked"""
+    pairs = set()
+    while len(pairs) < count:
+        a, b = rng.sample(user_ids, 2)
+        if (b, a) not in pairs:
+            pairs.add((a, b))
+    rows = []
+    for a, b in sorted(pairs):
+        kind = rng.random()
+        rows.append(Friendship(from_user_id=a, to_user_id=b, accepted=kind < 0.8, blocked=kind < 0.1))
+    Friendship.objects.bulk_create(rows)
+
+
+def _brute_force_recommendations(user_id):
+    """{candidate id: (mutual count, Adamic-Adar score)} computed straight from the Friendship table"""
+    friends, linked = {}, {}
+    for a, b, accepted, blocked in Friendship.objects.values_list('from_user_id', 'to_user_id', 'accepted', 'blocked'):
+        linked.setdefault(a, set()).add(b)
+        linked.setdefault(b, set()).add(a)
+        if accepted and not blocked:
+            friends.setdefault(a, set()).add(b)
+            friends.setdefault(b, set()).add(a)
+
+    result = {}
+    for candidate_id in User.objects.exclude(id=user_id).values_list('id', flat=True):
+        if candidate_id in linked.get(user_id, ()):
+            continue
+        mutual = friends.get(user_id, set()) & friends.get(candidate_id, set())
+        if mutual:
+            score = sum(1 / math.log(len(friends[m])) for m in mutual if len(friends[m]) > 1)
+            result[candidate_id] = (len(mutual), score)
+    return result
+
+
+class FriendGraphTests(TestCase):
+    def setUp(self):
+        User.objects.bulk_create([User(username=f'user{i}') for i in range(200)])
+        self.user_ids = list(User.objects.values_list('id', flat=True))
+        self.rng = random.Random(0)
+        _random_friendships(self.rng, self.user_ids, 1000)
+
+    def assertMatchesBruteForce(self, graph, user_ids):
+        for user_id in user_ids:
+            ranked = graph.recommendations(user_id, limit=len(self.user_ids))
+            expected = _brute_force_recommendations(user_id)
+            self.assertEqual({candidate_id: count for candidate_id, count, _ in ranked},
+                             {candidate_id: count for candidate_id, (count, _) in expected.items()})
+            for candidate_id, _, score in ranked:
+                self.assertAlmostEqual(score, expected[candidate_id][1])
+            keys = [(-count, -score) for _, count, score in ranked]
+            self.assertEqual(keys, sorted(keys))
+            self.assertEqual(graph.recommendations(user_id, limit=5), ranked[:5])
+
+    def test_recommendations_match_brute_force(self):
+        graph = FriendGraph()
+        self.assertMatchesBruteForce(graph, self.user_ids)
+
+    def test_refresh_pair_keeps_the_graph_current(self):
+        graph = FriendGraph(max_age=3600)
+        graph.rebuild()
+        friendships = list(Friendship.objects.all())
+        for friendship in self.rng.sample(friendships, 40):
+            action = self.rng.choice(['accept', 'block', 'unblock', 'delete'])
+            if action == 'delete':
+                friendship.delete()
+            else:
+                friendship.accepted = friendship.accepted or action == 'accept'
+                friendship.blocked = action == 'block'
+                friendship.save()
+            graph.refresh_pair(friendship.from_user_id, friendship.to_user_id)
+        for _ in range(20):
+            a, b = self.rng.sample(self.user_ids, 2)
+            if not Friendship.objects.filter(Q(from_user_id=a, to_user_id=b) | Q(from_user_id=b, to_user_id=a)).exists():
+                Friendship.objects.create(from_user_id=a, to_user_id=b, accepted=True)
+                graph.refresh_pair(a, b)
+
+        self.assertEqual(graph.stats()['builds'], 1)
+        self.assertMatchesBruteForce(graph, self.user_ids)
+
+    def test_linked_users_are_never_recommended(self):
+        a, b, c, d = User.objects.bulk_create([User(username=name) for name in 'abcd'])
+        Friendship.objects.bulk_create([
+            Friendship(from_user=a, to_user=b, accepted=True),
+            Friendship(from_user=b, to_user=c, accepted=True),
+            Friendship(from_user=b, to_user=d, accepted=True),
+            Friendship(from_user=a, to_user=d, accepted=False),
+        ])
+        graph = FriendGraph()
+        self.assertEqual([candidate_id for candidate_id, _, _ in graph.recommendations(a.id)], [c.id])
+
+
+@override_settings(FRIEND_RECOMMENDATIONS_PER_USER=5)
+class FriendRecommendationRefreshTests(TestCase):
+    def setUp(self):
+        User.objects.bulk_create([User(username=f'user{i}') for i in range(60)])
+        self.user_ids = list(User.objects.values_list('id', flat=True))
+        self.rng = random.Random(1)
+        _random_friendships(self.rng, self.user_ids, 200)
+
+    def _dirty(self):
+        return set(FriendRecommendationState.objects.filter(dirty_since__isnull=False).values_list('user_id', flat=True))
+
+    def assertTableMatchesBruteForce(self):
+        for user_id in self.user_ids:
+            stored = list(FriendRecommendation.objects.filter(user_id=user_id).order_by(
+                '-mutual_count', '-score', 'candidate_id'
+            ).values_list('candidate_id', 'mutual_count', 'score'))
+            expected = _brute_force_recommendations(user_id)
+            self.assertEqual(len(stored), min(5, len(expected)))
+            for candidate_id, count, score in stored:
+                self.assertEqual(count, expected[candidate_id][0])
+                self.assertAlmostEqual(score, expected[candidate_id][1])
+            # Nothing left out ranks above the last stored candidate
+            if stored:
+                last_count, last_score = stored[-1][1:]
+                stored_ids = {candidate_id for candidate_id, _, _ in stored}
+                for candidate_id, (count, score) in expected.items():
+                    if candidate_id not in stored_ids:
+                        self.assertLessEqual((count, score), (last_count, last_score + 1e-9))
+
+    def test_mark_pair_changed_flags_the_pair_and_their_friends(self):
+        a, b = self.rng.sample(self.user_ids, 2)
+        mark_pair_changed(a, b)
+        expected = {a, b}
+        for from_id, to_id in Friendship.objects.filter(
+            Q(from_user_id__in=[a, b]) | Q(to_user_id__in=[a, b]), accepted=True, blocked=False
+        ).values_list('from_user_id', 'to_user_id'):
+            expected.update((from_id, to_id))
+        self.assertEqual(self._dirty(), expected)
+
+    def test_mark_pair_changed_skips_deleted_users(self):
+        a, b = self.rng.sample(self.user_ids, 2)
+        User.objects.filter(id=b).delete()
+        mark_pair_changed(a, b)
+        self.assertNotIn(b, self._dirty())
+        self.assertIn(a, self._dirty())
+
+    def test_refresh_recomputes_only_dirty_users(self):
+        self.assertEqual(refresh(all_users=True), len(self.user_ids))
+        self.assertEqual(self._dirty(), set())
+        self.assertTableMatchesBruteForce()
+        self.assertEqual(refresh(), 0)
+
+        for friendship in self.rng.sample(list(Friendship.objects.all()), 5):
+            friendship.delete()
+            mark_pair_changed(friendship.from_user_id, friendship.to_user_id)
+        a, b = self.rng.sample(self.user_ids, 2)
+        Friendship.objects.filter(Q(from_user_id=a, to_user_id=b) | Q(from_user_id=b, to_user_id=a)).delete()
+        Friendship.objects.create(from_user_id=a, to_user_id=b, accepted=True)
+        mark_pair_changed(a, b)
+
+        dirty = self._dirty()
+        self.assertLess(len(dirty), len(self.user_ids))
+        self.assertEqual(refresh(), len(dirty))
+        self.assertTableMatchesBruteForce()
+
+    def test_get_recommendations_prefers_fresh_precomputed_rows(self):
+        user_id = self.user_ids[0]
+        self.assertEqual(get_recommendations(user_id)[1], 'live')
+        self.assertIn(user_id, self._dirty())
+
+        refresh()
+        recommendations, source = get_recommendations(user_id, limit=3)
+        self.assertEqual(source, 'precomputed')
+        stored = FriendRecommendation.objects.filter(user_id=user_id).order_by(
+            '-mutual_count', '-score', 'candidate_id'
+        ).values_list('candidate_id', 'mutual_count')[:3]
+        self.assertEqual(recommendations, list(stored))
+
+
+class ReceiptTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob, self.carol = (User.objects.create_user(username=name) for name in ('alice', 'bob', 'carol'))
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.set([self.alice, self.bob, self.carol])
+
+    def _message(self, sender, receiver, conversation=None):
+        return Message.objects.create(
+            sender=sender, receiver=receiver, conversation=conversation,
+            content='hi', translated_content='hi', original_language='en',
+        )
+
+    def _statuses(self, messages):
+        return [Message.objects.get(id=message.id).status for message in messages]
+
+    def test_peer_ack_updates_the_range_up_to_the_acked_id(self):
+        direct = [self._message(self.alice, self.bob) for _ in range(3)]
+        in_conversation = self._message(self.alice, self.bob, self.conversation)
+        notifications = apply_receipts({(self.bob.id, self.alice.id, None, 'read'): direct[1].id})
+
+        self.assertEqual(self._statuses(direct), ['read', 'read', 'sent'])
+        self.assertEqual(self._statuses([in_conversation]), ['sent'])
+        self.assertEqual(notifications, [(self.alice.id, {
+            'type': 'receipt', 'status': 'read', 'reader': self.bob.id, 'conversation': None, 'up_to': direct[1].id,
+        })])
+
+    def test_conversation_ack_notifies_every_sender(self):
+        messages = [self._message(sender, self.bob, self.conversation) for sender in (self.alice, self.carol)]
+        direct = self._message(self.alice, self.bob)
+        notifications = apply_receipts({(self.bob.id, None, self.conversation.id, 'delivered'): messages[-1].id})
+
+        self.assertEqual(self._statuses(messages), ['delivered', 'delivered'])
+        self.assertEqual(self._statuses([direct]), ['sent'])
+        self.assertEqual(sorted(sender_id for sender_id, _ in notifications), [self.alice.id, self.carol.id])
+
+    def test_statuses_only_move_forward(self):
+        message = self._message(self.alice, self.bob)
+        apply_receipts({(self.bob.id, self.alice.id, None, 'read'): message.id})
+        self.assertEqual(apply_receipts({(self.bob.id, self.alice.id, None, 'delivered'): message.id}), [])
+        self.assertEqual(self._statuses([message]), ['read'])
+
+    def test_a_failing_ack_does_not_drop_the_others(self):
+        message = self._message(self.alice, self.bob)
+        with self.assertLogs('app.receipts', 'ERROR'):
+            notifications = apply_receipts({
+                (self.carol.id, 'abc', None, 'read'): 10,
+                (self.bob.id, self.alice.id, None, 'read'): message.id,
+            })
+        self.assertEqual(self._statuses([message]), ['read'])
+        self.assertEqual([sender_id for sender_id, _ in notifications], [self.alice.id])
+
+    async def test_repeated_acks_are_coalesced_and_the_sender_notified(self):
+        messages = [await Message.objects.acreate(
+            sender=self.alice, receiver=self.bob, content='hi', translated_content='hi', original_language='en',
+        ) for _ in range(3)]
+        channel_layer = get_channel_layer()
+        channel = await channel_layer.new_channel()
+        await channel_layer.group_add(f'user_{self.alice.id}', channel)
+
+        coalescer = ReceiptCoalescer(window_ms=60000)
+        for message in messages[:2]:
+            coalescer.ack(self.bob.id, 'delivered', message.id, peer_id=self.alice.id)
+        coalescer.ack(self.bob.id, 'read', messages[0].id, peer_id=self.alice.id)
+        coalescer._timer.cancel()
+        coalescer._timer = None
+        await coalescer.flush()
+
+        statuses = [status async for status in Message.objects.order_by('id').values_list('status', flat=True)]
+        self.assertEqual(statuses, ['read', 'delivered', 'sent'])
+        self.assertEqual(coalescer.stats()['acks'], 3)
+        self.assertEqual(coalescer.stats()['updates'], 2)
+
+        events = [await channel_layer.receive(channel) for _ in range(2)]
+        receipts = sorted((event['type'], loads(event['text'])['status']) for event in events)
+        self.assertEqual(receipts, [('receipt', 'delivered'), ('receipt', 'read')])
+
+    async def test_acknowledge_rejects_non_integer_ids(self):
+        from .consumers import ChatConsumer
+
+        consumer = ChatConsumer()
+        consumer.user = self.bob
+        consumer.send_payload = mock.AsyncMock()
+        with mock.patch('app.consumers.get_receipts') as get_receipts:
+            for ack in ({'up_to': 5, 'chat_with': 'abc'}, {'up_to': 5, 'conversation_id': '1'},
+                        {'up_to': True, 'chat_with': self.alice.id}, {'up_to': 5}):
+                await consumer.acknowledge(ack)
+            get_receipts.return_value.ack.assert_not_called()
+            await consumer.acknowledge({'status': 'delivered', 'up_to': 5, 'chat_with': self.alice.id})
+            get_receipts.return_value.ack.assert_called_once_with(
+                self.bob.id, 'delivered', 5, peer_id=self.alice.id, conversation_id=None
+            )
+        self.assertEqual(consumer.send_payload.await_count, 4)
+
+
+class FakeTranslator:
+    """Stands in for a transformers pipeline of a known size"""
+
+    def __init__(self, key, footprint_mb=100):
+        self.key = key
+        self.footprint_bytes = footprint_mb * 1024 * 1024
+
+    def __call__(self, texts, **kwargs):
+        return [{'translation_text': f'{self.key}:{text}'} for text in texts]
+
+
+class ModelManagerTests(SimpleTestCase):
+    def setUp(self):
+        self.loads = []
+        self.manager = ModelManager(self._load, budget_mb=250)
+
+    def _load(self, key):
+        self.loads.append(key)
+        return FakeTranslator(key)
+
+    def test_evicts_least_recently_used_pair_over_budget(self):
+        self.manager.get('en-fr')
+        self.manager.get('en-de')
+        self.manager.get('en-fr')  # en-de is now the least recently used
+        self.manager.get('en-es')
+
+        self.assertFalse(self.manager.is_loaded('en-de'))
+        self.assertTrue(self.manager.is_loaded('en-fr'))
+        self.assertTrue(self.manager.is_loaded('en-es'))
+        self.assertEqual(self.manager.stats()['evictions'], 1)
+
+        # The evicted pair is reloaded on demand; the warm one is served from memory
+        self.assertEqual(self.manager.get('en-fr')(['hi']), [{'translation_text': 'en-fr:hi'}])
+        self.manager.get('en-de')
+        self.assertEqual(self.loads, ['en-fr', 'en-de', 'en-es', 'en-de'])
+        self.assertFalse(self.manager.is_loaded('en-es'))
+        self.assertTrue('en-fr' in self.manager)
+
+    def test_pinned_pairs_survive_eviction(self):
+        manager = ModelManager(self._load, budget_mb=250, pinned=['en-fr'])
+        for key in ('en-fr', 'en-de', 'en-es', 'en-it'):
+            manager.get(key)
+
+        self.assertTrue(manager.is_loaded('en-fr'))
+        self.assertTrue(manager.is_loaded('en-it'))
+        self.assertFalse(manager.is_loaded('en-de'))
+        self.assertFalse(manager.is_loaded('en-es'))
+
+    def test_no_budget_keeps_everything(self):
+        manager = ModelManager(self._load)
+        for key in ('en-fr', 'en-de', 'en-es', 'en-it'):
+            manager.get(key)
+        self.assertEqual(set(manager.stats()['loaded']), {'en-fr', 'en-de', 'en-es', 'en-it'})
+
+
+@override_settings(TRANSLATION_BACKEND_DEFAULT='int8')
+class InferenceBackendTests(SimpleTestCase):
+    @override_settings(TRANSLATION_BACKENDS=['en-fr: onnx', ' fr-en :pytorch', 'en-es:tpu'])
+    def test_backend_for_strips_pairs_and_values(self):
+        self.assertEqual(inference_backends.backend_for('en-fr'), 'onnx')
+        self.assertEqual(inference_backends.backend_for('fr-en'), 'pytorch')
+        self.assertEqual(inference_backends.backend_for('en-es'), 'int8')
+        self.assertEqual(inference_backends.backend_for('es-fr'), 'int8')
+
+    def test_failed_backend_falls_back_to_default(self):
+        loaders = {'onnx': mock.Mock(side_effect=RuntimeError('export failed')), 'int8': FakeTranslator}
+        with mock.patch.dict(inference_backends.LOADERS, loaders), self.assertLogs('app.inference_backends', 'ERROR'):
+            translator = inference_backends.load_pipeline('opus-mt-en-fr', 'onnx')
+        self.assertEqual(translator.key, 'opus-mt-en-fr')
+
+    def test_failed_default_falls_back_to_pytorch(self):
+        loaders = {'int8': mock.Mock(side_effect=RuntimeError('no qint8 engine'))}
+        with mock.patch.dict(inference_backends.LOADERS, loaders), \
+                mock.patch.object(inference_backends, 'load_pytorch', FakeTranslator) as load_pytorch, \
+                self.assertLogs('app.inference_backends', 'ERROR'):
+            translator = inference_backends.load_pipeline('opus-mt-en-fr', 'int8')
+        self.assertIsInstance(translator, load_pytorch)
+
+    def test_no_fallback_raises(self):
+        loaders = {'onnx': mock.Mock(side_effect=ImportError('optimum'))}
+        with mock.patch.dict(inference_backends.LOADERS, loaders), self.assertRaises(ImportError):
+            inference_backends.load_pipeline('opus-mt-en-fr', 'onnx', fallback=False)
+
+
+@override_settings(TRANSLATION_PRELOAD_PAIRS=['en-fr'], TRANSLATION_SERVICE_ADDRESS='')
+class ReadinessTests(TestCase):
+    def setUp(self):
+        translators = ModelManager(FakeTranslator, budget_mb=150, pinned=['en-fr'])
+        patches = [
+            mock.patch('app.consumers._translators', translators),
+            mock.patch.object(warmup, '_hot_pairs', set()),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.translators = translators
+
+    def test_ready_once_the_preload_pairs_are_warm_and_stays_ready(self):
+        response = self.client.get(reverse('ready'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['pending_pairs'], ['en-fr'])
+
+        self.assertEqual(warmup.warm_up(), {'en-fr': True})
+        self.assertEqual(self.client.get(reverse('ready')).status_code, 200)
+
+        # Other pairs loaded past the budget evict each other, not the pinned preload pair
+        from .consumers import get_translator
+        for source_lang, target_lang in (('fr', 'en'), ('en', 'es')):
+            get_translator(source_lang, target_lang)
+        self.assertTrue(self.translators.is_loaded('en-fr'))
+        self.assertFalse(self.translators.is_loaded('fr-en'))
+        self.assertEqual(self.client.get(reverse('ready')).status_code, 200)
+
+    @override_settings(TRANSLATION_PRELOAD_ON_STARTUP=False)
+    def test_no_startup_warmup_means_nothing_to_wait_for(self):
+        self.assertIsNone(warmup.start_warmup())
+        self.assertEqual(self.client.get(reverse('ready')).status_code, 200)
+
+
+class RendezvousShardingTests(SimpleTestCase):
+    groups = [f'user_{n}' for n in range(5000)]
+
+    def _placement(self, hosts):
+        layer = ShardedRedisChannelLayer(hosts=hosts)
+        return {group: shard_id(layer.hosts[layer.consistent_hash(group)]) for group in self.groups}
+
+    def test_placement_is_stable_and_independent_of_host_order(self):
+        hosts = [f'redis://redis-{n}:6379' for n in range(4)]
+        placement = self._placement(hosts)
+
+        self.assertEqual(self._placement(hosts), placement)
+        self.assertEqual(self._placement(list(reversed(hosts))), placement)
+        # Every shard gets a fair share
+        for count in (list(placement.values()).count(host) for host in hosts):
+            self.assertAlmostEqual(count / len(self.groups), 1 / 4, delta=0.03)
+
+    def test_adding_a_shard_moves_about_one_in_n_groups(self):
+        hosts = [f'redis://redis-{n}:6379' for n in range(4)]
+        before = self._placement(hosts)
+        after = self._placement(hosts + ['redis://redis-4:6379'])
+
+        moved = [group for group in self.groups if before[group] != after[group]]
+        self.assertAlmostEqual(len(moved) / len(self.groups), 1 / 5, delta=0.03)
+        # Only groups now owned by the new shard moved
+        self.assertEqual({after[group] for group in moved}, {'redis://redis-4:6379'})
+
+    def test_single_host(self):
+        layer = ShardedRedisChannelLayer(hosts=['redis://redis-0:6379'])
+        self.assertEqual(layer.consistent_hash('user_1'), 0)
+        self.assertEqual(rendezvous_index(b'user_1', [b'a\0']), 0)
+
+
+@override_settings(CHAT_COMPRESSION_MIN_BYTES=64, CHAT_MAX_INBOUND_BYTES=4096)
+class FrameCodecTests(SimpleTestCase):
+    PAYLOAD = {'type': 'message', 'content': 'Bonjour à tous ' * 20, 'id': 42, 'translation_pending': False}
+
+    def _round_trip(self, codec, payload):
+        frame = codec.frame(dumps(payload))
+        return frame, codec.decode(**frame)
+
+    def test_negotiation_picks_the_first_supported_subprotocol(self):
+        cases = [
+            (None, None, 'json', False),
+            ([], None, 'json', False),
+            (['lingobridge.json'], 'lingobridge.json', 'json', False),
+            (['x-unknown', 'lingobridge.json+deflate'], 'lingobridge.json+deflate', 'json', True),
+            (['lingobridge.msgpack', 'lingobridge.json'], 'lingobridge.msgpack', 'msgpack', False),
+            (['x-unknown'], None, 'json', False),
+        ]
+        for requested, subprotocol, encoding, compress in cases:
+            with self.subTest(requested=requested):
+                codec = negotiate(requested)
+                self.assertEqual((codec.subprotocol, codec.encoding, codec.compress), (subprotocol, encoding, compress))
+
+    def test_msgpack_falls_back_when_unavailable(self):
+        with mock.patch('app.encoding.msgpack', None):
+            self.assertEqual(negotiate(['lingobridge.msgpack', 'lingobridge.json']).subprotocol, 'lingobridge.json')
+            self.assertIsNone(negotiate(['lingobridge.msgpack']).subprotocol)
+
+    def test_json_round_trip(self):
+        frame, decoded = self._round_trip(negotiate(['lingobridge.json']), self.PAYLOAD)
+        self.assertIn('text_data', frame)
+        self.assertEqual(decoded, self.PAYLOAD)
+
+    def test_deflate_round_trip_compresses_only_large_frames(self):
+        codec = negotiate(['lingobridge.json+deflate'])
+        frame, decoded = self._round_trip(codec, self.PAYLOAD)
+        self.assertIn('bytes_data', frame)
+        self.assertLess(len(frame['bytes_data']), len(dumps(self.PAYLOAD)))
+        self.assertEqual(decoded, self.PAYLOAD)
+
+        frame, decoded = self._round_trip(codec, {'ok': 1})
+        self.assertEqual(frame, {'text_data': '{"ok":1}'})
+        self.assertEqual(decoded, {'ok': 1})
+
+    def test_msgpack_round_trip(self):
+        frame, decoded = self._round_trip(negotiate(['lingobridge.msgpack']), self.PAYLOAD)
+        self.assertIsInstance(frame['bytes_data'], bytes)
+        self.assertEqual(decoded, self.PAYLOAD)
+
+    def test_oversized_or_corrupt_deflate_frames_are_rejected(self):
+        codec = negotiate(['lingobridge.json+deflate'])
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+        bomb = compressor.compress(b'[' + b'0,' * 100000 + b'0]') + compressor.flush()
+        self.assertLess(len(bomb), 4096)
+        with self.assertRaises(ValueError):
+            codec.decode(bytes_data=bomb)
+        with self.assertRaises(ValueError):
+            codec.decode(bytes_data=b'not deflate at all')
+
+
+@override_settings(TRANSLATION_SERVICE_ADDRESS='')
+class TranslationBatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.batches = []
+        patch = mock.patch('app.consumers._translate_batch_sync', self._translate)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def _translate(self, texts, source_lang, target_lang):
+        self.batches.append((f'{source_lang}-{target_lang}', list(texts)))
+        if 'boom' in texts:
+            raise RuntimeError('pipeline failed')
+        return [f'{target_lang}:{text}' for text in texts]
+
+    async def test_full_batches_flush_immediately_and_the_rest_after_the_window(self):
+        from .consumers import TranslationBatcher
+
+        batcher = TranslationBatcher(window_ms=20, max_batch_size=4)
+        texts = [f'text {i}' for i in range(6)]
+        results = await asyncio.gather(*[batcher.translate(text, 'en', 'fr') for text in texts])
+
+        self.assertEqual(results, [f'fr:{text}' for text in texts])
+        self.assertEqual([len(batch) for _, batch in self.batches], [4, 2])
+
+    async def test_requests_are_grouped_per_language_pair(self):
+        from .consumers import TranslationBatcher
+
+        batcher = TranslationBatcher(window_ms=20, max_batch_size=16)
+        results = await asyncio.gather(
+            batcher.translate('a', 'en', 'fr'),
+            batcher.translate('b', 'en', 'es'),
+            batcher.translate('c', 'en', 'fr'),
+        )
+        self.assertEqual(results, ['fr:a', 'es:b', 'fr:c'])
+        self.assertEqual(sorted(self.batches), [('en-es', ['b']), ('en-fr', ['a', 'c'])])
+
+    async def test_a_failed_batch_reaches_every_waiting_caller(self):
+        from .consumers import TranslationBatcher, translate_text
+
+        batcher = TranslationBatcher(window_ms=20, max_batch_size=16)
+        results = await asyncio.gather(
+            batcher.translate('boom', 'en', 'fr'),
+            batcher.translate('fine', 'en', 'fr'),
+            return_exceptions=True,
+        )
+        self.assertEqual([type(result) for result in results], [RuntimeError, RuntimeError])
+
+        # translate_text delivers the original text instead
+        with mock.patch('app.consumers.get_batcher', return_value=batcher):
+            self.assertEqual(await translate_text('boom', 'fr', source_lang='en'), 'boom')
+
+
+@override_settings(CHAT_SYNC_BATCH_SIZE=2, CHAT_PRESENCE_DEBOUNCE_MS=0)
+class SyncResumeTests(TransactionTestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', preferred_language='en')
+        self.bob = User.objects.create_user(username='bob', preferred_language='en')
+        Friendship.objects.create(from_user=self.alice, to_user=self.bob, accepted=True)
+
+    async def _connect(self, user, since=None):
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+        from .routing import websocket_urlpatterns
+
+        path = '/ws/chat/' + (f'?since={since}' if since is not None else '')
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), path)
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def _receive(self, communicator, *types):
+        """Next payload of one of the given types, skipping presence updates"""
+        while True:
+            payload = await communicator.receive_json_from(timeout=5)
+            if payload.get('type') in types or 'error' in payload:
+                return payload
+
+    async def _send(self, communicator, content):
+        await communicator.send_json_to({'action': 'send_message', 'receiver_id': self.alice.id, 'content': content})
+        return (await self._receive(communicator, None))['id']
+
+    async def test_reconnect_with_since_delivers_each_missed_message_once_in_order(self):
+        alice = await self._connect(self.alice)
+        bob = await self._connect(self.bob)
+        first = await self._send(bob, 'hello one')
+        self.assertEqual((await self._receive(alice, None))['id'], first)
+        await alice.disconnect()
+
+        missed = [await self._send(bob, f'hello {n}') for n in ('two', 'three', 'four')]
+
+        alice = await self._connect(self.alice, since=first)
+        pages = [await self._receive(alice, 'sync_batch') for _ in range(2)]
+        self.assertEqual([[m['id'] for m in page['messages']] for page in pages], [missed[:2], missed[2:]])
+        complete = await self._receive(alice, 'sync_complete')
+        self.assertEqual((complete['cursor'], complete['count'], complete['truncated']), (missed[-1], 3, False))
+
+        # The live copy of a message the sync already streamed is dropped...
+        message = await Message.objects.aget(id=missed[-1])
+        await get_channel_layer().group_send(f'user_{self.alice.id}', encoded_event('chat_message', {
+            'id': message.id, 'sender': self.bob.id, 'receiver': self.alice.id, 'content': message.content,
+        }))
+        # ...while new live messages still arrive
+        latest = await self._send(bob, 'hello five')
+        self.assertEqual((await self._receive(alice, None))['id'], latest)
+
+        await alice.disconnect()
+        await bob.disconnect()
+
+    @override_settings(CHAT_SYNC_MAX_MESSAGES=2)
+    async def test_more_missed_messages_than_the_max_ends_truncated(self):
+        bob = await self._connect(self.bob)
+        sent = [await self._send(bob, f'hello {n}') for n in range(3)]
+
+        alice = await self._connect(self.alice, since=0)
+        self.assertEqual([m['id'] for m in (await self._receive(alice, 'sync_batch'))['messages']], sent[:2])
+        complete = await self._receive(alice, 'sync_complete')
+        self.assertEqual((complete['cursor'], complete['count'], complete['truncated']), (sent[1], 2, True))
+
+        await alice.disconnect()
+        await bob.disconnect()
+
+    async def test_invalid_since_cursor(self):
+        alice = await self._connect(self.alice, since='abc')
+        self.assertEqual(await self._receive(alice), {'error': 'Invalid since cursor'})
+        await alice.disconnect()
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+class PresenceTests(TestCase):
+    def setUp(self):
+        self.me, self.friend, self.offline_friend, self.stranger = (
+            User.objects.create_user(username=name) for name in ('me', 'friend', 'offline', 'stranger')
+        )
+        Friendship.objects.create(from_user=self.me, to_user=self.friend, accepted=True)
+        Friendship.objects.create(from_user=self.offline_friend, to_user=self.me, accepted=True)
+
+        self.clock = FakeClock()
+        self.channel_layer = mock.Mock(group_send=mock.AsyncMock())
+        for patch in (
+            mock.patch('app.presence.time', self.clock),
+            mock.patch('app.presence.get_channel_layer', return_value=self.channel_layer),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.presence = PresenceService(MemoryPresenceStore(), ttl=60, debounce_ms=0)
+
+    async def asyncTearDown(self):
+        if self.presence._sweeper is not None:
+            self.presence._sweeper.cancel()
+
+    async def _settle(self):
+        """Run the debounce timers and the announcements they start"""
+        while self.presence._timers or _background_tasks:
+            await asyncio.sleep(0)
+            await asyncio.gather(*list(_background_tasks))
+
+    def _announcements(self):
+        calls = [call.args for call in self.channel_layer.group_send.await_args_list]
+        self.channel_layer.group_send.reset_mock()
+        return [(group, loads(event['text'])['online']) for group, event in calls]
+
+    async def test_announced_to_online_friends_only(self):
+        await self.presence.connect(self.friend.id, 'friend-tab')
+        await self.presence.connect(self.stranger.id, 'stranger-tab')
+        await self._settle()
+        self._announcements()
+
+        await self.presence.connect(self.me.id, 'tab-1')
+        await self._settle()
+        self.assertEqual(self._announcements(), [(f'user_{self.friend.id}', True)])
+        self.assertEqual(await self.presence.online([self.me.id, self.offline_friend.id]), {self.me.id})
+
+    async def test_connections_across_tabs_are_refcounted(self):
+        await self.presence.connect(self.friend.id, 'friend-tab')
+        await self._settle()
+        self._announcements()
+        await self.presence.connect(self.me.id, 'tab-1')
+        await self.presence.connect(self.me.id, 'tab-2')
+        await self._settle()
+        self.assertEqual(self._announcements(), [(f'user_{self.friend.id}', True)])
+
+        await self.presence.disconnect(self.me.id, 'tab-1')
+        await self._settle()
+        self.assertEqual(self._announcements(), [])
+        self.assertEqual(await self.presence.online([self.me.id]), {self.me.id})
+
+        await self.presence.disconnect(self.me.id, 'tab-2')
+        await self._settle()
+        self.assertEqual(self._announcements(), [(f'user_{self.friend.id}', False)])
+
+    async def test_quick_reconnect_does_not_announce_offline(self):
+        await self.presence.connect(self.friend.id, 'friend-tab')
+        await self.presence.connect(self.me.id, 'tab-1')
+        await self._settle()
+        self._announcements()
+
+        # Reload: the old socket closes and a new one opens within the debounce window
+        await self.presence.disconnect(self.me.id, 'tab-1')
+        await self.presence.connect(self.me.id, 'tab-2')
+        await self._settle()
+        self.assertEqual(self._announcements(), [])
+        self.assertEqual(self.presence.stats()['suppressed'], 1)
+
+    async def test_connections_expire_without_heartbeats(self):
+        await self.presence.connect(self.friend.id, 'friend-tab')
+        await self.presence.connect(self.me.id, 'tab-1')
+        await self._settle()
+        self._announcements()
+
+        self.clock.now += 50
+        await self.presence.heartbeat(self.me.id, 'tab-1')
+        await self.presence.heartbeat(self.friend.id, 'friend-tab')
+        self.clock.now += 50
+        self.assertEqual(await self.presence.store.expired(self.clock.now), [])
+        self.assertEqual(await self.presence.online([self.me.id]), {self.me.id})
+
+        # The worker died: no more heartbeats, so the connection lapses after the TTL
+        self.clock.now += 20
+        await self.presence.heartbeat(self.friend.id, 'friend-tab')
+        self.clock.now += 1
+        expired = await self.presence.store.expired(self.clock.now)
+        self.assertEqual(expired, [self.me.id])
+        for user_id in expired:
+            self.presence._schedule(user_id)
+        await self._settle()
+        self.assertEqual(self._announcements(), [(f'user_{self.friend.id}', False)])
@@ -0,0 +1,193 @@
+"""
+Two-tier cache for translation results.
+
+Tier 1 is an in-process LRU with size and TTL eviction, tier 2 is the
+TranslationCacheEntry table which is shared across ASGI workers and restarts.
+Only short texts (greetings, stock phrases) are worth sharing, so tier 2 holds
+texts up to persist_max_chars; old rows are removed by prune_translation_cache.
+"""
+import hashlib
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+def normalize_text(text):
+    """Normalize text so trivially different inputs share a cache entry"""
+    text = unicodedata.normalize('NFC', text)
+    return ' '.join(text.split())
+
+
+def text_hash(text):
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe LRU cache with a maximum size and per-entry TTL"""
+    
+    def __init__(self, max_size=10000, ttl=86400):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self):
+        return len(self._data)
+
+
+class TranslationCache:
+    """In-process LRU in front of the persistent TranslationCacheEntry table"""
+    
+    def __init__(self, max_size=10000, ttl=86400, persistent=True, persist_max_chars=100):
+        self.memory = LRUCache(max_size=max_size, ttl=ttl)
+        self.persistent = persistent
+        self.persist_max_chars = persist_max_chars
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0}
+    
+    def _persistable(self, text):
+        return self.persistent and len(normalize_text(text)) <= self.persist_max_chars
+
+    def _count(self, name, amount=1):
+        if amount:
+            with self._lock:
+                self._stats[name] += amount
+    
+    def get_memory(self, text, source_lang, target_lang):
+        """Look up the in-process tier only (safe to call from async code)"""
+        result = self.memory.get((text_hash(text), source_lang, target_lang))
+        if result is not None:
+            self._count('memory_hits')
+        return result
+    
+    def set_memory(self, translations, source_lang, target_lang):
+        """Store a dict of text -> translation in the in-process tier only"""
+        for text, translated_text in translations.items():
+            self.memory.set((text_hash(text), source_lang, target_lang), translated_text)
+    
+    def get_many(self, texts, source_lang, target_lang):
+        """
+        Look up texts in both tiers.
+        Returns a dict of text -> translation for every text that was found.
+        """
+        from .models import TranslationCacheEntry
+        
+        found = {}
+        missing = {}  # hash -> texts with that hash
+        for text in texts:
+            key = text_hash(text)
+            result = self.memory.get((key, source_lang, target_lang))
+            if result is not None:
+                found[text] = result
+            else:
+                missing.setdefault(key, []).append(text)
+        self._count('memory_hits', len(found))
+        
+        # Long texts are never persisted, so don't look for them in the table
+        lookup = [key for key, group in missing.items() if self._persistable(group[0])]
+        if lookup:
+            try:
+                entries = TranslationCacheEntry.objects.filter(
+                    text_hash__in=lookup,
+                    source_language=source_lang,
+                    target_language=target_lang
+                ).values_list('text_hash', 'translated_text')
+                for key, translated_text in entries:
+                    self.memory.set((key, source_lang, target_lang), translated_text)
+                    for text in missing.pop(key):
+                        found[text] = translated_text
+                        self._count('db_hits')
+            except Exception as e:
+                print(f"Translation cache lookup error: {e}")
+        
+        self._count('misses', sum(len(group) for group in missing.values()))
+        return found
+    
+    def set_many(self, translations, source_lang, target_lang):
+        """Store a dict of text -> translation in both tiers"""
+        from .models import TranslationCacheEntry
+        
+        self.set_memory(translations, source_lang, target_lang)
+        entries = {
+            text_hash(text): translated_text
+            for text, translated_text in translations.items()
+            if self._persistable(text)
+        }
+        
+        if entries:
+            try:
+                TranslationCacheEntry.objects.bulk_create(
+                    [
+                        TranslationCacheEntry(
+                            text_hash=key,
+                            source_language=source_lang,
+                            target_language=target_lang,
+                            translated_text=translated_text
+                        )
+                        for key, translated_text in entries.items()
+                    ],
+                    ignore_conflicts=True
+                )
+            except Exception as e:
+                print(f"Translation cache store error: {e}")
+    
+    def prune(self, max_age):
+        """Delete persistent entries older than max_age seconds, returning how many were removed"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import TranslationCacheEntry
+
+        cutoff = timezone.now() - timedelta(seconds=max_age)
+        deleted, _ = TranslationCacheEntry.objects.filter(created_at__lt=cutoff).delete()
+        return deleted
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['memory_hits'] + stats['db_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['db_hits']) / lookups if lookups else 0.0
+        stats['memory_size'] = len(self.memory)
+        return stats
+
+
+_cache = None
+
+def get_translation_cache():
+    """Get the process-wide translation cache"""
+    global _cache
+    
+    if _cache is None:
+        _cache = TranslationCache(
+            max_size=getattr(settings, 'TRANSLATION_CACHE_SIZE', 10000),
+            ttl=getattr(settings, 'TRANSLATION_CACHE_TTL', 86400),
+            persistent=getattr(settings, 'TRANSLATION_CACHE_PERSISTENT', True),
+            persist_max_chars=getattr(settings, 'TRANSLATION_CACHE_PERSIST_MAX_CHARS', 100),
+        )
+    return _cache
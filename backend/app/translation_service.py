@@ -0,0 +1,354 @@
+"""
+Out-of-process translation service.
+
+A pool of worker processes owns the translation models, and ASGI workers talk
+to it over a local socket. Each frame is one line of JSON:
+
+    request:  {"id": 1, "texts": [...], "source": "en", "target": "fr"}
+    response: {"id": 1, "translations": [...]}  or  {"id": 1, "error": "..."}
+
+    request:  {"id": 2, "op": "status"}
+    response: {"id": 2, "hot_pairs": ["en-fr", ...]}
+
+Requests carry an id so a client can pipeline many requests on a single
+connection and match responses as they complete, in any order.
+"""
+import asyncio
+import functools
+import itertools
+import json
+import multiprocessing
+import os
+import queue as queue_module
+import threading
+import zlib
+
+from django.conf import settings
+
+# Frames carry whole chat messages, so allow lines well above asyncio's 64 KiB default
+STREAM_LIMIT = 16 * 1024 * 1024
+
+
+def parse_address(address):
+    """Split a service address into ('unix', path) or ('tcp', (host, port))"""
+    if address.startswith('unix:'):
+        return 'unix', address[len('unix:'):]
+    host, _, port = address.rpartition(':')
+    return 'tcp', (host or '127.0.0.1', int(port))
+
+
+def _encode(frame):
+    return json.dumps(frame, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def _worker_main(requests, results, warm_pairs):
+    """Worker process loop: owns its own translation models"""
+    from django.db import connections
+    from .consumers import _translate_batch_sync
+    from .warmup import warm_pair
+
+    # Never share the parent's database connections across the fork
+    connections.close_all()
+
+    for source_lang, target_lang in warm_pairs:
+        if warm_pair(source_lang, target_lang):
+            results.put(('warm', f"{source_lang}-{target_lang}"))
+
+    while True:
+        job = requests.get()
+        if job is None:
+            break
+        job_id, texts, source_lang, target_lang = job
+        try:
+            results.put(('result', job_id, _translate_batch_sync(texts, source_lang, target_lang), None))
+        except Exception as e:
+            results.put(('result', job_id, None, str(e)))
+
+
+class TranslationWorkerPool:
+    """
+    N worker processes, each with its own job queue.
+    Every language pair is pinned to one worker so each model is loaded once per host.
+
+    Workers are supervised: when one dies (e.g. OOM-killed while loading a model),
+    the jobs pending on it fail immediately, its pairs leave hot_pairs and it is
+    respawned with a fresh queue.
+    """
+
+    # How often the collector thread checks that the workers are still alive
+    MONITOR_INTERVAL = 1.0
+
+    def __init__(self, num_workers=2):
+        self.num_workers = max(1, num_workers)
+        self._context = multiprocessing.get_context('fork')
+        self._results = self._context.Queue()
+        self._queues = []
+        self._processes = []
+        self._futures = {}
+        self._job_workers = {}  # job id -> index of the worker it was queued on
+        self._job_ids = itertools.count(1)
+        self._warm_pairs = []
+        self.hot_pairs = set()
+        self._loop = None
+        self._collector = None
+        self._stopping = False
+
+    def start(self, loop, warm_pairs=()):
+        self._loop = loop
+        self._warm_pairs = list(warm_pairs)
+        for index in range(self.num_workers):
+            self._queues.append(None)
+            self._processes.append(None)
+            self._spawn(index)
+
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+        print(f"Started {self.num_workers} translation worker(s)")
+
+    def _spawn(self, index):
+        queue = self._context.Queue()
+        # Each worker only warms the pairs pinned to it
+        pinned = [pair for pair in self._warm_pairs if self.worker_for(*pair) == index]
+        process = self._context.Process(target=_worker_main, args=(queue, self._results, pinned), daemon=True)
+        process.start()
+        self._queues[index] = queue
+        self._processes[index] = process
+
+    def stop(self):
+        self._stopping = True
+        for queue in self._queues:
+            queue.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+        self._results.put(None)
+        if self._collector is not None:
+            self._collector.join(timeout=self.MONITOR_INTERVAL * 2)
+
+    def worker_for(self, source_lang, target_lang):
+        return zlib.crc32(f"{source_lang}-{target_lang}".encode()) % self.num_workers
+
+    def submit(self, texts, source_lang, target_lang):
+        """Queue a batch on the pair's worker and return a future for the translations"""
+        self._check_workers()
+        index = self.worker_for(source_lang, target_lang)
+        job_id = next(self._job_ids)
+        future = self._loop.create_future()
+        self._futures[job_id] = future
+        self._job_workers[job_id] = index
+        self._queues[index].put((job_id, list(texts), source_lang, target_lang))
+        return future
+
+    def _check_workers(self):
+        """Fail the jobs of dead workers, forget their warm pairs and respawn them (event loop thread)"""
+        if self._stopping:
+            return
+        for index, process in enumerate(self._processes):
+            if process.is_alive():
+                continue
+            print(f"Translation worker {index} exited with code {process.exitcode}, restarting it")
+            for job_id, worker in list(self._job_workers.items()):
+                if worker == index:
+                    self._resolve(job_id, None, f"Translation worker {index} died")
+            self.hot_pairs.difference_update(
+                f"{source_lang}-{target_lang}" for source_lang, target_lang in self._warm_pairs
+                if self.worker_for(source_lang, target_lang) == index
+            )
+            self._spawn(index)
+
+    def _collect(self):
+        """Background thread: hand results from the workers back to the event loop"""
+        while True:
+            try:
+                result = self._results.get(timeout=self.MONITOR_INTERVAL)
+            except queue_module.Empty:
+                result = ('check',)
+            if result is None or self._stopping:
+                break
+            kind, *payload = result
+            if kind == 'check':
+                callback = self._check_workers
+            elif kind == 'warm':
+                callback = functools.partial(self.hot_pairs.add, *payload)
+            else:
+                callback = functools.partial(self._resolve, *payload)
+            try:
+                self._loop.call_soon_threadsafe(callback)
+            except RuntimeError:
+                # Event loop already closed during shutdown
+                break
+
+    def _resolve(self, job_id, translations, error):
+        self._job_workers.pop(job_id, None)
+        future = self._futures.pop(job_id, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(RuntimeError(error))
+        else:
+            future.set_result(translations)
+
+
+class TranslationServer:
+    """Socket front-end that feeds requests from ASGI workers into the worker pool"""
+
+    def __init__(self, address, num_workers=2, warm_pairs=()):
+        self.address = address
+        self.warm_pairs = list(warm_pairs)
+        self.pool = TranslationWorkerPool(num_workers)
+
+    async def serve_forever(self):
+        self.pool.start(asyncio.get_running_loop(), self.warm_pairs)
+        kind, target = parse_address(self.address)
+        if kind == 'unix':
+            if os.path.exists(target):
+                os.unlink(target)
+            server = await asyncio.start_unix_server(self._handle_connection, path=target, limit=STREAM_LIMIT)
+        else:
+            server = await asyncio.start_server(self._handle_connection, *target, limit=STREAM_LIMIT)
+
+        print(f"Translation service listening on {self.address}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.pool.stop()
+
+    async def _handle_connection(self, reader, writer):
+        pending = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                # Handle each request concurrently so a client can pipeline requests
+                task = asyncio.ensure_future(self._handle_request(line, writer))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            for task in pending:
+                task.cancel()
+            writer.close()
+
+    async def _handle_request(self, line, writer):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request['id']
+            if request.get('op') == 'status':
+                response = {'id': request_id, 'hot_pairs': sorted(self.pool.hot_pairs)}
+            else:
+                translations = await self.pool.submit(request['texts'], request['source'], request['target'])
+                response = {'id': request_id, 'translations': translations}
+        except Exception as e:
+            response = {'id': request_id, 'error': str(e)}
+
+        if not writer.is_closing():
+            writer.write(_encode(response))
+            await writer.drain()
+
+
+class TranslationServiceClient:
+    """
+    Pipelining client used by the ASGI workers.
+    Keeps one connection per event loop and matches responses to callers by request id.
+    """
+
+    def __init__(self, address, timeout=10):
+        self.address = address
+        self.timeout = timeout
+        self._request_ids = itertools.count(1)
+        self._pending = {}  # request id -> future
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+        self._loop = None
+        self._connect_lock = None
+
+    async def _ensure_connected(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Streams are bound to the loop that created them
+            self._loop = loop
+            self._connect_lock = asyncio.Lock()
+            self._writer = None
+
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return
+            kind, target = parse_address(self.address)
+            if kind == 'unix':
+                self._reader, self._writer = await asyncio.open_unix_connection(target, limit=STREAM_LIMIT)
+            else:
+                self._reader, self._writer = await asyncio.open_connection(*target, limit=STREAM_LIMIT)
+            self._reader_task = asyncio.ensure_future(self._read_responses(self._reader))
+
+    async def _read_responses(self, reader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self._pending.pop(response.get('id'), None)
+                if future is None or future.done():
+                    continue
+                if 'error' in response:
+                    future.set_exception(RuntimeError(response['error']))
+                else:
+                    future.set_result(response)
+        except (ConnectionError, ValueError) as e:
+            print(f"Translation service connection error: {e}")
+        finally:
+            # Fail everything still in flight on this connection so callers don't hang
+            for request_id, future in list(self._pending.items()):
+                if not future.done():
+                    future.set_exception(ConnectionError('Translation service connection lost'))
+            self._pending.clear()
+            self._writer = None
+
+    async def _request(self, frame):
+        await self._ensure_connected()
+
+        request_id = next(self._request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._writer.write(_encode(dict(frame, id=request_id)))
+
+        try:
+            await self._writer.drain()
+            return await asyncio.wait_for(future, timeout=self.timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def translate_batch(self, texts, source_lang, target_lang):
+        """Send a batch to the service and wait for its translations"""
+        response = await self._request({
+            'texts': list(texts),
+            'source': source_lang,
+            'target': target_lang,
+        })
+        return response['translations']
+
+    async def hot_pairs(self):
+        """Language pairs the service has loaded and warmed"""
+        response = await self._request({'op': 'status'})
+        return response['hot_pairs']
+
+
+_client = None
+
+def get_service_client():
+    """Get the process-wide translation service client, or None when translating in-process"""
+    global _client
+
+    address = getattr(settings, 'TRANSLATION_SERVICE_ADDRESS', '')
+    if not address:
+        return None
+    if _client is None:
+        _client = TranslationServiceClient(
+            address,
+            timeout=getattr(settings, 'TRANSLATION_SERVICE_TIMEOUT', 10),
+        )
+    return _client
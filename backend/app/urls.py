@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import SignupView, MeView, UserListView, FriendsView, FriendRequestView, MessagesView, FriendRequestsView, FriendRecommendationsView
+from .views import SignupView, MeView, UserListView, FriendsView, FriendRequestView, MessagesView, FriendRequestsView, FriendRecommendationsView, TranslationStatsView, ReadinessView
 
 urlpatterns = [
     path('signup/', SignupView.as_view(), name='signup'),
@@ -10,4 +10,6 @@ urlpatterns = [
     path('friend-request/<int:user_id>/', FriendRequestView.as_view(), name='friend-request'),
     path('messages/<int:friend_id>/', MessagesView.as_view(), name='messages'),
     path('friend-recommendations/', FriendRecommendationsView.as_view(), name='friend-recommendations'),
+    path('translation-stats/', TranslationStatsView.as_view(), name='translation-stats'),
+    path('ready/', ReadinessView.as_view(), name='ready'),
 ]
\ No newline at end of file
@@ -0,0 +1,169 @@
+"""
+User search backends for UserListView.
+
+Every backend filters a user queryset down to the matches for a search term and
+annotates an integer `relevance`, so the view can order and keyset-paginate on
+(-relevance, username):
+
+    100  username or email equals the term
+     80  username or email starts with the term
+     50  username or email contains the term
+   1-49  username is a near miss (typo tolerance), scaled by trigram similarity
+
+    contains  icontains scan; works everywhere but reads the whole user table
+    trigram   PostgreSQL pg_trgm: GIN trigram indexes serve the contains
+              filter and the similarity (%) operator
+    fts5      SQLite FTS5 table with the trigram tokenizer: substring matches
+              and near-miss candidates come from the index
+
+USER_SEARCH_BACKEND picks one; 'auto' chooses by database vendor. The indexes
+and the FTS5 table are created by migration 0009.
+"""
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Case, F, IntegerField, Q, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+# Relevance of a near miss is similarity * FUZZY_SCALE, so it stays below "contains"
+FUZZY_SCALE = 49
+# Minimum trigram similarity for a near miss (pg_trgm's default threshold)
+SIMILARITY_THRESHOLD = 0.3
+
+FTS_TABLE = 'app_user_search'
+
+
+def trigrams(text):
+    """pg_trgm-style trigrams: lowercase, each word padded with two leading spaces and one trailing"""
+    result = set()
+    for word in ''.join(c if c.isalnum() else ' ' for c in text.lower()).split():
+        padded = f'  {word} '
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def trigram_similarity(a, b):
+    """Shared trigrams over all trigrams, like pg_trgm's similarity()"""
+    a, b = trigrams(a), trigrams(b)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _match_levels(term):
+    return [
+        When(username__iexact=term, then=100),
+        When(email__iexact=term, then=100),
+        When(username__istartswith=term, then=80),
+        When(email__istartswith=term, then=80),
+        When(username__icontains=term, then=50),
+        When(email__icontains=term, then=50),
+    ]
+
+
+class ContainsUserSearch:
+    """The original icontains search; a sequential scan of the user table"""
+    name = 'contains'
+
+    def search(self, users, term):
+        return users.filter(
+            Q(username__icontains=term) | Q(email__icontains=term)
+        ).annotate(
+            relevance=Case(*_match_levels(term), default=0, output_field=IntegerField())
+        )
+
+
+class TrigramUserSearch(ContainsUserSearch):
+    """PostgreSQL pg_trgm search with typo tolerance on usernames"""
+    name = 'trigram'
+
+    def __init__(self):
+        from django.contrib.postgres.lookups import TrigramSimilar
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        self.TrigramSimilar = TrigramSimilar
+        self.TrigramSimilarity = TrigramSimilarity
+
+    def search(self, users, term):
+        return users.filter(
+            Q(username__icontains=term)
+            | Q(email__icontains=term)
+            | Q(self.TrigramSimilar(F('username'), term))
+        ).annotate(
+            relevance=Case(
+                *_match_levels(term),
+                default=Cast(self.TrigramSimilarity('username', term) * FUZZY_SCALE, IntegerField()),
+                output_field=IntegerField()
+            )
+        )
+
+
+class FTS5UserSearch(ContainsUserSearch):
+    """SQLite FTS5 (trigram tokenizer) search with typo tolerance on usernames"""
+    name = 'fts5'
+
+    def __init__(self, max_candidates=500):
+        self.max_candidates = max_candidates
+
+    def search(self, users, term):
+        # The trigram tokenizer can't index terms shorter than one trigram
+        if len(term) < 3:
+            return super().search(users, term)
+
+        # Substring matches (username or email), straight from the index
+        phrase = '"' + term.replace('"', '""') + '"'
+        contains = Q(id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [phrase]))
+
+        # Near misses: the users sharing the most trigrams with the term, scored like pg_trgm
+        fuzzy_levels = {}
+        for user_id, username in self._candidates(term, users.db):
+            score = trigram_similarity(term, username)
+            if score >= SIMILARITY_THRESHOLD:
+                fuzzy_levels.setdefault(max(1, int(score * FUZZY_SCALE)), []).append(user_id)
+
+        fuzzy_ids = [user_id for ids in fuzzy_levels.values() for user_id in ids]
+        return users.filter(contains | Q(id__in=fuzzy_ids)).annotate(
+            relevance=Case(
+                *_match_levels(term),
+                *[When(id__in=ids, then=level) for level, ids in sorted(fuzzy_levels.items(), reverse=True)],
+                default=0,
+                output_field=IntegerField()
+            )
+        )
+
+    def _candidates(self, term, using):
+        grams = sorted({gram for gram in trigrams(term) if gram.strip() and len(gram.strip()) == 3})
+        if not grams:
+            return []
+        query = ' OR '.join('"' + gram.replace('"', '""') + '"' for gram in grams)
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, username FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY rank LIMIT %s',
+                [query, self.max_candidates]
+            )
+            return cursor.fetchall()
+
+
+BACKENDS = {
+    'contains': ContainsUserSearch,
+    'trigram': TrigramUserSearch,
+    'fts5': FTS5UserSearch,
+}
+
+def backend_name(vendor):
+    """USER_SEARCH_BACKEND, with 'auto' resolved for the given database vendor"""
+    name = getattr(settings, 'USER_SEARCH_BACKEND', 'auto')
+    if name == 'auto':
+        name = {'postgresql': 'trigram', 'sqlite': 'fts5'}.get(vendor, 'contains')
+    return name
+
+
+_backend = None
+
+def get_user_search():
+    """Get the configured user search backend"""
+    global _backend
+
+    if _backend is None:
+        _backend = BACKENDS[backend_name(connection.vendor)]()
+    return _backend
@@ -1,11 +1,53 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from django.db.models import Q
-from collections import deque
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+from django.db.models import Exists, IntegerField, OuterRef, Q, Value
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+import binascii
+from django.conf import settings
 from .models import User, Friendship, Message
-from .serializers import UserSerializer, FriendshipSerializer, MessageSerializer
+from .serializers import UserSerializer, FriendshipSerializer
+from . import language_detection
+from .admission import get_admission
+from .encoding import encoded_event
+from .friend_graph import get_friend_graph
+from .persistence import get_write_behind
+from .presence import get_presence
+from .receipts import get_receipts
+from .recommendations import get_recommendations
+from .translation_cache import get_translation_cache
+from .translation_service import get_service_client
+from .user_search import get_user_search
+from .warmup import hot_pairs, preload_pairs, warmup_on_startup
+
+# Columns of a chat history row (MessagesView)
+HISTORY_FIELDS = ('id', 'content', 'translated_content', 'original_language', 'status', 'timestamp')
+
+def encode_message_cursor(timestamp, message_id):
+    """Opaque keyset cursor for a message's (timestamp, id) position"""
+    return urlsafe_b64encode(f"{timestamp.isoformat()}|{message_id}".encode()).decode()
+
+def decode_message_cursor(cursor):
+    """(timestamp, id) from a cursor; raises ValueError if it's malformed"""
+    try:
+        timestamp, message_id = urlsafe_b64decode(cursor.encode()).decode().split('|')
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(str(e))
+    return datetime.fromisoformat(timestamp), int(message_id)
+
+def encode_user_cursor(relevance, username):
+    """Opaque keyset cursor for a user list position (usernames never contain '|')"""
+    return urlsafe_b64encode(f"{relevance}|{username}".encode()).decode()
+
+def decode_user_cursor(cursor):
+    """(relevance, username) from a cursor; raises ValueError if it's malformed"""
+    try:
+        relevance, username = urlsafe_b64decode(cursor.encode()).decode().split('|')
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(str(e))
+    return int(relevance), username
 
 class SignupView(APIView):
     permission_classes = [AllowAny]
@@ -52,71 +94,65 @@ class UserListView(APIView):
     
     def get(self, request):
         search = request.query_params.get('search', '').strip()
+        try:
+            limit = min(int(request.query_params.get('limit', getattr(settings, 'USER_LIST_PAGE_SIZE', 50))),
+                        getattr(settings, 'USER_LIST_MAX_PAGE_SIZE', 200))
+            after = request.query_params.get('after')
+            after = decode_user_cursor(after) if after else None
+        except ValueError:
+            return Response({'error': 'Invalid limit or cursor'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({'error': 'Invalid limit or cursor'}, status=status.HTTP_400_BAD_REQUEST)
+        
         # Exclude current user
         users = User.objects.exclude(id=request.user.id)
         
         if search:
-            # Advanced search algorithm with relevance scoring
-            from django.db.models import Case, When, IntegerField
-            users = users.filter(
-                Q(username__icontains=search) | Q(email__icontains=search)
-            ).annotate(
-                relevance=Case(
-                    # Exact matches get highest score (100)
-                    When(username__iexact=search, then=100),
-                    When(email__iexact=search, then=100),
-                    # Starts with gets high score (80)
-                    When(username__istartswith=search, then=80),
-                    When(email__istartswith=search, then=80),
-                    # Contains gets medium score (50)
-                    When(username__icontains=search, then=50),
-                    When(email__icontains=search, then=50),
-                    default=0,
-                    output_field=IntegerField()
-                )
-            ).order_by('-relevance', 'username')
+            # Relevance-scored search (exact > prefix > contains > near miss) on the configured backend
+            users = get_user_search().search(users, search).order_by('-relevance', 'username')
         else:
             # If no search, return all users ordered by username
-            users = users.order_by('username')
-        
-        # Exclude users who are already friends or have pending requests
-        from .models import Friendship
-        friend_ids = set()
-        # Get accepted friends
-        friendships = Friendship.objects.filter(
-            (Q(from_user=request.user) | Q(to_user=request.user)),
-            accepted=True
+            users = users.annotate(relevance=Value(0, output_field=IntegerField())).order_by('username')
+        
+        # Keyset pagination on (relevance, username); usernames are unique
+        if after is not None:
+            relevance, username = after
+            users = users.filter(Q(relevance__lt=relevance) | Q(relevance=relevance, username__gt=username))
+        
+        # Friendship status for every row in the same query: each Exists is a
+        # lookup on the (from_user, to_user) unique index
+        users = users.annotate(
+            friends_out=Exists(Friendship.objects.filter(from_user=request.user, to_user=OuterRef('pk'), accepted=True)),
+            friends_in=Exists(Friendship.objects.filter(from_user=OuterRef('pk'), to_user=request.user, accepted=True)),
+            request_sent=Exists(Friendship.objects.filter(from_user=request.user, to_user=OuterRef('pk'), accepted=False)),
+            request_received=Exists(Friendship.objects.filter(from_user=OuterRef('pk'), to_user=request.user, accepted=False)),
         )
-        for f in friendships:
-            friend_ids.add(f.to_user.id if f.from_user == request.user else f.from_user.id)
         
-        # Get pending requests (both sent and received)
-        pending = Friendship.objects.filter(
-            Q(from_user=request.user) | Q(to_user=request.user),
-            accepted=False
-        )
-        for f in pending:
-            friend_ids.add(f.to_user.id if f.from_user == request.user else f.from_user.id)
+        rows = list(users.values(
+            'id', 'username', 'email', 'preferred_language', 'relevance',
+            'friends_out', 'friends_in', 'request_sent', 'request_received'
+        )[:limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
         
-        # Add friendship status to each user
-        serializer = UserSerializer(users, many=True)
         result = []
-        for user_data in serializer.data:
-            user_dict = dict(user_data)
-            user_dict['is_friend'] = user_data['id'] in friend_ids
-            # Check if there's a pending request
-            user_dict['has_pending_request'] = False
-            if user_data['id'] in friend_ids:
-                pending_req = Friendship.objects.filter(
-                    (Q(from_user=request.user, to_user_id=user_data['id']) | 
-                     Q(from_user_id=user_data['id'], to_user=request.user)),
-                    accepted=False
-                ).first()
-                user_dict['has_pending_request'] = pending_req is not None
-                user_dict['request_sent_by_me'] = pending_req.from_user == request.user if pending_req else False
-            result.append(user_dict)
+        for row in rows:
+            pending = row['request_sent'] or row['request_received']
+            result.append({
+                'id': row['id'],
+                'username': row['username'],
+                'email': row['email'],
+                'preferred_language': row['preferred_language'],
+                # Friends or a pending request either way (the list's "already connected" flag)
+                'is_friend': row['friends_out'] or row['friends_in'] or pending,
+                'has_pending_request': pending,
+                'request_sent_by_me': row['request_sent'],
+            })
         
-        return Response(result)
+        return Response({
+            'users': result,
+            'next_after': encode_user_cursor(rows[-1]['relevance'], rows[-1]['username']) if has_more else None,
+        })
 
 class FriendsView(APIView):
     permission_classes = [IsAuthenticated]
@@ -199,14 +235,11 @@ class FriendRequestView(APIView):
         if channel_layer:
             async_to_sync(channel_layer.group_send)(
                 f'user_{target_user.id}',
-                {
-                    'type': 'friend_request_notification',
-                    'message': {
-                        'type': 'friend_request',
-                        'from_user': UserSerializer(request.user).data,
-                        'friendship_id': friendship.id,
-                    }
-                }
+                encoded_event('friend_request_notification', {
+                    'type': 'friend_request',
+                    'from_user': UserSerializer(request.user).data,
+                    'friendship_id': friendship.id,
+                })
             )
         
         return Response({'message': 'Friend request sent'}, status=status.HTTP_201_CREATED)
@@ -229,127 +262,127 @@ class MessagesView(APIView):
         if not friendship:
             return Response({'error': 'Users are not friends'}, status=status.HTTP_403_FORBIDDEN)
         
-        # Get messages between users
-        messages = Message.objects.filter(
-            (Q(sender=request.user, receiver=friend) | Q(sender=friend, receiver=request.user))
-        ).order_by('timestamp')
-        
-        serializer = MessageSerializer(messages, many=True)
-        # Add display content based on sender
-        data = []
-        for msg in serializer.data:
-            msg_data = dict(msg)
-            if msg['sender']['id'] == request.user.id:
-                msg_data['displayContent'] = msg['content']
-            else:
-                msg_data['displayContent'] = msg['translated_content']
-            data.append(msg_data)
+        # Newest first, one page at a time: ?before=<cursor>&limit=<n>
+        try:
+            limit = min(int(request.query_params.get('limit', getattr(settings, 'CHAT_HISTORY_PAGE_SIZE', 50))),
+                        getattr(settings, 'CHAT_HISTORY_MAX_PAGE_SIZE', 200))
+            before = request.query_params.get('before')
+            before = decode_message_cursor(before) if before else None
+        except ValueError:
+            return Response({'error': 'Invalid limit or cursor'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({'error': 'Invalid limit or cursor'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # One indexed range scan per direction (sender, receiver, timestamp, id),
+        # each stopping after limit + 1 rows, merged here: cost doesn't grow with the chat.
+        # Rows are plain column values; sender/receiver are fixed per direction, so
+        # they and displayContent are filled in without touching the user table.
+        page = []
+        for sender, receiver in ((request.user, friend), (friend, request.user)):
+            messages = Message.objects.filter(sender=sender, receiver=receiver)
+            if before is not None:
+                messages = messages.filter(
+                    Q(timestamp__lt=before[0]) | Q(timestamp=before[0], id__lt=before[1])
+                )
+            display_field = 'content' if sender == request.user else 'translated_content'
+            for row in messages.order_by('-timestamp', '-id').values(*HISTORY_FIELDS)[:limit + 1]:
+                row['sender'] = sender.id
+                row['receiver'] = receiver.id
+                row['displayContent'] = row[display_field]
+                page.append(row)
+        page.sort(key=lambda row: (row['timestamp'], row['id']), reverse=True)
+        has_more = len(page) > limit
+        page = page[:limit]
         
-        return Response(data)
+        return Response({
+            # The only two users involved, sent once instead of nested in every message
+            'users': UserSerializer([request.user, friend], many=True).data,
+            'messages': page,
+            'next_before': encode_message_cursor(page[-1]['timestamp'], page[-1]['id']) if has_more else None,
+        })
 
 class FriendRecommendationsView(APIView):
     """
     BFS-based friend recommendation algorithm.
-    Finds friends-of-friends who aren't already friends or have pending requests.
-    Uses Breadth-First Search to traverse the friendship graph.
+    Finds friends-of-friends who aren't already friends or have pending requests,
+    ranked by mutual friends. Served from the precomputed recommendations table
+    when the user's entry is fresh, otherwise by traversing the user's 2-hop
+    neighbourhood in the shared in-memory friendship graph.
     """
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        from collections import defaultdict
-        
-        user = request.user
-        max_depth = 2  # Friends of friends (distance 2)
         max_recommendations = 10
         
-        # Build adjacency list for friendship graph
-        # Get all accepted friendships
-        friendships = Friendship.objects.filter(accepted=True)
-        
-        # Create graph: user_id -> set of friend_ids
-        graph = defaultdict(set)
-        for friendship in friendships:
-            graph[friendship.from_user.id].add(friendship.to_user.id)
-            graph[friendship.to_user.id].add(friendship.from_user.id)
-        
-        # Get users to exclude (already friends, pending requests, or self)
-        exclude_ids = {user.id}
-        
-        # Add direct friends
-        if user.id in graph:
-            exclude_ids.update(graph[user.id])
+        recommendations, source = get_recommendations(request.user.id, limit=max_recommendations)
+        mutual_friends_map = dict(recommendations)
+        recommended_users = User.objects.filter(id__in=mutual_friends_map)
         
-        # Add users with pending requests
-        pending = Friendship.objects.filter(
-            Q(from_user=user) | Q(to_user=user),
-            accepted=False
-        )
-        for f in pending:
-            exclude_ids.add(f.to_user.id if f.from_user == user else f.from_user.id)
-        
-        # BFS Algorithm to find friends-of-friends
-        # Queue: (user_id, depth, mutual_friends_count)
-        queue = deque([(user.id, 0)])
-        visited = {user.id}
-        recommendations = defaultdict(int)  # user_id -> mutual friends count
-        
-        while queue:
-            current_user_id, depth = queue.popleft()
-            
-            # Only traverse up to max_depth
-            if depth >= max_depth:
-                continue
-            
-            # Get neighbors (friends) of current user
-            if current_user_id not in graph:
-                continue
-            
-            for friend_id in graph[current_user_id]:
-                # Skip if already visited or excluded
-                if friend_id in exclude_ids:
-                    continue
-                
-                # If at depth 1 (friend), continue BFS to find their friends
-                if depth == 0:
-                    # This is a direct friend, explore their friends
-                    if friend_id not in visited:
-                        visited.add(friend_id)
-                        queue.append((friend_id, depth + 1))
-                
-                # If at depth 1 (we're exploring a friend's friends)
-                elif depth == 1:
-                    # This is a friend-of-friend (recommendation candidate)
-                    if friend_id not in exclude_ids:
-                        # Count mutual friends
-                        mutual_friends = len(graph[user.id] & graph[friend_id])
-                        recommendations[friend_id] = max(recommendations[friend_id], mutual_friends)
-        
-        # Sort recommendations by mutual friends count (descending)
-        sorted_recommendations = sorted(
-            recommendations.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )[:max_recommendations]
-        
-        # Get user objects and serialize
-        recommended_user_ids = [user_id for user_id, _ in sorted_recommendations]
-        recommended_users = User.objects.filter(id__in=recommended_user_ids)
-        
-        # Create a map for mutual friends count
-        mutual_friends_map = dict(sorted_recommendations)
-        
-        serializer = UserSerializer(recommended_users, many=True)
         result = []
-        for user_data in serializer.data:
+        for user_data in UserSerializer(recommended_users, many=True).data:
             user_dict = dict(user_data)
-            user_dict['mutual_friends_count'] = mutual_friends_map.get(user_data['id'], 0)
+            user_dict['mutual_friends_count'] = mutual_friends_map[user_data['id']]
             result.append(user_dict)
         
-        # Sort result to maintain order by mutual friends
-        result.sort(key=lambda x: x['mutual_friends_count'], reverse=True)
+        # Keep the ranking order (most mutual friends first)
+        rank = {user_id: index for index, (user_id, _) in enumerate(recommendations)}
+        result.sort(key=lambda x: rank[x['id']])
         
         return Response({
             'recommendations': result,
+            'source': source,
             'algorithm': 'BFS (Breadth-First Search)',
             'description': 'Finds friends-of-friends using graph traversal, ranked by mutual friends'
-        })
\ No newline at end of file
+        })
+
+class TranslationStatsView(APIView):
+    """Translation pipeline counters for this worker process"""
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        from .consumers import _translators
+        
+        writer = get_write_behind()
+        return Response({
+            'cache': get_translation_cache().stats(),
+            'models': _translators.stats(),
+            'detection': language_detection.stats(),
+            'admission': get_admission().stats(),
+            'write_behind': writer.stats() if writer is not None else None,
+            'receipts': get_receipts().stats(),
+            'presence': get_presence().stats(),
+            'friend_graph': get_friend_graph().stats(),
+        })
+
+
+class ReadinessView(APIView):
+    """
+    Readiness probe for the load balancer.
+    Returns 200 once every TRANSLATION_PRELOAD_PAIRS model is loaded and warm, 503 otherwise.
+    Without startup warmup (TRANSLATION_PRELOAD_ON_STARTUP off) nothing would ever
+    warm them in this process, so no pairs are required.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    
+    def get(self, request):
+        client = get_service_client()
+        if client is not None:
+            from asgiref.sync import async_to_sync
+            try:
+                hot = async_to_sync(client.hot_pairs)()
+            except Exception as e:
+                return Response(
+                    {'ready': False, 'error': f'Translation service unavailable: {e}'},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE
+                )
+        else:
+            hot = hot_pairs()
+        
+        required = preload_pairs() if client is not None or warmup_on_startup() else []
+        pending = [f"{source}-{target}" for source, target in required if f"{source}-{target}" not in hot]
+        ready = not pending
+        return Response(
+            {'ready': ready, 'hot_pairs': hot, 'pending_pairs': pending},
+            status=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE
+        )
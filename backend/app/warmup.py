@@ -0,0 +1,95 @@
+"""
+Startup preloading and warmup for translation models.
+
+Pairs listed in TRANSLATION_PRELOAD_PAIRS are loaded and have a dummy batch
+run through them, so the first real message for a pair doesn't pay for
+loading weights and the first (slow) inference. Warming happens inside each
+serving process at startup (unless TRANSLATION_PRELOAD_ON_STARTUP is off), and
+the preloaded pairs are pinned in the model manager. ReadinessView reports
+which pairs are hot.
+"""
+import threading
+
+from django.conf import settings
+
+# A couple of short sentences per source language, run once per pair as a dummy batch
+WARMUP_TEXTS = {
+    'en': ['Hello, how are you?', 'See you tomorrow.'],
+    'fr': ['Bonjour, comment ça va ?', 'À demain.'],
+    'es': ['Hola, ¿cómo estás?', 'Hasta mañana.'],
+}
+
+_hot_pairs = set()
+_lock = threading.Lock()
+
+
+def parse_pair(pair):
+    """Turn 'en-fr' into ('en', 'fr')"""
+    source_lang, _, target_lang = pair.strip().partition('-')
+    return source_lang, target_lang
+
+
+def preload_pairs():
+    """Language pairs configured for preloading, as (source, target) tuples"""
+    return [parse_pair(pair) for pair in getattr(settings, 'TRANSLATION_PRELOAD_PAIRS', []) if pair.strip()]
+
+
+def warmup_on_startup():
+    """Whether this process warms the preload pairs itself (and readiness waits for them)"""
+    return bool(preload_pairs()) and getattr(settings, 'TRANSLATION_PRELOAD_ON_STARTUP', True)
+
+
+def mark_hot(source_lang, target_lang):
+    with _lock:
+        _hot_pairs.add(f"{source_lang}-{target_lang}")
+
+
+def hot_pairs():
+    """Warmed pairs that are still loaded (the model manager may have evicted some)"""
+    from .consumers import _translators
+
+    with _lock:
+        return sorted(pair for pair in _hot_pairs if _translators.is_loaded(pair))
+
+
+def warm_pair(source_lang, target_lang):
+    """Load the model for a pair and run a dummy batch through it"""
+    from .consumers import get_translator
+
+    translator = get_translator(source_lang, target_lang)
+    if translator is None:
+        print(f"Cannot warm up {source_lang}-{target_lang}: no model available")
+        return False
+
+    texts = WARMUP_TEXTS.get(source_lang, WARMUP_TEXTS['en'])
+    try:
+        translator(list(texts), max_length=64, batch_size=len(texts))
+    except Exception as e:
+        print(f"Warmup error for {source_lang}-{target_lang}: {e}")
+        return False
+
+    mark_hot(source_lang, target_lang)
+    print(f"Translation model {source_lang}-{target_lang} is warm")
+    return True
+
+
+def warm_up(pairs=None):
+    """Load and warm every pair (defaults to TRANSLATION_PRELOAD_PAIRS)"""
+    if pairs is None:
+        pairs = preload_pairs()
+    return {f"{source_lang}-{target_lang}": warm_pair(source_lang, target_lang) for source_lang, target_lang in pairs}
+
+
+def start_warmup():
+    """
+    Startup hook: warm the preload pairs in a background thread.
+    Skipped when translation runs in the out-of-process service, whose workers warm themselves.
+    """
+    if not warmup_on_startup():
+        return None
+    if getattr(settings, 'TRANSLATION_SERVICE_ADDRESS', ''):
+        return None
+
+    thread = threading.Thread(target=warm_up, name='translation-warmup', daemon=True)
+    thread.start()
+    return thread
@@ -11,8 +11,12 @@ django.setup()
 
 # 3️⃣ Now safe to import anything that depends on Django models
 from app.middleware import JWTAuthMiddleware
+from app.warmup import start_warmup
 import app.routing
 
+# 4️⃣ Load and warm the configured translation models in the background
+start_warmup()
+
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
     "websocket": JWTAuthMiddleware(
@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import config, Csv
 import os
 from datetime import timedelta
 
@@ -173,14 +173,157 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
 
-# For Channels (in-memory layer for local dev)
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
-    },
-}
+# For Channels. Without CHANNEL_REDIS_HOSTS the layer is in-memory (local dev):
+# group_send only reaches sockets on the same process, so run a single worker.
+# With one or more Redis URLs every worker shares the layer; several URLs shard
+# groups and channels across them. Group membership expires after
+# CHANNEL_GROUP_EXPIRY seconds unless renewed (chat connections renew theirs).
+CHANNEL_REDIS_HOSTS = config("CHANNEL_REDIS_HOSTS", cast=Csv(), default="")
+CHANNEL_REDIS_POOL_SIZE = config("CHANNEL_REDIS_POOL_SIZE", cast=int, default=50)
+CHANNEL_GROUP_EXPIRY = config("CHANNEL_GROUP_EXPIRY", cast=int, default=86400)
+CHANNEL_CAPACITY = config("CHANNEL_CAPACITY", cast=int, default=100)
+CHANNEL_MESSAGE_EXPIRY = config("CHANNEL_MESSAGE_EXPIRY", cast=int, default=60)
+CHANNEL_PREFIX = config("CHANNEL_PREFIX", default="lingobridge")
+
+if CHANNEL_REDIS_HOSTS:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'app.channel_layers.ShardedRedisChannelLayer',
+            'CONFIG': {
+                'hosts': [
+                    {'address': url, 'max_connections': CHANNEL_REDIS_POOL_SIZE}
+                    for url in CHANNEL_REDIS_HOSTS
+                ],
+                'group_expiry': CHANNEL_GROUP_EXPIRY,
+                'capacity': CHANNEL_CAPACITY,
+                'expiry': CHANNEL_MESSAGE_EXPIRY,
+                'prefix': CHANNEL_PREFIX,
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+            'CONFIG': {
+                'group_expiry': CHANNEL_GROUP_EXPIRY,
+                'capacity': CHANNEL_CAPACITY,
+                'expiry': CHANNEL_MESSAGE_EXPIRY,
+            },
+        },
+    }
 ASGI_APPLICATION = 'backend.asgi.application'
 
+# Two-phase chat delivery: deliver the original text immediately with
+# translation_pending=true, then push a translation_ready event once inference finishes
+CHAT_TWO_PHASE_DELIVERY = config("CHAT_TWO_PHASE_DELIVERY", cast=bool, default=False)
+
+# Presence: a connection counts as online for CHAT_PRESENCE_TTL seconds after its
+# last heartbeat, and online/offline changes are only announced (to online
+# friends) once they have been stable for CHAT_PRESENCE_DEBOUNCE_MS
+CHAT_PRESENCE_TTL = config("CHAT_PRESENCE_TTL", cast=int, default=60)
+CHAT_PRESENCE_DEBOUNCE_MS = config("CHAT_PRESENCE_DEBOUNCE_MS", cast=int, default=2000)
+
+# User list pages (UserListView): default and maximum users per page
+USER_LIST_PAGE_SIZE = config("USER_LIST_PAGE_SIZE", cast=int, default=50)
+USER_LIST_MAX_PAGE_SIZE = config("USER_LIST_MAX_PAGE_SIZE", cast=int, default=200)
+
+# User search backend for UserListView: contains (icontains scan), trigram (PostgreSQL pg_trgm),
+# fts5 (SQLite FTS5 trigram index) or auto to pick by database
+USER_SEARCH_BACKEND = config("USER_SEARCH_BACKEND", default="auto")
+
+# Friendship graph (friend recommendations): rebuilt from the database after this many
+# seconds, bounding how stale changes made by other worker processes can be
+FRIEND_GRAPH_MAX_AGE = config("FRIEND_GRAPH_MAX_AGE", cast=int, default=300)
+
+# Precomputed friend recommendations (refresh_friend_recommendations): candidates kept per
+# user, age after which an entry is recomputed even if nothing changed (and the view falls
+# back to a live traversal), and seconds between runs of the --loop worker
+FRIEND_RECOMMENDATIONS_PER_USER = config("FRIEND_RECOMMENDATIONS_PER_USER", cast=int, default=20)
+FRIEND_RECOMMENDATIONS_MAX_AGE = config("FRIEND_RECOMMENDATIONS_MAX_AGE", cast=int, default=86400)
+FRIEND_RECOMMENDATIONS_REFRESH_INTERVAL = config("FRIEND_RECOMMENDATIONS_REFRESH_INTERVAL", cast=int, default=60)
+
+# Chat history pages (MessagesView): default and maximum messages per page
+CHAT_HISTORY_PAGE_SIZE = config("CHAT_HISTORY_PAGE_SIZE", cast=int, default=50)
+CHAT_HISTORY_MAX_PAGE_SIZE = config("CHAT_HISTORY_MAX_PAGE_SIZE", cast=int, default=200)
+
+# Reconnect sync (?since=<message id>): missed messages are streamed in batches
+# of CHAT_SYNC_BATCH_SIZE, up to CHAT_SYNC_MAX_MESSAGES before asking for a reload
+CHAT_SYNC_BATCH_SIZE = config("CHAT_SYNC_BATCH_SIZE", cast=int, default=200)
+CHAT_SYNC_MAX_MESSAGES = config("CHAT_SYNC_MAX_MESSAGES", cast=int, default=2000)
+
+# Delivery/read receipts: cumulative acks are coalesced for this long and
+# applied as one range UPDATE per chat
+CHAT_RECEIPT_WINDOW_MS = config("CHAT_RECEIPT_WINDOW_MS", cast=int, default=200)
+
+# Websocket compression for clients that negotiate the lingobridge.json+deflate
+# subprotocol: payloads at least this long are sent deflated in binary frames
+CHAT_COMPRESSION_MIN_BYTES = config("CHAT_COMPRESSION_MIN_BYTES", cast=int, default=256)
+CHAT_COMPRESSION_LEVEL = config("CHAT_COMPRESSION_LEVEL", cast=int, default=6)
+# Largest size a compressed inbound frame may inflate to; bigger frames are rejected
+CHAT_MAX_INBOUND_BYTES = config("CHAT_MAX_INBOUND_BYTES", cast=int, default=1024 * 1024)
+
+# Write-behind message persistence: messages get time-ordered ids up front, are
+# delivered immediately and inserted in batches (by size or age). CHAT_WORKER_ID
+# is required and must be unique (0-127) per ASGI worker process across all hosts.
+CHAT_WRITE_BEHIND = config("CHAT_WRITE_BEHIND", cast=bool, default=False)
+CHAT_WRITE_BEHIND_BATCH_SIZE = config("CHAT_WRITE_BEHIND_BATCH_SIZE", cast=int, default=200)
+CHAT_WRITE_BEHIND_FLUSH_MS = config("CHAT_WRITE_BEHIND_FLUSH_MS", cast=int, default=50)
+CHAT_WORKER_ID = config("CHAT_WORKER_ID", default=None)
+
+# Translation micro-batching: requests for the same language pair are
+# collected for up to the window (or until the batch is full) and run as one pipeline call
+TRANSLATION_BATCH_WINDOW_MS = config("TRANSLATION_BATCH_WINDOW_MS", cast=int, default=10)
+TRANSLATION_MAX_BATCH_SIZE = config("TRANSLATION_MAX_BATCH_SIZE", cast=int, default=16)
+
+# Messages longer than this are split into sentence segments (kept well under
+# the opus-mt 512 token limit) that are translated as one batch
+TRANSLATION_MAX_SEGMENT_CHARS = config("TRANSLATION_MAX_SEGMENT_CHARS", cast=int, default=400)
+
+# Admission control: concurrent translations per worker, bounded wait queue with a
+# per-user share, and the queue delay after which a message is delivered untranslated
+# (translation_pending=true) and its translation backfilled later
+TRANSLATION_MAX_IN_FLIGHT = config("TRANSLATION_MAX_IN_FLIGHT", cast=int, default=8)
+TRANSLATION_MAX_QUEUE = config("TRANSLATION_MAX_QUEUE", cast=int, default=256)
+TRANSLATION_MAX_QUEUED_PER_USER = config("TRANSLATION_MAX_QUEUED_PER_USER", cast=int, default=8)
+TRANSLATION_QUEUE_SLA_MS = config("TRANSLATION_QUEUE_SLA_MS", cast=int, default=2000)
+
+# Translation result cache: in-process LRU (size / TTL in seconds) in front of
+# the persistent TranslationCacheEntry table. Only texts up to PERSIST_MAX_CHARS
+# are persisted; `manage.py prune_translation_cache` deletes rows older than
+# TRANSLATION_CACHE_DB_TTL seconds (run it from cron)
+TRANSLATION_CACHE_SIZE = config("TRANSLATION_CACHE_SIZE", cast=int, default=10000)
+TRANSLATION_CACHE_TTL = config("TRANSLATION_CACHE_TTL", cast=int, default=86400)
+TRANSLATION_CACHE_PERSISTENT = config("TRANSLATION_CACHE_PERSISTENT", cast=bool, default=True)
+TRANSLATION_CACHE_PERSIST_MAX_CHARS = config("TRANSLATION_CACHE_PERSIST_MAX_CHARS", cast=int, default=100)
+TRANSLATION_CACHE_DB_TTL = config("TRANSLATION_CACHE_DB_TTL", cast=int, default=30 * 86400)
+
+# Out-of-process translation service ('unix:/path/to.sock' or 'host:port').
+# Leave empty to translate inside the ASGI process.
+# Start it with: python manage.py run_translation_service
+TRANSLATION_SERVICE_ADDRESS = config("TRANSLATION_SERVICE_ADDRESS", default="")
+TRANSLATION_SERVICE_WORKERS = config("TRANSLATION_SERVICE_WORKERS", cast=int, default=2)
+TRANSLATION_SERVICE_TIMEOUT = config("TRANSLATION_SERVICE_TIMEOUT", cast=float, default=10)
+
+# Language pairs to load and warm before serving traffic, e.g. "en-fr,fr-en".
+# Each ASGI worker warms them in the background at startup and /api/ready/ returns
+# 503 until they are hot; they are never evicted by the memory budget. Setting
+# TRANSLATION_PRELOAD_ON_STARTUP=False skips the warmup and readiness stops waiting
+# for the pairs. (manage.py preload_translation_models runs in its own process: it
+# checks that the models load and fills the download cache, it can't warm a worker.)
+TRANSLATION_PRELOAD_PAIRS = config("TRANSLATION_PRELOAD_PAIRS", cast=Csv(), default="")
+TRANSLATION_PRELOAD_ON_STARTUP = config("TRANSLATION_PRELOAD_ON_STARTUP", cast=bool, default=True)
+
+# Approximate memory budget for loaded translation models, per process.
+# Least recently used language pairs are evicted past it (0 = no limit).
+TRANSLATION_MODEL_MEMORY_BUDGET_MB = config("TRANSLATION_MODEL_MEMORY_BUDGET_MB", cast=int, default=0)
+
+# Inference backend per language pair: pytorch (default), int8 or onnx, e.g. "en-fr:onnx,fr-en:int8".
+# Verify a backend first with: python manage.py check_translation_parity --backend onnx
+TRANSLATION_BACKEND_DEFAULT = config("TRANSLATION_BACKEND_DEFAULT", default="pytorch")
+TRANSLATION_BACKENDS = config("TRANSLATION_BACKENDS", cast=Csv(), default="")
+TRANSLATION_ONNX_DIR = config("TRANSLATION_ONNX_DIR", default=BASE_DIR / "onnx_models")
+
 # CORS settings - restrict in production
 CORS_ALLOW_ALL_ORIGINS = DEBUG
 CORS_ALLOW_CREDENTIALS = True
@@ -14,9 +14,14 @@ const Chat = () => {
   const [user, setUser] = useState(null);
   const [friendInfo, setFriendInfo] = useState(null);
   const [wsConnected, setWsConnected] = useState(false);
+  const [olderCursor, setOlderCursor] = useState(null);
   const wsRef = useRef(null);
   const userIdRef = useRef(null);
   const scrollerRef = useRef(null);
+  const lastAckedRef = useRef(0);
+  const messagesRef = useRef([]);
+  const hasConnectedRef = useRef(false);
+  const keepScrollRef = useRef(false);
   const navigate = useNavigate();
 
   useEffect(() => {
@@ -26,17 +31,19 @@ const Chat = () => {
       return;
     }
 
+    lastAckedRef.current = 0;
+    hasConnectedRef.current = false;
+
     const fetchData = async () => {
       try {
         const userRes = await apiClient.get('/me/');
         setUser(userRes.data);
         userIdRef.current = userRes.data.id;
 
+        // Newest page first; older pages load on demand
         const messagesRes = await apiClient.get(`/messages/${friendId}/`);
-        setMessages(messagesRes.data.map(msg => ({
-          ...msg,
-          displayContent: msg.sender.id === userRes.data.id ? msg.content : msg.translated_content
-        })));
+        setMessages(messagesRes.data.messages.slice().reverse());
+        setOlderCursor(messagesRes.data.next_before);
       } catch (err) {
         console.error('Error fetching chat data:', err);
         if (err.response?.status === 403) {
@@ -71,6 +78,50 @@ const Chat = () => {
             return;
           }
 
+          // Reconnect sync: messages missed while disconnected, oldest first
+          if (data.type === 'sync_batch') {
+            const currentUserId = userIdRef.current;
+            setMessages(prev => {
+              const known = new Set(prev.map(m => m.id));
+              const missed = data.messages
+                .filter(m => !known.has(m.id) && (m.sender === parseInt(friendId) || m.receiver === parseInt(friendId)))
+                .map(m => ({ ...m, displayContent: m.sender === currentUserId ? m.content : (m.translated_content || m.content) }));
+              return missed.length ? [...prev, ...missed] : prev;
+            });
+            return;
+          }
+          if (data.type === 'sync_complete') {
+            // Too much to stream: reload the history instead
+            if (data.truncated) fetchData();
+            return;
+          }
+
+          // Aggregated receipt: the friend has read/received everything up to data.up_to
+          if (data.type === 'receipt') {
+            if (data.conversation || data.reader !== parseInt(friendId)) return;
+            setMessages(prev => prev.map(m => {
+              const senderId = m.sender?.id ?? m.sender;
+              if (senderId !== userIdRef.current || m.id > data.up_to || m.status === 'read') return m;
+              return { ...m, status: data.status };
+            }));
+            return;
+          }
+
+          // Two-phase delivery: the translation for an already delivered message is ready
+          if (data.type === 'translation_ready') {
+            setMessages(prev => prev.map(m => {
+              if (m.id !== data.id) return m;
+              const senderId = m.sender?.id ?? m.sender;
+              return {
+                ...m,
+                translated_content: data.translated_content,
+                translation_pending: false,
+                displayContent: senderId === userIdRef.current ? m.displayContent : data.translated_content
+              };
+            }));
+            return;
+          }
+
           if (data.receiver === parseInt(friendId) || data.sender === parseInt(friendId)) {
             const currentUserId = userIdRef.current;
             const displayContent = data.sender === currentUserId ? data.content : (data.translated_content || data.content);
@@ -89,7 +140,15 @@ const Chat = () => {
         console.error('WebSocket error:', error);
         setWsConnected(false);
       },
-      () => setWsConnected(true),
+      () => {
+        setWsConnected(true);
+        // On reconnect, ask only for what was missed instead of refetching the history
+        const newest = messagesRef.current.reduce((max, m) => (m.id > max ? m.id : max), 0);
+        if (hasConnectedRef.current && newest) {
+          wsConnection.send(JSON.stringify({ action: 'sync', since: newest, chat_with: parseInt(friendId) }));
+        }
+        hasConnectedRef.current = true;
+      },
       (event) => {
         setWsConnected(false);
         if (event.code !== 1000 && event.code !== 1001) {
@@ -106,11 +165,49 @@ const Chat = () => {
   }, [friendId, navigate]);
 
   useEffect(() => {
+    messagesRef.current = messages;
+  }, [messages]);
+
+  // Cumulative read receipt for the newest message from the friend (the server batches these)
+  useEffect(() => {
+    const ws = wsRef.current?.ws();
+    if (!wsConnected || !ws || ws.readyState !== WebSocket.OPEN) return;
+    const newest = messages.reduce((max, m) => {
+      const senderId = m.sender?.id ?? m.sender;
+      return senderId === parseInt(friendId) && m.id > max ? m.id : max;
+    }, 0);
+    if (newest > lastAckedRef.current) {
+      lastAckedRef.current = newest;
+      ws.send(JSON.stringify({ action: 'ack', status: 'read', chat_with: parseInt(friendId), up_to: newest }));
+    }
+  }, [messages, wsConnected, friendId]);
+
+  useEffect(() => {
+    if (keepScrollRef.current) {
+      keepScrollRef.current = false;
+      return;
+    }
     if (scrollerRef.current) {
       scrollerRef.current.scrollTop = scrollerRef.current.scrollHeight;
     }
   }, [messages]);
 
+  const loadOlder = async () => {
+    if (!olderCursor) return;
+    try {
+      const res = await apiClient.get(`/messages/${friendId}/`, { params: { before: olderCursor } });
+      const older = res.data.messages.slice().reverse();
+      keepScrollRef.current = true;
+      setMessages(prev => {
+        const known = new Set(prev.map(m => m.id));
+        return [...older.filter(m => !known.has(m.id)), ...prev];
+      });
+      setOlderCursor(res.data.next_before);
+    } catch (err) {
+      console.error('Error loading older messages:', err);
+    }
+  };
+
   const handleSend = () => {
     const ws = wsRef.current?.ws();
     if (ws && ws.readyState === WebSocket.OPEN && content.trim()) {
@@ -174,6 +271,13 @@ const Chat = () => {
 
       {/* Messages Container */}
       <div ref={scrollerRef} className="flex-1 overflow-y-auto px-4 py-4 space-y-4">
+        {olderCursor && (
+          <div className="flex justify-center">
+            <Button variant="ghost" size="sm" className="text-white hover:bg-purple-800/30" onClick={loadOlder}>
+              Load earlier messages
+            </Button>
+          </div>
+        )}
         {messages.length === 0 ? (
           <div className="flex items-center justify-center h-full">
             <div className="text-center text-white">
@@ -198,7 +302,7 @@ const Chat = () => {
                 {!isCurrentUser && (
                   <Avatar className="w-8 h-8 flex-shrink-0 ring-2 ring-purple-200 dark:ring-purple-800">
                     <AvatarFallback className="bg-gray-700 text-white text-xs font-medium">
-                      {msg.sender?.username?.[0]?.toUpperCase() || 'U'}
+                      {(msg.sender?.username || friendInfo?.username)?.[0]?.toUpperCase() || 'U'}
                     </AvatarFallback>
                   </Avatar>
                 )}
@@ -207,7 +311,9 @@ const Chat = () => {
                   <div className="px-4 py-2 rounded-2xl break-words bg-gray-700 text-white shadow-sm">
                     <p className="text-sm leading-relaxed">{msg.displayContent || msg.content}</p>
                   </div>
-                  <span className="text-xs text-white/70 px-2">{timeStr}</span>
+                  <span className="text-xs text-white/70 px-2">
+                    {timeStr}{isCurrentUser && msg.status && msg.status !== 'sent' ? ` · ${msg.status === 'read' ? 'Read' : 'Delivered'}` : ''}
+                  </span>
                 </div>
 
                 {isCurrentUser && (
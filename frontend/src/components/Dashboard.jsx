@@ -11,6 +11,7 @@ const Dashboard = () => {
   const [friends, setFriends] = useState([]);
   const [friendRequests, setFriendRequests] = useState([]);
   const [notifications, setNotifications] = useState([]);
+  const [onlineFriends, setOnlineFriends] = useState(new Set());
   const wsRef = useRef(null);
   const navigate = useNavigate();
 
@@ -47,7 +48,16 @@ const Dashboard = () => {
       (e) => {
         try {
           const data = JSON.parse(e.data);
-          if (data.type === 'friend_request') {
+          // Friends' presence: a snapshot on connect, then one event per change
+          if (data.type === 'presence_snapshot') {
+            setOnlineFriends(new Set(data.online));
+          } else if (data.type === 'presence') {
+            setOnlineFriends(prev => {
+              const next = new Set(prev);
+              if (data.online) next.add(data.user); else next.delete(data.user);
+              return next;
+            });
+          } else if (data.type === 'friend_request') {
             setNotifications(prev => [...prev, {
               id: Date.now(),
               message: `${data.from_user.username} sent you a friend request`,
@@ -243,9 +253,14 @@ const Dashboard = () => {
               {friends.map((friend) => (
                 <div key={friend.id} onClick={() => navigate(`/chat/${friend.id}`)} className="flex items-center justify-between p-4 hover:bg-purple-50/50 dark:hover:bg-purple-900/20 transition-colors cursor-pointer">
                   <div className="flex items-center gap-3 min-w-0 flex-1">
-                    <Avatar className="h-12 w-12 flex-shrink-0 ring-2 ring-purple-200 dark:ring-purple-800">
-                      <AvatarFallback className="bg-gradient-to-br from-blue-400 to-cyan-500 text-white font-medium">{friend.username[0].toUpperCase()}</AvatarFallback>
-                    </Avatar>
+                    <div className="relative flex-shrink-0">
+                      <Avatar className="h-12 w-12 ring-2 ring-purple-200 dark:ring-purple-800">
+                        <AvatarFallback className="bg-gradient-to-br from-blue-400 to-cyan-500 text-white font-medium">{friend.username[0].toUpperCase()}</AvatarFallback>
+                      </Avatar>
+                      {onlineFriends.has(friend.id) && (
+                        <span className="absolute bottom-0 right-0 w-3 h-3 rounded-full bg-emerald-500 ring-2 ring-white dark:ring-gray-900" title="Online"></span>
+                      )}
+                    </div>
                     <div className="min-w-0 flex-1">
                       <p className="text-sm font-semibold text-white truncate">{friend.username}</p>
                       <p className="text-xs text-white truncate">{friend.email}</p>
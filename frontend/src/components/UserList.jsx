@@ -12,6 +12,7 @@ const UserList = () => {
   const [debouncedSearch, setDebouncedSearch] = useState('');
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
+  const [nextAfter, setNextAfter] = useState(null);
   const navigate = useNavigate();
 
   useEffect(() => {
@@ -26,7 +27,8 @@ const UserList = () => {
       try {
         const params = debouncedSearch ? { search: debouncedSearch } : {};
         const response = await apiClient.get('/users/', { params });
-        setUsers(response.data);
+        setUsers(response.data.users);
+        setNextAfter(response.data.next_after);
       } catch (err) {
         setError(err.response?.data?.error || 'Failed to load users');
       } finally {
@@ -36,6 +38,21 @@ const UserList = () => {
     fetchUsers();
   }, [debouncedSearch]);
 
+  const loadMore = async () => {
+    if (!nextAfter) return;
+    setLoading(true);
+    try {
+      const params = { after: nextAfter, ...(debouncedSearch ? { search: debouncedSearch } : {}) };
+      const response = await apiClient.get('/users/', { params });
+      setUsers(prev => [...prev, ...response.data.users]);
+      setNextAfter(response.data.next_after);
+    } catch (err) {
+      setError(err.response?.data?.error || 'Failed to load users');
+    } finally {
+      setLoading(false);
+    }
+  };
+
   const handleSendRequest = async (userId) => {
     try {
       const response = await apiClient.post(`/friend-request/${userId}/`);
@@ -157,6 +174,14 @@ const UserList = () => {
             </div>
           )}
         </div>
+
+        {nextAfter && (
+          <div className="flex justify-center mt-4">
+            <Button variant="ghost" size="sm" className="text-white hover:bg-purple-800/30" onClick={loadMore} disabled={loading}>
+              Load more
+            </Button>
+          </div>
+        )}
       </main>
     </div>
   );